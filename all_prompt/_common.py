@@ -0,0 +1,19 @@
+"""
+各数据集 Prompt 模板共用的片段
+"""
+import sys
+
+# 三值判定（True / False / Unknown）：陈述作为假设传给 solver.check，不新建 Solver、不 push/pop
+# FOLIO 与 ProofWriter 共用，只在各自的 instruction / 代码模板中出现一次，示例里不再重复
+THREE_VALUED_CHECK = sys.intern("""def is_true(stmt):
+    return solver.check(Not(stmt)) == unsat
+
+def is_false(stmt):
+    return solver.check(stmt) == unsat
+
+if is_true(S):
+    print("A")
+elif is_false(S):
+    print("B")
+else:
+    print("C")""")
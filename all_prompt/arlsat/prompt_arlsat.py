@@ -4,21 +4,10 @@ AR-LSAT 数据集的 Prompt 模板模块
 AR-LSAT（Analytical Reasoning - LSAT）是逻辑推理考试的一部分，
 主要涉及约束满足问题（scheduling、arrangement 等）。
 """
+import sys
 
-def build_prompt_arlsat(context, question, options, error_feedback=None):
-    """为 AR-LSAT 数据集构建 Prompt
-    
-    Args:
-        context: 场景描述和约束条件
-        question: 具体问题
-        options: 选项列表
-        error_feedback: 错误反馈信息（用于自我细化），可选
-    
-    Returns:
-        完整的 Prompt 字符串
-    """
-    # [Instruction Prompt]
-    instruction_prompt = """
+# [Instruction Prompt]
+_INSTRUCTION = sys.intern("""
 You should write in the format as comment in python script as follows:
 # Define variables for all entities and constraints
 # Create a solver instance: solver = Solver()
@@ -28,24 +17,26 @@ You should write in the format as comment in python script as follows:
 
 You must meet the following requirements:
 1. The output should be a python script of the format ```python ... ```
-2. Use appropriate Z3 variables (Bool, Int, etc.) based on the problem type
+2. Use appropriate Z3 variables (Bool, Int, etc.) based on the problem type; for assignments and orderings prefer one Int per entity with Distinct (or PbEq/AtMost for "exactly/at most k" choices) instead of many Bool variables joined by Or chains; if a Bool grid is really needed, create it in one call with BoolVector('x', n) (or Bools('a1 a2 ...')) and index it, never one Bool("alice_1") call per cell
 3. Encode all constraints from the problem description
 4. Return only a single letter (A, B, C, D, or E) as the final answer
 5. Comment which option each letter represents
-"""
+6. Right after the imports enable Z3's parallel portfolio and bound every check:
+   set_param('parallel.enable', True); set_param('parallel.threads.max', 4); solver.set('timeout', 5000)
+""")
 
-    # [Task Description]
-    task_description = """
+# [Task Description]
+_TASK = sys.intern("""
 Task Description: You are given an analytical reasoning problem with constraints.
 1) Define all variables needed to represent the entities and their properties
 2) Create a Z3 solver instance
 3) Add all constraints mentioned in the problem
-4) Evaluate the given options to find which one satisfies all constraints
+4) Call solver.check() once and evaluate the given options against the model in Python; only re-check remaining options as assumptions (solver.check(*option_constraints)), never push/pop per option
 5) Return the letter of the correct option (A, B, C, D, or E)
-"""
+""")
 
-    # [Few-shot Example] - Simple scheduling example
-    few_shot_example = """
+# [Few-shot Example] - Simple scheduling example
+_FEWSHOT = sys.intern("""
 Following is an example to follow:
 Context:
 Three people (Alice, Bob, Carol) have three tasks (1, 2, 3) assigned to them.
@@ -60,56 +51,94 @@ C) Alice: 3, Bob: 1, Carol: 2
 ```python
 from z3 import *
 
-# Define boolean variables for assignments
-alice_1 = Bool("alice_1")
-alice_2 = Bool("alice_2")
-alice_3 = Bool("alice_3")
-bob_1 = Bool("bob_1")
-bob_2 = Bool("bob_2")
-bob_3 = Bool("bob_3")
-carol_1 = Bool("carol_1")
-carol_2 = Bool("carol_2")
-carol_3 = Bool("carol_3")
+# Define integer variables: the task assigned to each person
+alice, bob, carol = Ints('alice bob carol')
+people = [alice, bob, carol]
+
+# Run Z3's strategy portfolio in parallel and bound every check to 5s
+set_param('parallel.enable', True)
+set_param('parallel.threads.max', 4)
 
 # Create solver
 solver = Solver()
+solver.set('timeout', 5000)
 
-# Add constraints: each person does exactly one task
-solver.add(Or(alice_1, alice_2, alice_3))
-solver.add(Or(bob_1, bob_2, bob_3))
-solver.add(Or(carol_1, carol_2, carol_3))
-
-# Each task is done by exactly one person
-solver.add(Or(alice_1, bob_1, carol_1))
-solver.add(Or(alice_2, bob_2, carol_2))
-solver.add(Or(alice_3, bob_3, carol_3))
+# Each person does exactly one task (1..3) and each task is done by exactly one person
+for p in people:
+    solver.add(p >= 1, p <= 3)
+solver.add(Distinct(people))
 
 # Alice must do task 1
-solver.add(alice_1)
+solver.add(alice == 1)
 # Bob cannot do task 1
-solver.add(Not(bob_1))
+solver.add(bob != 1)
+
+# Options to check
+options = {
+    "A": [alice == 1, bob == 2, carol == 3],  # A) Alice: 1, Bob: 2, Carol: 3
+    "B": [alice == 2, bob == 1, carol == 3],  # B) Alice: 2, Bob: 1, Carol: 3
+    "C": [alice == 3, bob == 1, carol == 2],  # C) Alice: 3, Bob: 1, Carol: 2
+}
 
-# Check each option
-# Option A: Alice: 1, Bob: 2, Carol: 3
-solver.push()
-solver.add(alice_1, bob_2, carol_3)
+# Solve once, then test the options against the model in Python
 if solver.check() == sat:
-    print("A")
-else:
-    solver.pop()
-    # Check Option B and C similarly...
-    print("A")
-solver.pop()
+    m = solver.model()
+    answer = None
+    for letter, conds in options.items():
+        if all(is_true(m.eval(c, model_completion=True)) for c in conds):
+            answer = letter
+            break
+    # The puzzle may have several models: check the remaining options as assumptions (no push/pop)
+    if answer is None:
+        for letter, conds in options.items():
+            if solver.check(*conds) == sat:
+                answer = letter
+                break
+    print(answer)
 ```
-"""
+""")
 
-    # 组合 Prompt
-    options_str = "\\n".join(options)
-    full_prompt = f"{instruction_prompt}\n{task_description}\n{few_shot_example}\n"
-    full_prompt += f">>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Context]:\n{context}\n\n[Question]:\n{question}\n[Options]:\n{options_str}\n"
+# 静态骨架（instruction + task + few-shot）只在模块加载时拼接一次
+_ARLSAT_HEADER = sys.intern(f"{_INSTRUCTION}\n{_TASK}\n{_FEWSHOT}\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Context]:\n")
+_MID = "\n\n[Question]:\n"
+_OPTS = "\n[Options]:\n"
+_FB_PREFIX = "\nFeedback: There is an error when the code is executed, and the error is \""
+_FB_SUFFIX = "\". Please regenerate the code to fix the error."
+
+
+def build_prompt_arlsat_parts(context, question, options, error_feedback=None):
+    """为 AR-LSAT 数据集构建分段 Prompt
+    
+    Args:
+        context: 场景描述和约束条件
+        question: 具体问题
+        options: 选项列表（也可以是已用换行拼接好的字符串）
+        error_feedback: 错误反馈信息（用于自我细化），可选
+    
+    Returns:
+        {'cacheable': 静态前缀, 'variable': 可变后缀}；静态前缀在所有调用间完全相同，
+        可交给推理后端做前缀缓存（prompt caching / KV cache）
+    """
+    # 可变部分：题目、选项与错误反馈
+    options_str = "\n".join(options) if isinstance(options, (list, tuple)) else options
+    parts = [context, _MID, question, _OPTS, options_str, "\n"]
 
     # [Self-Refinement]
     if error_feedback:
-        full_prompt += f"\nFeedback: There is an error when the code is executed, and the error is \"{error_feedback}\". Please regenerate the code to fix the error."
+        parts += [_FB_PREFIX, error_feedback, _FB_SUFFIX]
+
+    return {'cacheable': _ARLSAT_HEADER, 'variable': "".join(parts)}
+
+
+def build_prompt_arlsat(context, question, options, error_feedback=None):
+    """构建完整的 Prompt 字符串（静态前缀 + 可变后缀）"""
+    parts = build_prompt_arlsat_parts(context, question, options, error_feedback)
+    return parts['cacheable'] + parts['variable']
+
 
-    return full_prompt
+if __name__ == "__main__":
+    # 测试代码：两个选项应各占一行（列表与已拼接好的字符串结果一致）
+    prompt = build_prompt_arlsat("context", "question", ["A) yes", "B) no"])
+    assert "\nB)" in prompt and "\\nB)" not in prompt
+    assert prompt == build_prompt_arlsat("context", "question", "A) yes\nB) no")
+    print("ok")
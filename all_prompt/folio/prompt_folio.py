@@ -4,23 +4,14 @@ FOLIO 数据集的 Prompt 模板模块
 FOLIO（First-Order Logic Inference）涉及一阶逻辑推理问题，
 答案为 True、False 或 Uncertain。
 """
+import sys
 
-def build_prompt_folio(context, question, options, error_feedback=None):
-    """为 FOLIO 数据集构建 Prompt
-    
-    Args:
-        context: 逻辑规则和事实
-        question: 具体问题
-        options: 选项列表（True, False, Uncertain）
-        error_feedback: 错误反馈信息（用于自我细化），可选
-    
-    Returns:
-        完整的 Prompt 字符串
-    """
-    # [Instruction Prompt]
-    instruction_prompt = """
+from all_prompt._common import THREE_VALUED_CHECK
+
+# [Instruction Prompt]
+_INSTRUCTION = sys.intern(f"""
 You should write in the format as comment in python script as follows:
-# Define boolean variables for all predicates and entities
+# Define an entity sort and one Function predicate per property
 # Create a solver instance: solver = Solver()
 # Encode all logical rules from the context
 # Create assertions to check the query
@@ -28,31 +19,34 @@ You should write in the format as comment in python script as follows:
 
 You must meet the following requirements:
 1. The output should be a python script of the format ```python ... ```
-2. Encode all implications and logical rules using Z3 (Implies, And, Or, Not)
-3. Handle uncertain cases by checking if the solver can find both satisfying and non-satisfying models
+2. Encode all implications and logical rules using Z3 (Implies, And, Or, Not); quantified rules use ForAll/Exists over the entity sort instead of one Bool per subject-predicate pair
+3. Handle uncertain cases by checking the statement and its negation as assumptions, always with exactly this block (S is the statement):
+```python
+{THREE_VALUED_CHECK}
+```
 4. Return exactly one of: "A", "B", or "C" (corresponding to True, False, Uncertain)
 5. Comment which letter represents which answer type
-"""
+""")
 
-    # [Task Description]
-    task_description = """
+# [Task Description]
+_TASK = sys.intern("""
 Task Description: You are given a first-order logic reasoning problem with:
 1) A set of logical rules and facts (context)
 2) A query statement to evaluate
 3) Three possible answers: True, False, or Uncertain
 
 Your task:
-1) Define boolean variables for all relevant propositions/predicates
+1) Declare an entity sort and a Function(Name, Entity, BoolSort()) for every predicate
 2) Create a Z3 solver
 3) Add all rules from the context as constraints
 4) Check if the query statement must be True (always satisfies constraints)
 5) Check if the query statement must be False (never satisfies constraints)  
 6) If neither, the answer is Uncertain
 7) Return the corresponding letter: A for True, B for False, C for Uncertain
-"""
+""")
 
-    # [Few-shot Example]
-    few_shot_example = """
+# [Few-shot Example]
+_FEWSHOT = sys.intern("""
 Following is an example to follow:
 Context:
 All dogs are animals. Spot is a dog. Some animals are fast.
@@ -66,55 +60,75 @@ C) Uncertain
 ```python
 from z3 import *
 
-# Define boolean variables
-spot_is_dog = Bool("spot_is_dog")
-spot_is_animal = Bool("spot_is_animal")
-spot_is_fast = Bool("spot_is_fast")
-all_dogs_are_animals = Bool("all_dogs_are_animals")
-some_animals_are_fast = Bool("some_animals_are_fast")
+# Domain: FOLIO is open-world, so use an uninterpreted sort rather than a closed EnumSort
+Entity = DeclareSort('Entity')
+Spot = Const('Spot', Entity)
+
+# Predicates: one Function per property, shared by all entities
+Dog = Function('Dog', Entity, BoolSort())
+Animal = Function('Animal', Entity, BoolSort())
+Fast = Function('Fast', Entity, BoolSort())
 
 # Create solver
 solver = Solver()
 
 # Encode constraints from context
+x = Const('x', Entity)
 # All dogs are animals
-solver.add(Implies(spot_is_dog, spot_is_animal))
+solver.add(ForAll([x], Implies(Dog(x), Animal(x))))
 # Spot is a dog
-solver.add(spot_is_dog)
-# From the above two constraints, Spot must be an animal
-solver.add(spot_is_animal)
-
-# Check if the statement "Spot is fast" must be true
-# Try to find a model where Spot is NOT fast
-solver.push()
-solver.add(Not(spot_is_fast))
-if solver.check() == sat:
-    # Found a valid model where Spot is not fast, so the answer is not necessarily True
-    solver.pop()
-    # Try to find a model where Spot IS fast
-    solver.push()
-    solver.add(spot_is_fast)
-    if solver.check() == sat:
-        # Found valid models for both cases - answer is Uncertain
-        print("C")
-    else:
-        # Only valid when Spot is not fast - answer is False
-        print("B")
-    solver.pop()
-else:
-    # No valid model where Spot is not fast - answer is True
-    print("A")
-solver.pop()
+solver.add(Dog(Spot))
+# Some animals are fast
+solver.add(Exists([x], And(Animal(x), Fast(x))))
+
+# Statement: Spot is fast
+S = Fast(Spot)
+
+# Three-valued check - paste the block from requirement 3 verbatim (A: True, B: False, C: Uncertain)
 ```
-"""
+""")
+
+# 静态骨架（instruction + task + few-shot）只在模块加载时拼接一次
+_FOLIO_HEADER = sys.intern(f"{_INSTRUCTION}\n{_TASK}\n{_FEWSHOT}\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Context]:\n")
+_MID = "\n\n[Question]:\n"
+_OPTS = "\n[Options]:\n"
+_FB_PREFIX = "\nFeedback: There is an error when the code is executed, and the error is \""
+_FB_SUFFIX = "\". Please regenerate the code to fix the error."
 
-    # 组合 Prompt
-    options_str = "\\n".join(options)
-    full_prompt = f"{instruction_prompt}\n{task_description}\n{few_shot_example}\n"
-    full_prompt += f">>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Context]:\n{context}\n\n[Question]:\n{question}\n[Options]:\n{options_str}\n"
+
+def build_prompt_folio_parts(context, question, options, error_feedback=None):
+    """为 FOLIO 数据集构建分段 Prompt
+    
+    Args:
+        context: 逻辑规则和事实
+        question: 具体问题
+        options: 选项列表（True, False, Uncertain），也可以是已用换行拼接好的字符串
+        error_feedback: 错误反馈信息（用于自我细化），可选
+    
+    Returns:
+        {'cacheable': 静态前缀, 'variable': 可变后缀}；静态前缀在所有调用间完全相同，
+        可交给推理后端做前缀缓存（prompt caching / KV cache）
+    """
+    # 可变部分：题目、选项与错误反馈
+    options_str = "\n".join(options) if isinstance(options, (list, tuple)) else options
+    parts = [context, _MID, question, _OPTS, options_str, "\n"]
 
     # [Self-Refinement]
     if error_feedback:
-        full_prompt += f"\nFeedback: There is an error when the code is executed, and the error is \"{error_feedback}\". Please regenerate the code to fix the error."
+        parts += [_FB_PREFIX, error_feedback, _FB_SUFFIX]
+
+    return {'cacheable': _FOLIO_HEADER, 'variable': "".join(parts)}
+
+
+def build_prompt_folio(context, question, options, error_feedback=None):
+    """构建完整的 Prompt 字符串（静态前缀 + 可变后缀）"""
+    parts = build_prompt_folio_parts(context, question, options, error_feedback)
+    return parts['cacheable'] + parts['variable']
+
 
-    return full_prompt
+if __name__ == "__main__":
+    # 测试代码：两个选项应各占一行（列表与已拼接好的字符串结果一致）
+    prompt = build_prompt_folio("context", "question", ["A) yes", "B) no"])
+    assert "\nB)" in prompt and "\\nB)" not in prompt
+    assert prompt == build_prompt_folio("context", "question", "A) yes\nB) no")
+    print("ok")
@@ -2,23 +2,36 @@
 LogicalDeduction 数据集的 Prompt 模板模块
 """
 import re
+import sys
 
 
-def build_prompt_logicaldeduction(problem_text, question_text, options_text, error_feedback=None):
-    """为 LogicalDeduction 数据集构建 Prompt"""
+def _parse_options(options_text):
+    """
+    解析 "A) xxx" / "B. xxx" / "C: xxx" 形式的选项文本，返回 {字母: 选项内容}
+
+    逐行线性扫描：以 "大写字母 + ) . :" 开头的行开始一个新选项，其余行并入当前选项
+    """
     opts = {}
-    matches = re.findall(
-        r"(?:^|\n)([A-Z])[\)\.\:]\s*(.*?)(?=(?:\n[A-Z][\)\.\:])|$)",
-        options_text,
-        re.DOTALL,
-    )
-    for letter, text in matches:
-        opts[letter] = text.strip()
-    if not opts:
-        opts = {chr(ord("A") + i): f"Option {chr(ord('A') + i)}" for i in range(5)}
-    option_lines = "\n".join([f"# Option {k}: \"{v}\"" for k, v in sorted(opts.items())])
+    letter = None
+    buf = []
+    for line in options_text.split('\n'):
+        if len(line) >= 2 and 'A' <= line[0] <= 'Z' and line[1] in ').:':
+            if letter:
+                opts[letter] = '\n'.join(buf).strip()
+            letter, buf = line[0], [line[2:]]
+        elif letter:
+            buf.append(line)
+    if letter:
+        opts[letter] = '\n'.join(buf).strip()
+    return opts
+
 
-    instruction_prompt = """You are an expert in translating logic puzzles into Z3 Python code.
+_NOW_SOLVE = f"{'=' * 40}\nNow solve:\n{'=' * 40}\n\n"
+
+# 选项注释行的格式化函数（绑定好的 str.format，参数为 (字母, 内容) 元组）
+_format_option_line = '# Option {0[0]}: "{0[1]}"'.format
+
+_INSTRUCTION = sys.intern("""You are an expert in translating logic puzzles into Z3 Python code.
 
 Follow this checklist and do not skip steps:
 - Extract all distinct entities; set N = entity count. Do not assume N=5.
@@ -31,16 +44,21 @@ Follow this checklist and do not skip steps:
 - Golf/competition: "finished/placed above" = smaller (better); "finished/placed below" = larger (worse). Respect the stated mapping 1..N.
 - Add domain 1..N and Distinct on all variables. Apply each textual rule exactly once; never flip or double-count (e.g., "third from the left" = 3, not N+1-3).
 - When checking options, derive the condition exactly from the option text and print only the matching letter (no extra output).
-Output ONLY the Python script."""
+- Call solver.check() once, read the model, and test every option against m.eval(...) in Python; never re-check the solver per option.
+Output ONLY the Python script.""")
 
-    task_description = f"""
+# Code Template 中间要嵌入本题的选项注释，因此拆成前后两段
+_TASK_HEAD = sys.intern("""
 ## Code Template
 ```python
 from z3 import *
+set_param('parallel.enable', True)
+set_param('parallel.threads.max', 4)
 
 # Define variables for all entities (1..N in the chosen order)
 # ...
 solver = Solver()
+solver.set('timeout', 5000)  # 5s
 
 # Domain and distinctness
 # solver.add(v >= 1, v <= N) for each variable
@@ -53,16 +71,16 @@ if solver.check() == sat:
     m = solver.model()
     # Evaluate positions for every entity
     # Options to check (print only the matching letter):
-{option_lines}
+""")
+_TASK_TAIL = sys.intern("""
     # Example: if <Entity> == <position>: print("A")
 else:
     print("Error: Unsatisfiable")
 ```
-"""
+""")
 
-    few_shot_example = """
-## Example 1 (N=5, left/right positions)
-Problem: On a branch, there are five birds: a quail, an owl, a raven, a falcon, and a robin. The owl is the leftmost. The robin is to the left of the raven. The quail is the rightmost. The raven is the third from the left. The falcon is the second from the right.
+# Few-shot 示例库：按题目领域关键词挑选最相关的示例，而不是每题都附上全部示例
+_EXAMPLE_POSITIONS = sys.intern("""Problem: On a branch, there are five birds: a quail, an owl, a raven, a falcon, and a robin. The owl is the leftmost. The robin is to the left of the raven. The quail is the rightmost. The raven is the third from the left. The falcon is the second from the right.
 Question: Which is the second from the right?
 Options: A) quail B) owl C) raven D) falcon E) robin
 
@@ -109,10 +127,9 @@ if solver.check() == sat:
     elif robin_pos == 4: print("E")
 else:
     print("Error: Unsatisfiable")
-```
+```""")
 
-## Example 2 (N=7, cheap/expensive)
-Problem: A fruit stand sells seven fruits: kiwis, plums, mangoes, watermelons, pears, peaches, and oranges. The pears are the third-cheapest. The kiwis are the second-most expensive. The mangoes are the third-most expensive. The peaches are the second-cheapest.
+_EXAMPLE_PRICES = sys.intern("""Problem: A fruit stand sells seven fruits: kiwis, plums, mangoes, watermelons, pears, peaches, and oranges. The pears are the third-cheapest. The kiwis are the second-most expensive. The mangoes are the third-most expensive. The peaches are the second-cheapest.
 Question: Which is the cheapest?
 Options: A) kiwis B) plums C) mangoes D) watermelons E) pears F) peaches G) oranges
 
@@ -160,10 +177,9 @@ if solver.check() == sat:
     elif oranges_pos == 1: print("G")
 else:
     print("Error: Unsatisfiable")
-```
+```""")
 
-## Example 3 (Golf tournament)
-Problem: In a golf tournament, there were five golfers: Dan, Amy, Eve, Ana, and Mya. Dan finished above Eve. Dan finished below Mya. Amy finished third. Ana finished second-to-last.
+_EXAMPLE_GOLF = sys.intern("""Problem: In a golf tournament, there were five golfers: Dan, Amy, Eve, Ana, and Mya. Dan finished above Eve. Dan finished below Mya. Amy finished third. Ana finished second-to-last.
 Question: Who finished last?
 Options: A) Dan B) Amy C) Eve D) Ana E) Mya
 
@@ -207,16 +223,67 @@ if solver.check() == sat:
     elif mya_pos == 5: print("E")
 else:
     print("Error: Unsatisfiable")
-```
-"""
+```""")
+
+# 关键词只收各领域特有的词：above/below 等在多个领域都会出现的词不参与打分；
+# old/new 与 cheap/expensive 同属"按属性排序的最高级"，共用价格示例
+_FEW_SHOT_LIBRARY = [
+    ('N=5, left/right positions',
+     frozenset({'left', 'right', 'leftmost', 'rightmost', 'branch', 'branches', 'bird', 'birds',
+                'shelf', 'shelves', 'book', 'books', 'row', 'arranged'}),
+     _EXAMPLE_POSITIONS),
+    ('N=7, cheap/expensive and old/new superlatives',
+     frozenset({'cheap', 'cheaper', 'cheapest', 'expensive', 'price', 'prices', 'costs', 'sells', 'fruit',
+                'fruits', 'stand', 'old', 'older', 'oldest', 'new', 'newer', 'newest', 'age', 'antique',
+                'vehicles', 'cars'}),
+     _EXAMPLE_PRICES),
+    ('Golf tournament',
+     frozenset({'golf', 'golfer', 'golfers', 'tournament', 'competition', 'finished', 'finishes',
+                'place', 'placed', 'race', 'ranked'}),
+     _EXAMPLE_GOLF),
+]
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+def _select_examples(problem_text, k=3):
+    """按关键词命中数选出最相关的 k 个示例，保持示例库中的原有顺序拼接；没有任何关键词命中时附上全部示例"""
+    words = set(_WORD_PATTERN.findall(problem_text.lower()))
+    scores = [len(keywords & words) for _, keywords, _ in _FEW_SHOT_LIBRARY]
+    if not any(scores):
+        k = len(scores)
+    # 按得分降序取前 k 个；同分时优先靠前的示例
+    chosen = sorted(sorted(range(len(scores)), key=lambda i: -scores[i])[:k])
+    blocks = [f"## Example {n} ({_FEW_SHOT_LIBRARY[i][0]})\n{_FEW_SHOT_LIBRARY[i][2]}"
+              for n, i in enumerate(chosen, 1)]
+    return "\n" + "\n\n".join(blocks) + "\n"
+
+
+def build_prompt_logicaldeduction_parts(problem_text, question_text, options_text, error_feedback=None, few_shot_k=3):
+    """为 LogicalDeduction 数据集构建分段 Prompt
+
+    few_shot_k 为附带的示例数量，默认附带全部示例；小于 3 时按题目领域关键词挑选（选择效果尚未验证）。
+    返回 {'cacheable': 静态前缀, 'variable': 可变后缀}，静态前缀可交给推理后端做前缀缓存
+    """
+    opts = _parse_options(options_text)
+    if not opts:
+        opts = {chr(ord("A") + i): f"Option {chr(ord('A') + i)}" for i in range(5)}
+    option_lines = "\n".join(map(_format_option_line, opts.items()))
 
-    full_prompt = f"{instruction_prompt}\n{task_description}\n{few_shot_example}\n"
-    full_prompt += f"{'='*40}\nNow solve:\n{'='*40}\n\nProblem: {problem_text}\n\nQuestion: {question_text}\n\nOptions:\n{options_text}\n"
+    # instruction 与题目无关，可作为可缓存前缀；task 中嵌入了本题选项，属于可变部分
+    parts = ["\n", _TASK_HEAD, option_lines, _TASK_TAIL, "\n", _select_examples(problem_text, few_shot_k), "\n", _NOW_SOLVE,
+             "Problem: ", problem_text, "\n\nQuestion: ", question_text, "\n\nOptions:\n", options_text, "\n"]
 
     if error_feedback:
         if "unexpected output" in error_feedback or "Expected" in error_feedback:
-            full_prompt += "\nFeedback: Previous code printed extra output. Only print the answer letter."
+            parts.append("\nFeedback: Previous code printed extra output. Only print the answer letter.")
         else:
-            full_prompt += f'\nFeedback: Error occurred: "{error_feedback}". Please fix.'
+            parts.append(f'\nFeedback: Error occurred: "{error_feedback}". Please fix.')
+
+    return {'cacheable': _INSTRUCTION, 'variable': "".join(parts)}
+
 
-    return full_prompt
+def build_prompt_logicaldeduction(problem_text, question_text, options_text, error_feedback=None, few_shot_k=3):
+    """构建完整的 Prompt 字符串（静态前缀 + 可变后缀）"""
+    parts = build_prompt_logicaldeduction_parts(problem_text, question_text, options_text, error_feedback, few_shot_k)
+    return parts['cacheable'] + parts['variable']
@@ -30,21 +30,11 @@ refine_code.txt和refine_semantic.txt的末尾7行也需如此。
 应该注意refine_semantic.txt的info_text是另一个llm给出的具体信息，
 而refine_code.txt中的info_text有可能是说明无法提取python代码的错误，也有可能是Z3代码运行过程中的报错
 """
+import sys
 
-def build_prompt_prontoqa(problem_text, question_text, error_feedback=None):
-    """为 ProntoQA 数据集构建 Prompt
-    
-    Args:
-        problem_text: 问题描述文本
-        question_text: 具体问题文本
-        error_feedback: 错误反馈信息（用于自我细化），可选
-    
-    Returns:
-        完整的 Prompt 字符串
-    """
-    # [Instruction Prompt] - 论文 Appendix A Page 9
-    # 包含格式规范和硬性约束（如变量不重复定义、关系数量对齐）
-    instruction_prompt = """
+# [Instruction Prompt] - 论文 Appendix A Page 9
+# 包含格式规范和硬性约束（如变量不重复定义、关系数量对齐）
+_INSTRUCTION = sys.intern("""
 You should write in the format as comment in python script as follows:
 # Define boolean variables for all entities: <the entities you generate>
 # Create a solver instance: solver = Solver()
@@ -56,21 +46,21 @@ You must meet the following requirements:
 1. The output should be a python script of the format ```python ... ```
 2. All boolean variables should be defined, and you should only define each variable once, not multiple times.
 3. Number of Relationships you generate should be the same as number of sentences in the [Problem] (A sentence is defined as ending with ".").
-"""
+""")
 
-    # [User Prompt] - 论文 Appendix A Page 8
-    # 包含任务逻辑步骤
-    task_description = """
+# [User Prompt] - 论文 Appendix A Page 8
+# 包含任务逻辑步骤
+_TASK = sys.intern("""
 Task Description: You are given a problem description and a question. The task is to write a python script which includes:
 1) Define all variables for all entities in the problem. You should write a comment indicating which sentence the entity is in.
 2) Create a solver instance.
 3) Parse the problem into relationships based on the defined entities, you should only use 'Implies' and 'Not' in this part. You should write a comment indicating which sentence the relationship is in.
 4) Create statements to be checked.
 5) Check if the solver can find a model that satisfies the conditions, if true, return A, if false, return B.
-"""
+""")
 
-    # [Few-shot Example] - 论文 Appendix A Page 8
-    few_shot_example = """
+# [Few-shot Example] - 论文 Appendix A Page 8
+_FEWSHOT = sys.intern("""
 Following is an example to follow:
 Problem:
 Every zumpus is aggressive. Zumpuses are Wumpuses. Wumpuses are not small.
@@ -126,14 +116,39 @@ if solver.check() == sat:
 else:
     print("B") # The statement is false
 ```
-"""
+""")
+
+# 静态骨架（instruction + task + few-shot）只在模块加载时拼接一次
+_PRONTOQA_HEADER = sys.intern(f"{_INSTRUCTION}\n{_TASK}\n{_FEWSHOT}\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Problem]:\n")
+_MID = "\n\n[Question]:\n"
+_OPTS = "\n[Options]:\nA, B\n"
+_FB_PREFIX = "\nFeedback: There is an error when the code is executed, and the error is \""
+_FB_SUFFIX = "\". Please regenerate the code to fix the error."
 
-    # 组合 Prompt
-    full_prompt = f"{instruction_prompt}\n{task_description}\n{few_shot_example}\n"
-    full_prompt += f">>>>>>>>>>>>>>>>>>>>>>>>>>>>\n[Problem]:\n{problem_text}\n\n[Question]:\n{question_text}\n[Options]:\nA, B\n"
+
+def build_prompt_prontoqa_parts(problem_text, question_text, error_feedback=None):
+    """为 ProntoQA 数据集构建分段 Prompt
+    
+    Args:
+        problem_text: 问题描述文本
+        question_text: 具体问题文本
+        error_feedback: 错误反馈信息（用于自我细化），可选
+    
+    Returns:
+        {'cacheable': 静态前缀, 'variable': 可变后缀}；静态前缀在所有调用间完全相同，
+        可交给推理后端做前缀缓存（prompt caching / KV cache）
+    """
+    # 可变部分：题目、选项与错误反馈
+    parts = [problem_text, _MID, question_text, _OPTS]
 
     # [Self-Refinement] - 错误反馈机制
     if error_feedback:
-        full_prompt += f"\nFeedback: There is an error when the code is executed, and the error is \"{error_feedback}\". Please regenerate the code to fix the error."
+        parts += [_FB_PREFIX, error_feedback, _FB_SUFFIX]
 
-    return full_prompt
+    return {'cacheable': _PRONTOQA_HEADER, 'variable': "".join(parts)}
+
+
+def build_prompt_prontoqa(problem_text, question_text, error_feedback=None):
+    """构建完整的 Prompt 字符串（静态前缀 + 可变后缀）"""
+    parts = build_prompt_prontoqa_parts(problem_text, question_text, error_feedback)
+    return parts['cacheable'] + parts['variable']
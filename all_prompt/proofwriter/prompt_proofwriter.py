@@ -1,28 +1,13 @@
 """
 ProofWriter 数据集的 Prompt 模板模块
 """
-import re
+import sys
 
+from all_prompt._common import THREE_VALUED_CHECK
 
-def build_prompt_proofwriter(context: str, question: str, options_text: str, error_feedback: str = None) -> str:
-    """
-    为 ProofWriter 数据集构建 Prompt（判断 True / False / Unknown）
-    - 事实和规则来自 context
-    - 问题是一个陈述，选项通常为 A) True / B) False / C) Unknown
-    """
-    opts = {}
-    matches = re.findall(
-        r"(?:^|\n)([A-Z])[\)\.\:]\s*(.*?)(?=(?:\n[A-Z][\)\.\:])|$)",
-        options_text,
-        re.DOTALL,
-    )
-    for letter, text in matches:
-        opts[letter] = text.strip()
-    if not opts:
-        opts = {"A": "True", "B": "False", "C": "Unknown"}
-    option_lines = "\n".join([f"# Option {k}: \"{v}\"" for k, v in sorted(opts.items())])
-
-    instruction_prompt = """You are an expert in translating natural-language facts/rules into Z3 for three-valued reasoning (True / False / Unknown).
+_NOW_SOLVE = f"{'=' * 40}\nNow solve:\n{'=' * 40}\n\n"
+
+_INSTRUCTION = sys.intern(f"""You are an expert in translating natural-language facts/rules into Z3 for three-valued reasoning (True / False / Unknown).
 
 STRICT CODE STRUCTURE (follow this exact order):
 ```
@@ -44,18 +29,8 @@ solver.add(ForAll([x], Implies(A(x), B(x))))
 # 5. Statement
 S = ...
 
-# 6. Three-valued check
-def is_true(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(Not(stmt))
-    return s.check() == unsat
-
-def is_false(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(stmt)
-    return s.check() == unsat
+# 6. Three-valued check (the ONLY copy - reuse it verbatim in every answer)
+{THREE_VALUED_CHECK}
 ```
 
 KEY RULES:
@@ -64,6 +39,7 @@ KEY RULES:
 3) BEFORE writing code, read the QUESTION and list ALL predicates it mentions!
 4) Implies(condition, conclusion) - ALWAYS needs TWO arguments!
 5) ForAll ONLY after x = Const('x', Entity)
+6) Three-valued check passes the statement as an assumption: solver.check(Not(S)) / solver.check(S) - never build a new Solver() or re-add assertions
 
 ⚠️ CRITICAL CHECKLIST BEFORE SUBMITTING:
 □ Did I define ALL predicates from the question? (e.g., if question asks about "Red", define Red!)
@@ -73,9 +49,9 @@ KEY RULES:
    WRONG: And(A(x) B(x)) → RIGHT: And(A(x), B(x))
    WRONG: Or(A(x) B(x)) → RIGHT: Or(A(x), B(x))
 □ Is x = Const('x', Entity) defined BEFORE any ForAll?
-□ Are Facts section free of ForAll? (ForAll only in Rules!)"""
+□ Are Facts section free of ForAll? (ForAll only in Rules!)""")
 
-    task_description = f"""
+_TASK = sys.intern("""
 ## Code Template (follow EXACTLY)
 ```python
 from z3 import *
@@ -100,29 +76,11 @@ solver.add(ForAll([x], Implies(Cold(x), Big(x))))
 # 5. Statement from question
 S = Big(E1)  # or Not(Big(E1))
 
-# 6. Three-valued check (COPY EXACTLY!)
-def is_true(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(Not(stmt))
-    return s.check() == unsat
-
-def is_false(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(stmt)
-    return s.check() == unsat
-
-if is_true(S):
-    print("A")
-elif is_false(S):
-    print("B")
-else:
-    print("C")
+# 6. Three-valued check - paste the block from STRICT CODE STRUCTURE verbatim
 ```
-"""
+""")
 
-    few_shot_example = """
+_FEWSHOT = sys.intern("""
 ## Example 1 (Universal rules with ForAll)
 Context: Bob is cold. Bob is red. If someone is cold and red then they are quiet. If someone is quiet then they are smart.
 Question: Based on the above information, is the following statement true, false, or unknown? Bob is smart.
@@ -157,25 +115,7 @@ solver.add(ForAll([x], Implies(Quiet(x), Smart(x))))  # ← COMMA inside Implies
 # 5. Statement from question
 S = Smart(Bob)
 
-# 6. Three-valued check (COPY EXACTLY!)
-def is_true(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(Not(stmt))
-    return s.check() == unsat
-
-def is_false(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(stmt)
-    return s.check() == unsat
-
-if is_true(S):
-    print("A")
-elif is_false(S):
-    print("B")
-else:
-    print("C")
+# 6. Three-valued check - paste the block from STRICT CODE STRUCTURE verbatim
 ```
 
 ## Example 2 (Entity-specific rules - NO ForAll needed)
@@ -216,33 +156,30 @@ solver.add(ForAll([x], Implies(Furry(x), Green(x))))
 # 5. Statement
 S = Green(Dave)
 
-# 6. Three-valued check
-def is_true(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(Not(stmt))
-    return s.check() == unsat
-
-def is_false(stmt):
-    s = Solver()
-    s.add(*solver.assertions())
-    s.add(stmt)
-    return s.check() == unsat
-
-if is_true(S):
-    print("A")
-elif is_false(S):
-    print("B")
-else:
-    print("C")
+# 6. Three-valued check - paste the block from STRICT CODE STRUCTURE verbatim
 ```
-"""
+""")
 
-    full_prompt = f"{instruction_prompt}\n{task_description}\n{few_shot_example}\n"
-    full_prompt += f"{'='*40}\nNow solve:\n{'='*40}\n\nContext:\n{context}\n\nQuestion:\n{question}\n\nOptions:\n{options_text}\n"
+# instruction、task、few-shot 均与题目无关，整体作为可缓存前缀
+_PROOFWRITER_HEADER = sys.intern(f"{_INSTRUCTION}\n{_TASK}\n{_FEWSHOT}\n{_NOW_SOLVE}")
+
+
+def build_prompt_proofwriter_parts(context: str, question: str, options_text: str, error_feedback: str = None) -> dict:
+    """
+    为 ProofWriter 数据集构建 Prompt（判断 True / False / Unknown）
+    - 事实和规则来自 context
+    - 问题是一个陈述，选项通常为 A) True / B) False / C) Unknown
+    - 返回 {'cacheable': 静态前缀, 'variable': 可变后缀}，静态前缀可交给推理后端做前缀缓存
+    """
+    parts = ["Context:\n", context, "\n\nQuestion:\n", question, "\n\nOptions:\n", options_text, "\n"]
 
     if error_feedback:
-        full_prompt += f'\nFeedback: Previous run failed with "{error_feedback}". Fix the code following the checklist (do not relax constraints).'
+        parts.append(f'\nFeedback: Previous run failed with "{error_feedback}". Fix the code following the checklist (do not relax constraints).')
 
-    return full_prompt
+    return {'cacheable': _PROOFWRITER_HEADER, 'variable': "".join(parts)}
 
+
+def build_prompt_proofwriter(context: str, question: str, options_text: str, error_feedback: str = None) -> str:
+    """构建完整的 Prompt 字符串（静态前缀 + 可变后缀）"""
+    parts = build_prompt_proofwriter_parts(context, question, options_text, error_feedback)
+    return parts['cacheable'] + parts['variable']
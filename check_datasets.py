@@ -1,25 +1,76 @@
+
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import ijson  # 可选依赖：流式解析，只读取第一条记录
+except ImportError:
+    ijson = None
+
+# 小文件直接 json.load 更快，超过该大小才走流式解析
+STREAM_THRESHOLD = 1024 * 1024
+
+_MISSING = object()
+
+
+def load_first_item(path, size=None):
+    """
+    读取数据集文件顶层数组的第一个元素
+
+    Args:
+        path: 数据集文件路径
+        size: 文件大小（字节），调用方已有 stat 信息时传入以省去一次 stat
+
+    Returns:
+        (data, first_item)：流式解析时 data 为 None；
+        顶层是空列表或不是列表时 first_item 为 _MISSING，此时 data 为完整解析结果
+    """
+    if ijson is not None and (os.path.getsize(path) if size is None else size) >= STREAM_THRESHOLD:
+        with open(path, 'rb') as f:
+            _, event, _ = next(ijson.parse(f), (None, None, None))
+            if event == 'start_array':
+                f.seek(0)
+                first_item = next(ijson.items(f, 'item'), _MISSING)
+                if first_item is not _MISSING:
+                    return None, first_item
+                return [], _MISSING
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list) and data:
+        return data, data[0]
+    return data, _MISSING
+
+
+def inspect_file(entry):
+    """检查单个数据集文件（os.scandir 得到的 DirEntry），返回检查报告文本"""
+    lines = [f'Checking {entry.name}...']
+    try:
+        size = entry.stat().st_size if ijson is not None else None
+        data, first_item = load_first_item(entry.path, size)
+        if first_item is not _MISSING:
+            has_context = 'context' in first_item
+            lines.append(f'  Has context key: {has_context}')
+            if not has_context:
+                lines.append(f'  Keys: {list(first_item.keys())}')
+            else:
+                lines.append(f'  Context type: {type(first_item["context"])}')
+                lines.append(f'  Context preview: {first_item["context"][:50]}...' if first_item["context"] else '  Context is empty')
+        elif isinstance(data, list):
+            lines.append(f'  Empty list')
+        else:
+            lines.append(f'  Not a list, type: {type(data)}')
+    except Exception as e:
+        lines.append(f'  Error loading file: {e}')
+    return '\n'.join(lines)
+
 
-data_dir = 'data'
-for file in os.listdir(data_dir):
-    if file.endswith('.json'):
-        print(f'Checking {file}...')
-        try:
-            with open(os.path.join(data_dir, file), 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list) and data:
-                    first_item = data[0]
-                    has_context = 'context' in first_item
-                    print(f'  Has context key: {has_context}')
-                    if not has_context:
-                        print(f'  Keys: {list(first_item.keys())}')
-                    else:
-                        print(f'  Context type: {type(first_item["context"])}')
-                        print(f'  Context preview: {first_item["context"][:50]}...' if first_item["context"] else '  Context is empty')
-                elif isinstance(data, list):
-                    print(f'  Empty list')
-                else:
-                    print(f'  Not a list, type: {type(data)}')
-        except Exception as e:
-            print(f'  Error loading file: {e}')
+if __name__ == '__main__':
+    data_dir = 'data'
+    # scandir 的 DirEntry 自带文件类型信息，过滤时无需额外 stat
+    with os.scandir(data_dir) as it, ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        entries = (entry for entry in it if entry.is_file() and entry.name.endswith('.json'))
+        # 各文件相互独立，并行检查；map 保持原有的输出顺序
+        for report in executor.map(inspect_file, entries):
+            print(report)
@@ -2,8 +2,58 @@
 关于prompt的数据接口
 """
 import os
+import string
+from functools import lru_cache
 from typing import List, Dict
 
+# 本模块所在目录与 prompt 文件根目录（模块加载时计算一次）
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+_PROMPT_ROOT = os.path.join(_MODULE_DIR, 'all_prompt')
+
+# 单文本模式中各段之间的分隔线
+_SEPARATOR = "=" * 40
+
+# 数据集名 -> all_prompt 下的子目录名
+_PROMPT_FOLDERS = {
+    'prontoqa': 'prontoQA',
+    'folio': 'folio',
+    'logical_deduction': 'logicaldeduction',
+    'ar_lsat': 'arlsat',
+    'proofwriter': 'proofwriter',
+}
+_VALID_PROMPT_TYPES = frozenset({'instruction', 'user', 'refine_code', 'refine_semantic'})
+_VALID_SEMANTIC_PROMPT_TYPES = frozenset({'user', 'instruction'})
+# user prompt 使用 context/question 占位符的数据集，其余使用 problem_text/question_text
+_CONTEXT_STYLE_DATASETS = frozenset({'folio', 'ar_lsat', 'proofwriter'})
+
+def _preload_prompt_files()->Dict[tuple,bytes]:
+    """
+    模块加载时把 all_prompt 下的全部 .txt 一次性顺序读入内存（bytes，用到时再解码）
+    数据集子目录中的文件记为 (dataset, 文件名)，根目录中的文件记为 (None, 文件名)，文件名不含 .txt
+    """
+    folder_to_dataset = {folder: dataset for dataset, folder in _PROMPT_FOLDERS.items()}
+    prompt_bytes = {}
+    with os.scandir(_PROMPT_ROOT) as root_entries:
+        for entry in root_entries:
+            if entry.is_dir() and entry.name in folder_to_dataset:
+                with os.scandir(entry.path) as files:
+                    file_entries = [(folder_to_dataset[entry.name], f) for f in files]
+            elif entry.is_file():
+                file_entries = [(None, entry)]
+            else:
+                continue
+            for dataset, f in file_entries:
+                if f.is_file() and f.name.endswith('.txt'):
+                    with open(f.path, 'rb') as fh:
+                        prompt_bytes[(dataset, f.name[:-4])] = fh.read()
+    return prompt_bytes
+
+_PROMPT_BYTES = _preload_prompt_files()
+
+def _decode_prompt(data:bytes)->str:
+    # 与文本模式读取保持一致：utf-8 解码并统一换行符
+    return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
 def detect_dataset_type(problem)->str:
     """根据问题ID或内容检测数据集类型"""
     problem_id = problem.get('id', '').lower()
@@ -34,85 +84,144 @@ def detect_dataset_type(problem)->str:
                 return 'logical_deduction'
             return 'ar_lsat'
 
+@lru_cache(maxsize=64)
 def _simply_return_prompt(dataset:str,prompt_type:str)->str:
-    # 获取prompt
-    prompt_folder_names = {
-        'prontoqa': 'prontoQA',
-        'folio': 'folio',
-        'logical_deduction': 'logicaldeduction',
-        'ar_lsat': 'arlsat',
-        'proofwriter': 'proofwriter',
+    # 获取prompt；文件内容已在模块加载时读入内存，这里只在首次访问时解码（结果缓存）
+    assert prompt_type in _VALID_PROMPT_TYPES
+    return _decode_prompt(_PROMPT_BYTES[(dataset, prompt_type)])
+
+@lru_cache(maxsize=64)
+def _compile_template(text:str):
+    """
+    把 str.format 模板预先解析成 (字面量, 字段名) 列表，返回填充函数 fill(values)->str
+    prompt 文件内容已被缓存，同一模板只解析一次；
+    只处理本项目用到的简单 {name} 字段，带格式说明/转换等复杂字段的模板退回 str.format
+    """
+    parsed = []
+    for literal, field, spec, conversion in string.Formatter().parse(text):
+        if field is not None and (spec or conversion or not field.isidentifier()):
+            return lambda values: text.format(**values)
+        parsed.append((literal, field))
+
+    def fill(values):
+        return "".join([literal if field is None else literal + str(values[field])
+                        for literal, field in parsed])
+    return fill
+
+def _build_user_values(dataset:str, context:str, question:str, options_text:str, extra_info:str=None)->Dict[str,str]:
+    """根据数据集类型提供正确的占位符映射；extra_info 不为 None 时（修复轮）额外填入 info_text"""
+    if dataset in _CONTEXT_STYLE_DATASETS:
+        values = {'context':context, 'question':question, 'options_text':options_text}
+    else:
+        values = {'problem_text':context, 'question_text':question, 'options_text':options_text}
+    if extra_info is not None:
+        values['info_text'] = extra_info
+    return values
+
+def _render_user_prompt(dataset:str, prompt_type:str, values:Dict[str,str])->str:
+    """取出 (dataset, prompt_type) 的模板并用 values 填充"""
+    return _compile_template(_simply_return_prompt(dataset, prompt_type))(values)
+
+@lru_cache(maxsize=8)
+def _single_text_prefix(dataset:str)->str:
+    """单文本模式的固定前缀：instruction + 分隔线，只与数据集有关"""
+    return "\n\n".join([_simply_return_prompt(dataset,'instruction'), _SEPARATOR, ""])
+
+@lru_cache(maxsize=8)
+def _system_message(dataset:str)->Dict[str,str]:
+    """
+    每个数据集的 system 消息只构建一次，所有对话共享同一个 dict
+    调用方只能读取；需要修改时请先复制
+    """
+    return {
+        'role': 'system',
+        'content': _simply_return_prompt(dataset,'instruction'),
     }
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    prompt_folder = os.path.join(current_dir, 'all_prompt', prompt_folder_names[dataset])
 
-    assert prompt_type in ['instruction','user','refine_code','refine_semantic']
-    prompt_path = os.path.join(prompt_folder, prompt_type+'.txt')
+@lru_cache(maxsize=8)
+def get_prompt_template(dataset:str)->tuple:
+    """
+    每个数据集首轮对话用到的 (system 消息, user 模板填充函数 fill(values)->str)，只准备一次
+    之后每道题只需填充 user 模板
+    """
+    return _system_message(dataset), _compile_template(_simply_return_prompt(dataset, 'user'))
+
+@lru_cache(maxsize=8)
+def compile_prompt_builders(dataset:str)->tuple:
+    """
+    为数据集生成专用的 (make_messages, make_next_messages) 两个构建函数
+
+    模板、占位符名称和 system 消息在这里一次性确定并绑定到闭包中，
+    每道题、每轮修复调用时不再按数据集类型查找和分支：
+        make_messages(context, question, options_text)
+        make_next_messages(context, question, options_text, extra_type_is_semantic, extra_info, llm_output)
+    """
+    system_message, fill_user = get_prompt_template(dataset)
+    fill_refine_code = _compile_template(_simply_return_prompt(dataset, 'refine_code'))
+    fill_refine_semantic = _compile_template(_simply_return_prompt(dataset, 'refine_semantic'))
+    if dataset in _CONTEXT_STYLE_DATASETS:
+        context_key, question_key = 'context', 'question'
+    else:
+        context_key, question_key = 'problem_text', 'question_text'
+
+    def make_messages(context:str, question:str, options_text:str)->List[Dict[str,str]]:
+        values = {context_key:context, question_key:question, 'options_text':options_text}
+        return [
+            system_message,
+            {
+                'role': 'user',
+                'content': fill_user(values),
+            }
+        ]
 
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-        return content
+    def make_next_messages(context:str, question:str, options_text:str,
+                           extra_type_is_semantic:bool, extra_info:str, llm_output:str)->List[Dict[str,str]]:
+        values = {context_key:context, question_key:question, 'options_text':options_text}
+        if extra_info is not None:
+            values['info_text'] = extra_info
+        fill = fill_refine_semantic if extra_type_is_semantic else fill_refine_code
+        return [
+            {
+                'role': 'assistant',
+                'content':llm_output,
+            },
+            {
+                'role': 'user',
+                'content': fill(values),
+            }
+        ]
+
+    return make_messages, make_next_messages
 
 def build_initial_messages_for_all_datasets(dataset:str, context:str, question:str, options_text:str)->List[Dict[str,str]]:
     # 根据数据集返回初始的messages以开始和llm对话
-    instruction_prompt = _simply_return_prompt(dataset,'instruction')
-    user_prompt = _simply_return_prompt(dataset,'user')
-
-    # 根据数据集类型提供正确的参数映射
-    if dataset in ['folio', 'ar_lsat', 'proofwriter']:
-        user_prompt_values={
-            'context':context,
-            'question':question,
-            'options_text':options_text,
-        }
-    else:
-        user_prompt_values={
-            'problem_text':context,
-            'question_text':question,
-            'options_text':options_text,
-        }
-    real_user_prompt = user_prompt.format(**user_prompt_values)
-    messages=[
-        {
-            'role': 'system',
-            'content':instruction_prompt,
-        },
-        {
-            'role': 'user',
-            'content': real_user_prompt,
-        }
-    ]
-    return messages
+    return compile_prompt_builders(dataset)[0](context, question, options_text)
 
 def build_next_messages_for_all_datasets(dataset:str, context:str, question:str, options_text:str,
                                          extra_type_is_semantic:bool, extra_info:str, llm_output:str)->List[Dict[str,str]]:
-    user_prompt = _simply_return_prompt(dataset,'refine_semantic' if extra_type_is_semantic else 'refine_code')
-
-    # 根据数据集类型提供正确的参数映射
-    if dataset in ['folio', 'ar_lsat', 'proofwriter']:
-        user_prompt_values={
-            'info_text':extra_info,
-            'context':context,
-            'question':question,
-            'options_text':options_text,
-        }
-    else:
-        user_prompt_values={
-            'info_text':extra_info,
-            'problem_text':context,
-            'question_text':question,
-            'options_text':options_text,
-        }
-    real_user_prompt = user_prompt.format(**user_prompt_values)
+    return compile_prompt_builders(dataset)[1](context, question, options_text,
+                                               extra_type_is_semantic, extra_info, llm_output)
+
+def build_batched_initial_messages(dataset:str, question_contexts:List[tuple])->List[Dict[str,str]]:
+    """
+    把同一数据集的多道题（每项为 (context, question, options_text)）合并成一次请求
+    要求模型按题目顺序给出同样数量的 ```python 代码块，调用方按顺序切分
+    """
+    count = len(question_contexts)
+    system_message, fill_user = get_prompt_template(dataset)
+    parts = [f"Solve the following {count} problems independently. "
+             f"Reply with exactly {count} ```python code blocks, one complete script per problem, "
+             f"in the same order as the problems. Do not merge problems into one script."]
+    for number, question_context in enumerate(question_contexts, 1):
+        parts.append(_SEPARATOR)
+        parts.append(f"Problem {number} of {count}:")
+        parts.append(fill_user(_build_user_values(dataset, *question_context)))
 
     messages=[
-        {
-            'role': 'assistant',
-            'content':llm_output,
-        },
+        system_message,
         {
             'role': 'user',
-            'content': real_user_prompt,
+            'content': "\n\n".join(parts),
         }
     ]
     return messages
@@ -122,26 +231,11 @@ def build_single_text_message_for_all_datasets(dataset:str, context:str, questio
     单文本模式：将instruction和user内容合并成一个大文本块
     作为单个user消息发送，不包含system prompt和assistant消息
     """
-    instruction_prompt = _simply_return_prompt(dataset,'instruction')
-    user_prompt = _simply_return_prompt(dataset,'user')
-
-    # 根据数据集类型提供正确的参数映射
-    if dataset in ['folio', 'ar_lsat', 'proofwriter']:
-        user_prompt_values={
-            'context':context,
-            'question':question,
-            'options_text':options_text,
-        }
-    else:
-        user_prompt_values={
-            'problem_text':context,
-            'question_text':question,
-            'options_text':options_text,
-        }
-    real_user_prompt = user_prompt.format(**user_prompt_values)
+    user_values = _build_user_values(dataset, context, question, options_text)
+    real_user_prompt = _render_user_prompt(dataset, 'user', user_values)
     
-    # 合并instruction和user内容成一个大文本块
-    combined_text = f"{instruction_prompt}\n\n========================================\n\n{real_user_prompt}"
+    # 合并instruction和user内容成一个大文本块（instruction + 分隔线 的前缀按数据集缓存）
+    combined_text = _single_text_prefix(dataset) + real_user_prompt
     
     messages=[
         {
@@ -158,30 +252,20 @@ def build_next_single_text_message_for_all_datasets(dataset:str, context:str, qu
     单文本模式的后续调用（旧版）：将所有信息（包括之前的错误和修复建议）合并成一个大文本块
     保留用于向后兼容
     """
-    user_prompt = _simply_return_prompt(dataset,'refine_semantic' if extra_type_is_semantic else 'refine_code')
-
-    # 根据数据集类型提供正确的参数映射
-    if dataset in ['folio', 'ar_lsat', 'proofwriter']:
-        user_prompt_values={
-            'info_text':extra_info,
-            'context':context,
-            'question':question,
-            'options_text':options_text,
-        }
-    else:
-        user_prompt_values={
-            'info_text':extra_info,
-            'problem_text':context,
-            'question_text':question,
-            'options_text':options_text,
-        }
-    real_user_prompt = user_prompt.format(**user_prompt_values)
+    prompt_type = 'refine_semantic' if extra_type_is_semantic else 'refine_code'
+    user_values = _build_user_values(dataset, context, question, options_text, extra_info)
+    real_user_prompt = _render_user_prompt(dataset, prompt_type, user_values)
     
     # 合并所有上下文成一个大文本块
     # 格式：[历史上下文] + [之前的LLM输出] + [修复提示]
     accumulated_context=original_message[0]['content']
 
-    combined_text = f"{accumulated_context}\n\n========================================\n\nPrevious attempt output:\n\n{llm_output}\n\n========================================\n\nFix instructions:\n\n{real_user_prompt}"
+    # 各段放进列表一次 join，避免逐段拼接长字符串
+    combined_text = "\n\n".join([
+        accumulated_context,
+        _SEPARATOR, "Previous attempt output:", llm_output,
+        _SEPARATOR, "Fix instructions:", real_user_prompt,
+    ])
     
     messages=[
         {
@@ -192,11 +276,8 @@ def build_next_single_text_message_for_all_datasets(dataset:str, context:str, qu
     return messages
 
 
+@lru_cache(maxsize=8)
 def get_original_semantic_prompt(prompt_type:str)->str:
-    assert prompt_type in ['user','instruction']
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    prompt_path = os.path.join(current_dir, 'all_prompt', 'semantic_check_'+prompt_type+'.txt')
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-        return content
+    assert prompt_type in _VALID_SEMANTIC_PROMPT_TYPES
+    return _decode_prompt(_PROMPT_BYTES[(None, 'semantic_check_'+prompt_type)])
 
@@ -0,0 +1,277 @@
+"""
+LLM 响应缓存
+
+按 (API 地址, 模型, 温度, messages) 的 sha256 精确匹配缓存成功的响应，跨运行持久化到磁盘。
+安装了 diskcache 时使用它作为存储，否则每条响应存为一个 JSON 文件。
+可选的近似匹配：精确未命中时，对最后一条用户消息做句向量最近邻查找（需要
+sentence-transformers 与 numpy），只在其余消息完全相同的修复轮次请求之间匹配。
+异步接口中的缓存读写与句向量计算放到线程中执行，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from request import LLMClient, RateLimiter
+
+try:
+    import orjson  # 可选依赖：C 实现的 JSON 解析器，读取缓存文件更快
+except ImportError:
+    orjson = None
+
+try:
+    import diskcache  # 可选依赖：基于 SQLite 的磁盘缓存，条目多时比单文件存储更省 inode
+except ImportError:
+    diskcache = None
+
+try:
+    import numpy as np  # 可选依赖：近似匹配时计算余弦相似度
+    from sentence_transformers import SentenceTransformer  # 可选依赖：计算句向量
+except ImportError:
+    np = None
+    SentenceTransformer = None
+
+# LLM 响应缓存目录
+LLM_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'logic_assist', 'llm')
+
+# 近似匹配使用的句向量模型与余弦相似度阈值
+SEMANTIC_MODEL_NAME = 'all-MiniLM-L6-v2'
+SEMANTIC_THRESHOLD = 0.97
+
+# 文件存储在内存中保留的最近响应条数，超出后淘汰最久未用的（磁盘上的文件不受影响）
+FILE_STORE_MEMORY_SIZE = 1024
+
+
+def make_cache_key(base_url: str, model: str, temperature: float, messages: List[Dict[str, Any]]) -> str:
+    """
+    计算请求的缓存键：规范化 JSON（键排序）后取 sha256
+
+    API 地址也计入键中：自定义地址指向的后端可能用同一个模型名提供不同的模型
+    """
+    payload = json.dumps({"base_url": base_url, "model": model, "t": temperature, "messages": messages},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _FileStore:
+    """diskcache 不可用时的存储：每个键一个 JSON 文件，内存中再保留最近用到的一部分"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                self._memory.move_to_end(key)
+        if hit is not None:
+            return hit
+        try:
+            with open(os.path.join(self.directory, f'{key}.json'), 'rb') as f:
+                data = f.read()
+            hit = orjson.loads(data) if orjson is not None else json.loads(data)
+        except (OSError, ValueError):
+            return None
+        self._remember(key, hit)
+        return hit
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            if len(self._memory) > FILE_STORE_MEMORY_SIZE:
+                self._memory.popitem(last=False)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self._remember(key, value)
+        path = os.path.join(self.directory, f'{key}.json')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # 先写临时文件再原子替换，避免其它进程读到写了一半的缓存
+            tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """获取进程内共享的缓存存储（首次调用时创建）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = diskcache.Cache(LLM_CACHE_DIR) if diskcache is not None else _FileStore(LLM_CACHE_DIR)
+        return _store
+
+
+class _SemanticIndex:
+    """
+    近似匹配索引：sqlite 中保存 (分组键, 归一化句向量, 精确缓存键)
+
+    分组键由 API 地址、模型、温度和除最后一条消息外的全部消息决定，只有同组的请求才会互相匹配，
+    命中后返回对应的精确缓存键，响应本身仍从精确缓存中读取。
+    首轮请求的题目本身就在最后一条消息里，其余消息对所有题目都相同，不做近似匹配，
+    否则相似的两道题会拿到对方的代码。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._model = None
+        self._groups = {}  # 分组键 -> (句向量矩阵, 精确缓存键列表)，首次查询该组时从 sqlite 载入
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with sqlite3.connect(path) as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS semantic '
+                         '(grp TEXT, embedding BLOB, key TEXT PRIMARY KEY)')
+            conn.execute('CREATE INDEX IF NOT EXISTS semantic_grp ON semantic (grp)')
+
+    @staticmethod
+    def group_key(base_url: str, model: str, temperature: float, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """返回请求所在的分组键；前面的消息里没有用户消息（即首轮请求）时返回 None，不做近似匹配"""
+        if not any(message.get('role') == 'user' for message in messages[:-1]):
+            return None
+        return make_cache_key(base_url, model, temperature, messages[:-1])
+
+    def embed(self, text: str):
+        """计算归一化句向量（首次调用时加载模型）"""
+        with self._model_lock:
+            if self._model is None:
+                self._model = SentenceTransformer(SEMANTIC_MODEL_NAME)
+        return self._model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def _load_group(self, group: str):
+        with sqlite3.connect(self.path) as conn:
+            rows = conn.execute('SELECT embedding, key FROM semantic WHERE grp = ?', (group,)).fetchall()
+        if rows:
+            matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for blob, _ in rows])
+        else:
+            matrix = None
+        return matrix, [key for _, key in rows]
+
+    def nearest(self, group: str, vector) -> Optional[str]:
+        """返回同组中与句向量 vector 余弦相似度超过阈值的最近请求的精确缓存键"""
+        with self._lock:
+            if group not in self._groups:
+                self._groups[group] = self._load_group(group)
+            matrix, keys = self._groups[group]
+        if matrix is None:
+            return None
+        scores = matrix @ vector
+        best = int(scores.argmax())
+        return keys[best] if scores[best] > SEMANTIC_THRESHOLD else None
+
+    def add(self, group: str, vector, key: str):
+        with self._lock:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute('INSERT OR IGNORE INTO semantic VALUES (?, ?, ?)', (group, vector.tobytes(), key))
+            if group in self._groups:
+                matrix, keys = self._groups[group]
+                if key not in keys:
+                    matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+                    self._groups[group] = (matrix, keys + [key])
+
+
+_semantic_index = None
+
+
+def get_semantic_index() -> Optional[_SemanticIndex]:
+    """获取进程内共享的近似匹配索引；未安装 sentence-transformers / numpy 时返回 None"""
+    global _semantic_index
+    if SentenceTransformer is None or np is None:
+        return None
+    with _store_lock:
+        if _semantic_index is None:
+            _semantic_index = _SemanticIndex(os.path.join(LLM_CACHE_DIR, 'semantic.sqlite'))
+        return _semantic_index
+
+
+class CachedLLMClient(LLMClient):
+    """
+    带响应缓存的 LLMClient
+
+    只缓存温度为 0 的成功响应：温度大于 0 时调用方期望每次采样不同（如多数投票），
+    直接透传给 LLMClient。semantic=True 且可选依赖齐全时，精确未命中再做近似匹配。
+    """
+
+    def __init__(self, api_key: str, model: str = 'gpt-3.5-turbo',
+                 custom_api_base: Optional[str] = None, rate_limiter: Optional[RateLimiter] = None,
+                 semantic: bool = False):
+        super().__init__(api_key, model, custom_api_base, rate_limiter)
+        self.cache = get_store()
+        self.semantic_index = get_semantic_index() if semantic else None
+
+    @staticmethod
+    def _last_text(messages):
+        content = messages[-1].get('content') if messages else None
+        return content if isinstance(content, str) else None
+
+    def _lookup(self, messages, temperature):
+        """
+        返回 (缓存键, 命中的响应, 近似匹配信息)；不可缓存时缓存键为 None
+
+        近似匹配信息为 (分组键, 句向量)，未做近似查找时为 None；写入缓存时直接复用，不再重复计算句向量
+        """
+        if temperature != 0:
+            return None, None, None
+        key = make_cache_key(self.base_url, self.config['model_name'], temperature, messages)
+        hit = self.cache.get(key)
+        semantic = None
+        if hit is None and self.semantic_index is not None:
+            text = self._last_text(messages)
+            group = _SemanticIndex.group_key(self.base_url, self.config['model_name'], temperature, messages)
+            if text is not None and group is not None:
+                semantic = (group, self.semantic_index.embed(text))
+                near_key = self.semantic_index.nearest(*semantic)
+                if near_key is not None:
+                    hit = self.cache.get(near_key)
+        if hit is not None:
+            hit = dict(hit, cached=True)
+        return key, hit, semantic
+
+    def _store_result(self, key, semantic, result):
+        if key is not None and result['success']:
+            # raw_response 是 SDK 对象，不能序列化，也没有调用方使用
+            self.cache.set(key, {k: v for k, v in result.items() if k != 'raw_response'})
+            if semantic is not None:
+                group, vector = semantic
+                self.semantic_index.add(group, vector, key)
+
+    def send_loop_messages(self, messages: List[Dict[str, Any]], max_tokens: int = 10000,
+                           temperature: float = 0.0, timeout: int = 120,
+                           max_retries: int = 5) -> Dict[str, Any]:
+        """同 LLMClient.send_loop_messages，命中缓存时不发请求"""
+        key, hit, semantic = self._lookup(messages, temperature)
+        if hit is not None:
+            return hit
+        result = super().send_loop_messages(messages, max_tokens, temperature, timeout, max_retries)
+        self._store_result(key, semantic, result)
+        return result
+
+    async def send_loop_messages_async(self, messages: List[Dict[str, Any]], max_tokens: int = 10000,
+                                       temperature: float = 0.0, timeout: int = 120,
+                                       max_retries: int = 5, stop_at_code_block: bool = False) -> Dict[str, Any]:
+        """
+        同 LLMClient.send_loop_messages_async，命中缓存时不发请求
+
+        缓存读写、模型加载和句向量计算都是同步阻塞的，放到线程中执行
+        """
+        key, hit, semantic = await asyncio.to_thread(self._lookup, messages, temperature)
+        if hit is not None:
+            return hit
+        result = await super().send_loop_messages_async(messages, max_tokens, temperature, timeout, max_retries,
+                                                        stop_at_code_block)
+        await asyncio.to_thread(self._store_result, key, semantic, result)
+        return result
@@ -11,29 +11,230 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import json
+import mmap
 import os
 import threading
+import time
+import asyncio
+import functools
+import hashlib
+import itertools
 import re
+import signal
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Optional
 
-from request import LLMClient, query_llm_loop_messages, test_api_connection
+from request import LLMClient, RateLimiter, test_api_connection
+from llm_cache import CachedLLMClient
 from semantic_check import generate_semantic_check_full_prompt, semantic_check_response_analyze
-from dataset_and_prompt import (detect_dataset_type, build_initial_messages_for_all_datasets, 
-                                 build_next_messages_for_all_datasets, build_single_text_message_for_all_datasets,
-                                 build_next_single_text_message_for_all_datasets)
-from z3_execute import execute_z3_code
+from dataset_and_prompt import (detect_dataset_type, compile_prompt_builders, build_single_text_message_for_all_datasets,
+                                 build_next_single_text_message_for_all_datasets, build_batched_initial_messages)
+from z3_execute import execute_z3_code, warm_up as warm_up_z3, Z3_TIMEOUT_ERROR
 from translate import translate_dataset, save_translated_dataset
 
+try:
+    import orjson  # 可选依赖：C 实现的 JSON 解析器，加载大型数据集、导出结果更快
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # 可选依赖：流式解析，大型数据集不必先把整个文件读入内存
+except ImportError:
+    ijson = None
+
+# 没有 orjson 时，超过该大小的数据集改用 ijson 流式解析
+STREAM_THRESHOLD = 16 * 1024 * 1024
+# 有 orjson 时，超过该大小的数据集用 mmap 映射后解析
+MMAP_THRESHOLD = 100 * 1024 * 1024
+
+# 单次 Z3 执行（含自动修复和进程间传输）的总超时，秒
+Z3_CALL_TIMEOUT = 30
+
+# Z3 执行结果缓存的容量：相同代码（含是否自动修复）直接复用上次的执行结果
+Z3_RESULT_CACHE_SIZE = 4096
+_z3_result_cache = OrderedDict()  # blake2b(代码) -> (结果, 错误, 修复记录)，只在事件循环线程中读写
+
+# 批量请求中为每道题预留的输出 token 数；整批的预算不能超过模型的最大输出长度
+BATCH_TOKENS_PER_PROBLEM = 2000
+
+# 评测期间内存中只保留最近这么多条结果，完整结果逐题写入 logs/results_*.jsonl
+RESULTS_PREVIEW_SIZE = 1000
+
+# LLM 响应中的 Python 代码块
+_PY_BLOCK_RE = re.compile(r'```python\s*(.*?)\s*```', re.DOTALL | re.IGNORECASE)
+
+# keys 文件：DS / GPT 标题行（不区分大小写）之后、下一个标题行之前的最后一个 sk- 开头的行即为该服务商的 key
+_API_KEY_RE = re.compile(
+    r'^\s*((?i:DS|GPT))\s*$'                       # 标题行
+    r'(?:(?!^\s*(?i:DS|GPT)\s*$)[\s\S])*'            # 跳过内容，直到下一个标题行之前（贪婪：取最后一个 key）
+    r'^[ \t]*(sk-[^\r\n]*?)\s*$',                   # key 行
+    re.MULTILINE)
+
+
+def load_dataset(path: str):
+    """
+    加载数据集 JSON 文件（顶层为题目列表）
+
+    优先用 orjson 整体解析；没有 orjson 而文件很大时用 ijson 逐条流式解析；否则回退到 json.load
+    """
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                # 超大文件直接映射给 orjson 解析，省去一次整文件拷贝
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return orjson.loads(memoryview(mm))
+            return orjson.loads(f.read())
+    if ijson is not None and os.path.getsize(path) >= STREAM_THRESHOLD:
+        with open(path, 'rb') as f:
+            return list(ijson.items(f, 'item', use_float=True))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# 颜色方案 - Catppuccin Mocha 风格
+CTP_BG = '#1e1e2e'
+CTP_SURFACE = '#313244'
+CTP_OVERLAY = '#45475a'
+CTP_TEXT = '#cdd6f4'
+CTP_SUBTEXT = '#a6adc8'
+CTP_BLUE = '#89b4fa'
+CTP_GREEN = '#a6e3a1'
+CTP_RED = '#f38ba8'
+CTP_YELLOW = '#f9e2af'
+CTP_MAUVE = '#cba6f7'
+CTP_TEAL = '#94e2d5'
+
+_COLORS = {
+    'bg': CTP_BG,
+    'surface': CTP_SURFACE,
+    'overlay': CTP_OVERLAY,
+    'text': CTP_TEXT,
+    'subtext': CTP_SUBTEXT,
+    'blue': CTP_BLUE,
+    'green': CTP_GREEN,
+    'red': CTP_RED,
+    'yellow': CTP_YELLOW,
+    'mauve': CTP_MAUVE,
+    'teal': CTP_TEAL,
+}
+
+# 统计面板的 (键, 显示名, 颜色)
+_STATS_ITEMS = (
+    ('total', '总题数', CTP_TEXT),
+    ('correct', '正确', CTP_GREEN),
+    ('wrong', '错误', CTP_RED),
+    ('error', '异常', CTP_YELLOW),
+    ('accuracy', '准确率', CTP_MAUVE),
+)
+
+# 日志级别的数值，用于按界面选择的级别过滤
+_LOG_LEVELS = {"DEBUG": 0, "INFO": 1, "WARNING": 2, "ERROR": 3}
+
+
+def _json_line(obj) -> bytes:
+    """把一条结果序列化为 JSONL 的一行（UTF-8，以换行结尾）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _response_content(response: dict) -> str:
+    """取出 LLM 响应的文本，请求失败时抛出异常"""
+    if not response['success']:
+        raise Exception(response.get('error', 'API请求失败'))
+    return response['content']
+
+
+def _new_summary():
+    """导出用的统计：评测过程中逐题累加，导出时无需再遍历全部结果"""
+    return {'total': 0, 'correct': 0, 'wrong': 0, 'error': 0,
+            'correct_problems': [], 'wrong_problems': []}
+
+
+@dataclass(slots=True)
+class _Z3Worker:
+    """只有一个工作进程的 Z3 执行器；进程卡住时只结束这一个进程，不影响其它正在进行的求解"""
+    pool: ProcessPoolExecutor
+    pid: int
+
+
+@dataclass(slots=True)
+class ProblemResult:
+    """单道题的评测结果"""
+    id: Any
+    predicted: Optional[str]
+    correct: str
+    is_correct: bool = False
+    error: Optional[str] = None
+    cancelled: bool = False
+    attempts: int = 1
+    mode: Optional[str] = None
+    pseudocode: Optional[str] = None
+    code: Optional[str] = None
+    # 原题信息，汇总时补上
+    context: Any = None
+    question: Any = None
+    options: Any = None
+    # 多数投票模式下的各次结果
+    voting_results: Optional[list] = None
+    voting_counts: Optional[dict] = None
+    individual_results: Optional[list] = None
+
+    def to_dict(self) -> dict:
+        """转成导出用的字典；非投票模式不输出投票相关字段"""
+        data = {
+            'id': self.id,
+            'predicted': self.predicted,
+            'correct': self.correct,
+            'is_correct': self.is_correct,
+            'error': self.error,
+            'cancelled': self.cancelled,
+            'attempts': self.attempts,
+            'mode': self.mode,
+            'pseudocode': self.pseudocode,
+            'code': self.code,
+            'context': self.context,
+            'question': self.question,
+            'options': self.options,
+        }
+        if self.voting_results is not None:
+            data['voting_mode'] = True
+            data['voting_results'] = self.voting_results
+            data['voting_counts'] = self.voting_counts
+            data['individual_results'] = [r.to_dict() for r in self.individual_results]
+        return data
+
 
 class LogicEvalApp:
     """逻辑推理评测应用"""
-    
+
+    # 固定实例属性，避免每个实例带 __dict__，属性访问也更快
+    __slots__ = (
+        '_counters', '_llm_client', '_log_file_dirty', '_log_flushed_at', '_log_queue',
+        '_results_path', '_stop', '_summary', '_ui_snapshot', '_z3_idle', '_z3_workers', 'api_base_var',
+        'api_key_entry', 'api_key_var', 'api_keys', 'auto_scroll_var', 'batch_size_var', 'colors',
+        'dataset_entry', 'dataset_var', 'is_running', 'limit_var', 'llm_cache_var', 'log_file',
+        'log_level_var', 'log_text', 'majority_voting_var', 'mode_var', 'model_var', 'progress_bar',
+        'progress_label', 'progress_var', 'provider_label', 'refinement_code_var', 'repair_var',
+        'results', 'root', 'rpm_var', 'semantic_cache_var', 'semantic_check_var', 'show_key_var',
+        'start_btn', 'start_time', 'stats_labels', 'stop_btn', 'time_label', 'total_problems',
+        'workers_var',
+    )
+
+    @property
+    def stop_flag(self) -> bool:
+        """是否已请求停止（兼容旧的布尔属性，只读）"""
+        return self._stop.is_set()
+
     def __init__(self, root):
         self.root = root
         self.root.title("逻辑推理评测系统 - Logic Reasoning Evaluator")
         self.root.geometry("1200x900")  # 增大窗口尺寸以容纳更多日志
-        self.root.configure(bg='#1e1e2e')
+        self.root.configure(bg=CTP_BG)
         
         # 绑定窗口关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -43,19 +244,33 @@ class LogicEvalApp:
         
         # 状态变量
         self.is_running = False
-        self.stop_flag = False
-        self.results = []
+        self._stop = threading.Event()  # 停止信号：界面线程 set，评测线程检查
+        self.results = deque(maxlen=RESULTS_PREVIEW_SIZE)  # 最近的结果，完整结果见 _results_path
+        self._results_path = None  # 本轮评测逐题写入的 JSONL 结果文件
+        self._summary = _new_summary()
+        self._llm_client = None  # 评测期间共用的 LLMClient
+        self._z3_workers = []    # 执行 Z3 代码的工作进程，首次用到时创建，退出时关闭
+        self._z3_idle = None     # 本轮评测中空闲的 Z3 执行器（None 表示该位置尚未创建进程）
 
         # 时间跟踪
         self.start_time = None
         self.total_problems = 0
 
+        # 评测进度计数，只由评测线程修改，界面每 250ms 读取一次
+        self._counters = {'done': 0, 'correct': 0, 'wrong': 0, 'error': 0}
+        self._ui_snapshot = None  # 上次刷新界面时的 (总数, 完成, 正确, 错误, 异常)
+
         # 日志控制变量
         self.log_level_var = tk.StringVar(value="INFO")
         self.auto_scroll_var = tk.BooleanVar(value=True)
         
+        # 后台线程产生的日志先进队列，由主线程定时批量写入界面
+        self._log_queue = deque()
+
         # 文件日志
         self.log_file = None
+        self._log_file_dirty = False   # 缓冲区中是否有尚未 flush 的日志
+        self._log_flushed_at = 0       # 上次 flush 的时间（monotonic 秒）
         self.setup_file_logging()
         
         # 加载 API keys
@@ -66,6 +281,9 @@ class LogicEvalApp:
         
         # 设置默认 API key
         self.update_api_key_for_model()
+
+        # 启动日志队列的定时刷新
+        self.root.after(50, self._drain_log)
     
     def setup_file_logging(self):
         """设置文件日志"""
@@ -79,10 +297,10 @@ class LogicEvalApp:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             log_filename = os.path.join(logs_dir, f'eval_{timestamp}.log')
             
-            # 打开日志文件
-            self.log_file = open(log_filename, 'a', encoding='utf-8')
-            self.log_file.write(f"=== 评测日志开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
-            self.log_file.flush()
+            # 以带 64KB 缓冲的二进制追加模式打开，由 _write_log_file 按需 flush
+            self.log_file = open(log_filename, 'ab', buffering=64 * 1024)
+            self._write_log_file(f"=== 评测日志开始于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n",
+                                 flush=True)
             
             # 记录日志文件路径
             print(f"日志文件: {log_filename}")
@@ -99,17 +317,9 @@ class LogicEvalApp:
         try:
             if os.path.exists(keys_file):
                 with open(keys_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    lines = [l.strip() for l in content.split('\n') if l.strip()]
-                    
-                    current_provider = None
-                    for line in lines:
-                        if line.upper() == 'DS':
-                            current_provider = 'deepseek'
-                        elif line.upper() == 'GPT':
-                            current_provider = 'openai'
-                        elif line.startswith('sk-') and current_provider:
-                            keys[current_provider] = line
+                    content = f.read()
+                keys.update({('deepseek' if provider.upper() == 'DS' else 'openai'): key
+                             for provider, key in _API_KEY_RE.findall(content)})
         except Exception as e:
             self.log(f"加载 keys 文件失败: {e}", 'error')
         
@@ -130,24 +340,12 @@ class LogicEvalApp:
         style = ttk.Style()
         style.theme_use('clam')
         
-        # 颜色方案 - Catppuccin Mocha 风格
-        self.colors = {
-            'bg': '#1e1e2e',
-            'surface': '#313244',
-            'overlay': '#45475a',
-            'text': '#cdd6f4',
-            'subtext': '#a6adc8',
-            'blue': '#89b4fa',
-            'green': '#a6e3a1',
-            'red': '#f38ba8',
-            'yellow': '#f9e2af',
-            'mauve': '#cba6f7',
-            'teal': '#94e2d5',
-        }
+        # 颜色方案 - Catppuccin Mocha 风格（见模块顶部常量）
+        self.colors = _COLORS
         
         # 配置样式
-        style.configure('TFrame', background=self.colors['bg'])
-        style.configure('TLabel', background=self.colors['bg'], foreground=self.colors['text'], 
+        style.configure('TFrame', background=CTP_BG)
+        style.configure('TLabel', background=CTP_BG, foreground=CTP_TEXT, 
                        font=('Segoe UI', 10))
         style.configure('TButton', font=('Segoe UI', 10, 'bold'), padding=8)
         style.configure('TEntry', font=('Consolas', 10), padding=5)
@@ -155,15 +353,15 @@ class LogicEvalApp:
         
         # 标题样式
         style.configure('Title.TLabel', font=('Segoe UI', 18, 'bold'), 
-                       foreground=self.colors['mauve'])
+                       foreground=CTP_MAUVE)
         style.configure('Subtitle.TLabel', font=('Segoe UI', 11), 
-                       foreground=self.colors['subtext'])
+                       foreground=CTP_SUBTEXT)
         
         # 按钮样式
-        style.configure('Accent.TButton', background=self.colors['blue'], 
-                       foreground=self.colors['bg'])
+        style.configure('Accent.TButton', background=CTP_BLUE, 
+                       foreground=CTP_BG)
         style.map('Accent.TButton',
-                 background=[('active', self.colors['mauve']), ('pressed', self.colors['teal'])])
+                 background=[('active', CTP_MAUVE), ('pressed', CTP_TEAL)])
         
     def create_widgets(self):
         """创建界面组件"""
@@ -221,7 +419,7 @@ class LogicEvalApp:
         ttk.Entry(api_base_frame, textvariable=self.api_base_var, 
                  width=50).pack(side=tk.LEFT, padx=(0, 10), fill=tk.X, expand=True)
         ttk.Label(api_base_frame, text="(可选，留空使用默认)", 
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
         
         # 模型选择
         model_frame = ttk.Frame(config_frame)
@@ -235,9 +433,9 @@ class LogicEvalApp:
         model_combo.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Label(model_frame, text="提供商: ", 
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
         self.provider_label = ttk.Label(model_frame, text="openai", 
-                                        foreground=self.colors['teal'])
+                                        foreground=CTP_TEAL)
         self.provider_label.pack(side=tk.LEFT)
         model_combo.bind('<<ComboboxSelected>>', self.on_model_change)
         
@@ -265,7 +463,7 @@ class LogicEvalApp:
         mode_combo.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Label(mode_frame, text="(多轮消息调用模式)",
-                  foreground=self.colors['subtext'], font=('Segoe UI', 9)).pack(side=tk.LEFT, padx=(0, 20))
+                  foreground=CTP_SUBTEXT, font=('Segoe UI', 9)).pack(side=tk.LEFT, padx=(0, 20))
 
         # 语义检查选项
         semantic_check_frame = ttk.Frame(config_frame)
@@ -277,7 +475,7 @@ class LogicEvalApp:
                        variable=self.semantic_check_var,
                        command=self.on_semantic_check_toggle).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(semantic_check_frame, text="(验证推理过程的语义正确性)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
 
         # 代码修复选项
         refinement_code_frame = ttk.Frame(config_frame)
@@ -289,7 +487,7 @@ class LogicEvalApp:
                        variable=self.refinement_code_var,
                        command=self.on_refinement_code_toggle).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(refinement_code_frame, text="(代码执行失败时自动修复重试)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
         
         # Repair功能选项
         repair_frame = ttk.Frame(config_frame)
@@ -301,7 +499,7 @@ class LogicEvalApp:
                        variable=self.repair_var,
                        command=self.on_repair_toggle).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(repair_frame, text="(执行前自动修复代码语法错误)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
         
         # 多数投票功能选项
         voting_frame = ttk.Frame(config_frame)
@@ -313,7 +511,22 @@ class LogicEvalApp:
                        variable=self.majority_voting_var,
                        command=self.on_majority_voting_toggle).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(voting_frame, text="(运行3次取多数结果，失败默认A)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
+
+        # LLM响应缓存选项
+        llm_cache_frame = ttk.Frame(config_frame)
+        llm_cache_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(llm_cache_frame, text="响应缓存:", width=12).pack(side=tk.LEFT)
+        self.llm_cache_var = tk.BooleanVar(value=True)  # 默认开启
+        ttk.Checkbutton(llm_cache_frame, text="启用LLM响应缓存",
+                       variable=self.llm_cache_var,
+                       command=self.on_llm_cache_toggle).pack(side=tk.LEFT, padx=(0, 10))
+        self.semantic_cache_var = tk.BooleanVar(value=False)  # 默认关闭
+        ttk.Checkbutton(llm_cache_frame, text="近似匹配",
+                       variable=self.semantic_cache_var).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Label(llm_cache_frame, text="(相同请求直接复用磁盘上的响应，多数投票模式下不生效；近似匹配需安装 sentence-transformers)",
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
         
         
         # 题目数量限制
@@ -324,7 +537,7 @@ class LogicEvalApp:
         self.limit_var = tk.StringVar(value="0")
         ttk.Entry(limit_frame, textvariable=self.limit_var, width=10).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(limit_frame, text="(0表示不限制)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
 
         # Workers数量设置
         workers_frame = ttk.Frame(config_frame)
@@ -334,7 +547,27 @@ class LogicEvalApp:
         self.workers_var = tk.StringVar(value="4")
         ttk.Entry(workers_frame, textvariable=self.workers_var, width=10).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Label(workers_frame, text="(并行处理的工作线程数)",
-                 foreground=self.colors['subtext']).pack(side=tk.LEFT)
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
+
+        # 请求速率限制
+        rpm_frame = ttk.Frame(config_frame)
+        rpm_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(rpm_frame, text="每分钟请求:", width=12).pack(side=tk.LEFT)
+        self.rpm_var = tk.StringVar(value="0")
+        ttk.Entry(rpm_frame, textvariable=self.rpm_var, width=10).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Label(rpm_frame, text="(0表示不限制；遇到429时自动降低并发，之后逐步恢复)",
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
+
+        # 批量请求设置
+        batch_frame = ttk.Frame(config_frame)
+        batch_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(batch_frame, text="批量大小:", width=12).pack(side=tk.LEFT)
+        self.batch_size_var = tk.StringVar(value="1")  # 默认不合并
+        ttk.Entry(batch_frame, textvariable=self.batch_size_var, width=10).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Label(batch_frame, text="(每次请求合并的题数，每题约需2000输出token，超出模型上限时自动减小；仅direct模式且未开启语义检查/多数投票时生效)",
+                 foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
 
 
         # 控制按钮
@@ -379,7 +612,7 @@ class LogicEvalApp:
         self.progress_label.pack(side=tk.LEFT)
 
         # 时间估计
-        self.time_label = ttk.Label(progress_frame, text="", foreground=self.colors['blue'])
+        self.time_label = ttk.Label(progress_frame, text="", foreground=CTP_BLUE)
         self.time_label.pack(side=tk.RIGHT, padx=(10, 0))
 
         # 统计信息
@@ -390,18 +623,11 @@ class LogicEvalApp:
         stats_inner.pack(fill=tk.X)
 
         self.stats_labels = {}
-        stats_items = [
-            ('total', '总题数', self.colors['text']),
-            ('correct', '正确', self.colors['green']),
-            ('wrong', '错误', self.colors['red']),
-            ('error', '异常', self.colors['yellow']),
-            ('accuracy', '准确率', self.colors['mauve']),
-        ]
-
-        for key, name, color in stats_items:
+
+        for key, name, color in _STATS_ITEMS:
             frame = ttk.Frame(stats_inner)
             frame.pack(side=tk.LEFT, padx=(0, 20))
-            ttk.Label(frame, text=f"{name}:", foreground=self.colors['subtext']).pack(side=tk.LEFT)
+            ttk.Label(frame, text=f"{name}:", foreground=CTP_SUBTEXT).pack(side=tk.LEFT)
             self.stats_labels[key] = ttk.Label(frame, text="0", foreground=color,
                                                font=('Segoe UI', 12, 'bold'))
             self.stats_labels[key].pack(side=tk.LEFT, padx=(5, 0))
@@ -413,20 +639,20 @@ class LogicEvalApp:
         self.log_text = scrolledtext.ScrolledText(
             log_frame, 
             font=('Consolas', 9),
-            bg=self.colors['surface'],
-            fg=self.colors['text'],
-            insertbackground=self.colors['text'],
-            selectbackground=self.colors['overlay'],
+            bg=CTP_SURFACE,
+            fg=CTP_TEXT,
+            insertbackground=CTP_TEXT,
+            selectbackground=CTP_OVERLAY,
             wrap=tk.WORD
         )
         self.log_text.pack(fill=tk.BOTH, expand=True)
         
         # 配置日志标签颜色
-        self.log_text.tag_configure('info', foreground=self.colors['blue'])
-        self.log_text.tag_configure('success', foreground=self.colors['green'])
-        self.log_text.tag_configure('error', foreground=self.colors['red'])
-        self.log_text.tag_configure('warning', foreground=self.colors['yellow'])
-        self.log_text.tag_configure('highlight', foreground=self.colors['mauve'])
+        self.log_text.tag_configure('info', foreground=CTP_BLUE)
+        self.log_text.tag_configure('success', foreground=CTP_GREEN)
+        self.log_text.tag_configure('error', foreground=CTP_RED)
+        self.log_text.tag_configure('warning', foreground=CTP_YELLOW)
+        self.log_text.tag_configure('highlight', foreground=CTP_MAUVE)
         
     def toggle_key_visibility(self):
         """切换API Key显示/隐藏"""
@@ -476,6 +702,14 @@ class LogicEvalApp:
             self.log("多数投票模式已启用 (将运行3次并取多数结果)", 'info')
         else:
             self.log("多数投票模式已关闭", 'info')
+
+    def on_llm_cache_toggle(self):
+        """LLM响应缓存切换时的处理"""
+        enabled = self.llm_cache_var.get()
+        if enabled:
+            self.log("LLM响应缓存已启用", 'info')
+        else:
+            self.log("LLM响应缓存已关闭", 'info')
         
     def browse_dataset(self):
         """浏览选择数据集文件"""
@@ -502,7 +736,7 @@ class LogicEvalApp:
         
         def test():
             result = test_api_connection(api_key, model, api_base)
-            self.root.after(0, lambda: self._show_test_result(result))
+            self.root.after(0, self._show_test_result, result)
             
         threading.Thread(target=test, daemon=True).start()
         
@@ -518,30 +752,86 @@ class LogicEvalApp:
     def log(self, message: str, tag: str = None, level: str = "INFO"):
         """添加日志"""
         # 检查日志级别
-        log_levels = {"DEBUG": 0, "INFO": 1, "WARNING": 2, "ERROR": 3}
         current_level = self.log_level_var.get()
-        if log_levels.get(level.upper(), 1) < log_levels.get(current_level, 1):
+        if _LOG_LEVELS.get(level.upper(), 1) < _LOG_LEVELS.get(current_level, 1):
             return
             
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
         
         # 输出到GUI
         self.log_text.insert(tk.END, f"[{timestamp}] ", 'info')
         self.log_text.insert(tk.END, f"{message}\n", tag)
         
-        # 输出到文件
-        if self.log_file:
-            try:
-                self.log_file.write(log_entry + "\n")
-                self.log_file.flush()
-            except Exception as e:
-                print(f"写入日志文件失败: {e}")
+        # 输出到文件（错误日志立即落盘）
+        self._write_log_file(log_entry + "\n", flush=level.upper() == "ERROR" or tag == 'error')
         
         # 自动滚动到底部
         if self.auto_scroll_var.get():
             self.log_text.see(tk.END)
         
+    def _write_log_file(self, text: str, flush: bool = False):
+        """
+        写入日志文件：平时只写进缓冲区，由 _drain_log 每秒 flush 一次；
+        flush 为 True（如错误日志）时立即落盘
+        """
+        if not self.log_file:
+            return
+        try:
+            self.log_file.write(text.encode('utf-8'))
+            self._log_file_dirty = True
+            if flush:
+                self._flush_log_file()
+        except Exception as e:
+            print(f"写入日志文件失败: {e}")
+
+    def _flush_log_file(self):
+        """把缓冲区中的日志写到磁盘"""
+        self.log_file.flush()
+        self._log_file_dirty = False
+        self._log_flushed_at = time.monotonic()
+
+    def log_async(self, message: str, tag: str = None, level: str = "INFO"):
+        """添加日志（可在任意线程调用）：只入队，由 _drain_log 在主线程统一写入"""
+        self._log_queue.append((message, tag, level))
+
+    def _drain_log(self):
+        """每 50ms 把排队的日志合并成一次插入、一次滚动、一次文件写入"""
+        queue = self._log_queue
+        if queue:
+            current_level = _LOG_LEVELS.get(self.log_level_var.get(), 1)
+            # 时间戳精确到秒，同一批日志共用一个
+            timestamp = time.strftime("%H:%M:%S")
+            segments = []
+            file_lines = []
+            has_error = False
+            for _ in range(min(len(queue), 200)):
+                message, tag, level = queue.popleft()
+                if _LOG_LEVELS.get(level.upper(), 1) < current_level:
+                    continue
+                has_error = has_error or level.upper() == "ERROR" or tag == 'error'
+                # Text.insert 支持多组 (文本, 标签) 参数，一次调用插入全部日志
+                segments.extend((f"[{timestamp}] ", 'info', f"{message}\n", tag or ()))
+                file_lines.append(f"[{timestamp}] {message}\n")
+
+            if segments:
+                self.log_text.insert(tk.END, *segments)
+
+                self._write_log_file(''.join(file_lines), flush=has_error)
+
+                if self.auto_scroll_var.get():
+                    self.log_text.see(tk.END)
+
+        # 缓冲区中的日志最多延迟 1 秒落盘
+        if self.log_file and self._log_file_dirty and time.monotonic() - self._log_flushed_at >= 1:
+            try:
+                self._flush_log_file()
+            except Exception as e:
+                print(f"写入日志文件失败: {e}")
+
+        # 队列里还有积压时尽快再处理一批
+        self.root.after(0 if queue else 50, self._drain_log)
+
     def clear_log(self):
         """清空日志"""
         self.log_text.delete(1.0, tk.END)
@@ -597,44 +887,58 @@ class LogicEvalApp:
             # 更新时间估计
             self._update_time_estimate(current, total)
 
+    def _refresh_progress(self):
+        """按当前计数刷新进度条和统计；计数没有变化时不重绘"""
+        counters = self._counters
+        total = self.total_problems
+        snapshot = (total, counters['done'], counters['correct'], counters['wrong'], counters['error'])
+        if total and snapshot != self._ui_snapshot:
+            self._ui_snapshot = snapshot
+            _, done, correct, wrong, error = snapshot
+            self.update_progress(done, total)
+            self.update_stats(done, correct, wrong, error)
+
+    def _tick_ui(self):
+        """评测期间每 250ms 刷新一次进度，代替每完成一题就调度一次界面更新"""
+        self._refresh_progress()
+        if self.is_running:
+            self.root.after(250, self._tick_ui)
+
     def _update_time_estimate(self, current, total):
         """更新时间估计"""
         if self.start_time is None or current == 0:
             self.time_label.config(text="")
             return
 
-        import time
-        elapsed_time = time.time() - self.start_time
+        # 全部用整数纳秒/秒计算；单调时钟不受系统时间调整影响
+        elapsed_ns = time.monotonic_ns() - self.start_time
 
         if current < total:
-            # 计算预计总时间和剩余时间
-            avg_time_per_problem = elapsed_time / current
-            remaining_problems = total - current
-            estimated_remaining = avg_time_per_problem * remaining_problems
+            # 计算剩余时间：平均每题耗时 × 剩余题数（四舍五入到秒）
+            remaining_ns = elapsed_ns * (total - current) // current
+            estimated_remaining = (remaining_ns + 500_000_000) // 1_000_000_000
 
             # 格式化时间显示
             if estimated_remaining < 60:
-                time_str = f"剩余 {estimated_remaining:.0f}秒"
+                time_str = f"剩余 {estimated_remaining}秒"
             elif estimated_remaining < 3600:
-                minutes = int(estimated_remaining // 60)
-                seconds = int(estimated_remaining % 60)
+                minutes, seconds = divmod(estimated_remaining, 60)
                 time_str = f"剩余 {minutes}分 {seconds}秒"
             else:
-                hours = int(estimated_remaining // 3600)
-                minutes = int((estimated_remaining % 3600) // 60)
-                time_str = f"剩余 {hours}时 {minutes}分"
+                hours, rest = divmod(estimated_remaining, 3600)
+                time_str = f"剩余 {hours}时 {rest // 60}分"
         else:
             # 已完成，显示总用时
+            elapsed_time = elapsed_ns // 1_000_000_000
             if elapsed_time < 60:
-                time_str = f"总用时 {elapsed_time:.1f}秒"
+                tenths = elapsed_ns // 100_000_000
+                time_str = f"总用时 {tenths // 10}.{tenths % 10}秒"
             elif elapsed_time < 3600:
-                minutes = int(elapsed_time // 60)
-                seconds = int(elapsed_time % 60)
+                minutes, seconds = divmod(elapsed_time, 60)
                 time_str = f"总用时 {minutes}分 {seconds}秒"
             else:
-                hours = int(elapsed_time // 3600)
-                minutes = int((elapsed_time % 3600) // 60)
-                time_str = f"总用时 {hours}时 {minutes}分"
+                hours, rest = divmod(elapsed_time, 3600)
+                time_str = f"总用时 {hours}时 {rest // 60}分"
 
         self.time_label.config(text=time_str)
         
@@ -666,14 +970,17 @@ class LogicEvalApp:
 
         # 更新UI状态
         self.is_running = True
-        self.stop_flag = False
+        self._stop.clear()
         self.start_btn.config(state=tk.DISABLED)
         self.stop_btn.config(state=tk.NORMAL)
-        self.results = []
+        self.results = deque(maxlen=RESULTS_PREVIEW_SIZE)
+        self._summary = _new_summary()
+        self._counters = {'done': 0, 'correct': 0, 'wrong': 0, 'error': 0}
+        self._ui_snapshot = None
 
         # 设置时间跟踪
-        import time
-        self.start_time = time.time()
+        self.start_time = time.monotonic_ns()
+        self.root.after(250, self._tick_ui)
 
         # 在后台线程运行评测
         threading.Thread(target=self._run_evaluation, args=(api_key, dataset_path),
@@ -681,12 +988,12 @@ class LogicEvalApp:
         
     def stop_evaluation(self):
         """停止评测"""
-        self.stop_flag = True
+        self._stop.set()
         self.log("正在停止评测，终止所有任务...", 'warning')
         self.stop_btn.config(state=tk.DISABLED)  # 防止重复点击
 
     def _get_question_context(self, problem)->tuple[str,str,str]:
-        """获取问题的详细信息"""
+        """获取问题的详细信息（options 可以是列表，也可以是已拼接好的字符串）"""
         context = problem.get('context', '')
         question = problem.get('question', '')
         options = problem.get('options', [])
@@ -696,69 +1003,75 @@ class LogicEvalApp:
 
     def _extract_python_code_from_response(self, response_text: str) -> str|None:
         """从LLM响应中提取Python代码块"""
-        match = re.search(r'```python\s*(.*?)\s*```', response_text, re.DOTALL | re.IGNORECASE)
+        # 常见情况：第一个围栏就是 ```python，直接按位置切片，结果与正则一致
+        start = response_text.find('```')
+        if start != -1 and response_text.startswith('python', start + 3):
+            end = response_text.find('```', start + 9)
+            if end != -1:
+                return response_text[start + 9:end].strip()
+            return None
+        match = _PY_BLOCK_RE.search(response_text)
         if match:
             return match.group(1).strip()
         else:
             return None
 
-    def _process_single_problem(self, problem, index, api_key, model, api_base):
-        """处理单个题目（供并行调用）"""
+    async def _process_single_problem(self, problem, index, api_key, model, api_base, question_context=None,
+                                      dataset_type=None):
+        """处理单个题目（供并发调用）"""
         # 检查是否启用多数投票模式
         majority_voting_enabled = self.majority_voting_var.get()
+        # 题目信息（选项已拼接为字符串）每题只取一次，投票的各次运行和多轮修复都复用
+        if question_context is None:
+            question_context = self._get_question_context(problem)
         
         if majority_voting_enabled:
-            return self._process_with_majority_voting(problem, index, api_key, model, api_base)
+            return await self._process_with_majority_voting(problem, index, api_key, model, api_base,
+                                                            question_context, dataset_type)
         else:
-            return self._process_single_attempt(problem, index, api_key, model, api_base)
+            return await self._process_single_attempt(problem, index, api_key, model, api_base,
+                                                      question_context=question_context, dataset_type=dataset_type)
     
-    def _process_with_majority_voting(self, problem, index, api_key, model, api_base):
+    async def _process_with_majority_voting(self, problem, index, api_key, model, api_base, question_context=None,
+                                            dataset_type=None):
         """使用多数投票模式处理单个题目（运行3次，取多数结果）"""
+        if question_context is None:
+            question_context = self._get_question_context(problem)
         problem_id = problem.get('id', f'Problem_{index+1}')
         correct_answer = problem.get('answer', '').strip().upper()
         
-        self.root.after(0, lambda pid=problem_id:
-                       self.log(f"[Worker-Voting] 开始处理: {pid} (多数投票模式: 3次运行)", 'info'))
+        self.log_async(f"[Worker-Voting] 开始处理: {problem_id} (多数投票模式: 3次运行)", 'info')
         
         # 运行3次
         results = []
         for attempt_num in range(1, 4):
             # 检查停止标志
-            if self.stop_flag:
-                return {
-                    'id': problem_id,
-                    'predicted': None,
-                    'correct': correct_answer,
-                    'is_correct': False,
-                    'error': '用户停止',
-                    'cancelled': True,
-                    'attempts': 0
-                }
+            if self._stop.is_set():
+                return ProblemResult(id=problem_id, predicted=None, correct=correct_answer,
+                                     error='用户停止', cancelled=True, attempts=0)
             
-            self.root.after(0, lambda pid=problem_id, num=attempt_num:
-                           self.log(f"  [{pid}] 多数投票 - 第{num}/3次尝试...", 'info'))
+            self.log_async(f"  [{problem_id}] 多数投票 - 第{attempt_num}/3次尝试...", 'info')
             
             # 调用单次处理
-            result = self._process_single_attempt(problem, index, api_key, model, api_base, 
-                                                  silent_mode=True)
+            result = await self._process_single_attempt(problem, index, api_key, model, api_base,
+                                                        silent_mode=True, question_context=question_context,
+                                                        dataset_type=dataset_type)
             results.append(result)
             
             # 记录每次结果
-            predicted = result.get('predicted')
-            has_error = result.get('error') and not predicted
+            predicted = result.predicted
+            has_error = result.error and not predicted
             
             if has_error:
-                self.root.after(0, lambda pid=problem_id, num=attempt_num, e=result.get('error'):
-                               self.log(f"  [{pid}] 第{num}次: ⚠ 异常 - {e}", 'warning'))
+                self.log_async(f"  [{problem_id}] 第{attempt_num}次: ⚠ 异常 - {result.error}", 'warning')
             else:
-                self.root.after(0, lambda pid=problem_id, num=attempt_num, p=predicted:
-                               self.log(f"  [{pid}] 第{num}次: 预测={p}", 'info'))
+                self.log_async(f"  [{problem_id}] 第{attempt_num}次: 预测={predicted}", 'info')
         
         # 投票决策
         predictions = []
         for r in results:
-            pred = r.get('predicted')
-            has_error = r.get('error') and not pred
+            pred = r.predicted
+            has_error = r.error and not pred
             
             if has_error:
                 # 如果有错误且没有预测结果，默认选A
@@ -776,50 +1089,40 @@ class LogicEvalApp:
         
         # 记录投票详情
         vote_details = ', '.join([f"{k}:{v}" for k, v in vote_counts.items()])
-        self.root.after(0, lambda pid=problem_id, vd=vote_details, fp=final_prediction:
-                       self.log(f"  [{pid}] 投票结果: {vd} -> 最终选择: {fp}", 'highlight'))
+        self.log_async(f"  [{problem_id}] 投票结果: {vote_details} -> 最终选择: {final_prediction}", 'highlight')
         
         # 判断是否正确
         is_correct = final_prediction == correct_answer
         
         # 合并结果信息
-        merged_result = {
-            'id': problem_id,
-            'predicted': final_prediction,
-            'correct': correct_answer,
-            'is_correct': is_correct,
-            'voting_mode': True,
-            'voting_results': predictions,
-            'voting_counts': dict(vote_counts),
-            'individual_results': results,
-            'attempts': sum(r.get('attempts', 1) for r in results),  # 总尝试次数
-        }
-        
-        # 从第一个结果中获取原题信息
-        if results:
-            for key in ['context', 'question', 'options', 'mode']:
-                if key in results[0]:
-                    merged_result[key] = results[0][key]
+        merged_result = ProblemResult(
+            id=problem_id,
+            predicted=final_prediction,
+            correct=correct_answer,
+            is_correct=is_correct,
+            voting_results=predictions,
+            voting_counts=dict(vote_counts),
+            individual_results=results,
+            attempts=sum(r.attempts for r in results),  # 总尝试次数
+            mode=results[0].mode if results else None,
+        )
         
         return merged_result
     
-    def _process_single_attempt(self, problem, index, api_key, model, api_base, silent_mode=False, temperature=0):
+    async def _process_single_attempt(self, problem, index, api_key, model, api_base, silent_mode=False, temperature=0,
+                                      question_context=None, dataset_type=None):
         """处理单个题目的单次尝试
         
         Args:
             temperature: LLM生成的温度参数，0表示确定性，更高值增加随机性（默认0）
+            question_context: 调用方已取好的 (context, question, options_text)，为 None 时在此获取
+            dataset_type: 调用方已检测好的数据集类型，为 None 时在此检测
         """
         # 检查停止标志
-        if self.stop_flag:
-            return {
-                'id': problem.get('id', f'Problem_{index+1}'),
-                'predicted': None,
-                'correct': problem.get('answer', '').strip().upper(),
-                'is_correct': False,
-                'error': '用户停止',
-                'cancelled': True,
-                'attempts': 0
-            }
+        if self._stop.is_set():
+            return ProblemResult(id=problem.get('id', f'Problem_{index+1}'), predicted=None,
+                                 correct=problem.get('answer', '').strip().upper(),
+                                 error='用户停止', cancelled=True, attempts=0)
         
         problem_id = problem.get('id', f'Problem_{index+1}')
         correct_answer = problem.get('answer', '').strip().upper()
@@ -830,78 +1133,82 @@ class LogicEvalApp:
         repair_enabled = self.repair_var.get()
 
         # 直接生成模式只支持direct模式
-        dataset_type = detect_dataset_type(problem)
+        if dataset_type is None:
+            dataset_type = detect_dataset_type(problem)
+        if question_context is None:
+            question_context = self._get_question_context(problem)
         
         # 如果不是静默模式，输出日志
         if not silent_mode:
-            self.root.after(0, lambda pid=problem_id:
-                           self.log(f"[Worker] 开始处理: {pid} (mode={mode}, semantic_check={semantic_check_enabled}, refinement_code={refinement_code_enabled}, repair={repair_enabled})", 'info'))
+            self.log_async(f"[Worker] 开始处理: {problem_id} (mode={mode}, semantic_check={semantic_check_enabled}, refinement_code={refinement_code_enabled}, repair={repair_enabled})", 'info')
         
-        # 在try块外初始化code变量，以便在异常时也能保存
+        # 在try块外初始化code和attempt变量，以便在异常时也能保存
         code = None
+        attempt = 0
         
         try:
             max_attempts = 10  # 在great Refinement module下总共允许调用10次LLM，多轮调用
-            attempt = 0
 
             # 初次生成对话 - 根据模式选择不同的消息构建方式
             if mode == "single_text":
-                messages = build_single_text_message_for_all_datasets(dataset_type, *self._get_question_context(problem))
+                messages = build_single_text_message_for_all_datasets(dataset_type, *question_context)
                 accumulated_context = messages[0]['content']
                 extra_type_is_semantic = None
                 extra_info = ''
                 llm_output = ''
             else:  # direct mode
-                messages = build_initial_messages_for_all_datasets(dataset_type, *self._get_question_context(problem))
+                # 按数据集类型取出已绑定模板的构建函数，各轮直接调用
+                make_messages, make_next_messages = compile_prompt_builders(dataset_type)
+                messages = make_messages(*question_context)
+                # system + 题目 的前缀在各轮之间保持不变，便于服务端前缀缓存命中
+                prefix_messages = messages
                 extra_type_is_semantic = None
                 extra_info = ''
                 llm_output = ''
             
             while attempt < max_attempts:
                 # 每次循环开始时检查停止标志
-                if self.stop_flag:
+                if self._stop.is_set():
                     raise Exception('用户停止')
                 
                 attempt += 1
                 if attempt >= max_attempts:
                     if not silent_mode:
-                        self.root.after(0, lambda pid=problem_id:
-                            self.log(f"  [{pid}] great Refinement module修复次数达到上限{max_attempts}次", 'error'))
+                        self.log_async(f"  [{problem_id}] great Refinement module修复次数达到上限{max_attempts}次", 'error')
                     raise Exception('great Refinement module修复次数达到上限{max_attempts}次')
                 elif attempt > 1:
                     if not silent_mode:
-                        self.root.after(0, lambda pid=problem_id, a=attempt: 
-                                       self.log(f"  [{pid}] 第{a}次尝试重新生成...", 'warning'))
+                        self.log_async(f"  [{problem_id}] 第{attempt}次尝试重新生成...", 'warning')
                     # 生成后续对话 - 根据模式选择不同的消息构建方式
                     if mode == "single_text":
                         messages = build_next_single_text_message_for_all_datasets(
                             dataset_type,
-                            *self._get_question_context(problem),
+                            *question_context,
                             extra_type_is_semantic,
                             extra_info,
                             llm_output,
                             accumulated_context
                         )
                     else:  # direct mode
-                        next_message = build_next_messages_for_all_datasets(dataset_type, *self._get_question_context(problem),
-                                                                          extra_type_is_semantic, extra_info, llm_output)
-                        messages.extend(next_message)
+                        next_message = make_next_messages(*question_context,
+                                                          extra_type_is_semantic, extra_info, llm_output)
+                        # 只带上一轮的输出和修复提示，不累积全部历史，输入长度不随轮数增长
+                        messages = prefix_messages + next_message
                 
                 # 调用前检查停止标志
-                if self.stop_flag:
+                if self._stop.is_set():
                     raise Exception('用户停止')
                 
                 # 获取Z3代码 - 使用传入的temperature参数
-                response = query_llm_loop_messages(api_key, messages, model, api_base,
-                                    max_tokens=2000, temperature=temperature)
+                # 只需要其中的代码块，流式接收并在代码块结束时停止生成
+                response = await self._llm_client.send_loop_messages_async(
+                    messages, max_tokens=2000, temperature=temperature, stop_at_code_block=True)
                 
                 # 调用后检查停止标志
-                if self.stop_flag:
+                if self._stop.is_set():
                     raise Exception('用户停止')
                 
-                if not response['success']:
-                    raise Exception(response.get('error', 'API请求失败'))
-                llm_output = response['content']
+                llm_output = _response_content(response)
 
                 code = self._extract_python_code_from_response(llm_output)
 
@@ -912,8 +1219,7 @@ class LogicEvalApp:
                     "#todo\n"
                     "```\n")
                     if not silent_mode:
-                        self.root.after(0, lambda pid=problem_id:
-                                self.log(f"  [{pid}] 提取python代码失败", 'warning'))
+                        self.log_async(f"  [{problem_id}] 提取python代码失败", 'warning')
                     
                     # 如果代码修复功能关闭，直接返回错误
                     if not refinement_code_enabled:
@@ -923,59 +1229,50 @@ class LogicEvalApp:
                     continue
 
                 # semantic check module
-                if semantic_check_enabled:
+                # 代码修复关闭时语义检查的结论只能让本题直接失败、无法据此改进代码，不再为它多发一次请求
+                if semantic_check_enabled and refinement_code_enabled:
                     # 调用前检查停止标志
-                    if self.stop_flag:
+                    if self._stop.is_set():
                         raise Exception('用户停止')
                     
-                    semantic_messages=generate_semantic_check_full_prompt(*self._get_question_context(problem),code)
-                    semantic_response=query_llm_loop_messages(api_key, semantic_messages, model, api_base,
-                                                              max_tokens=2000, temperature=temperature)
+                    semantic_messages=generate_semantic_check_full_prompt(*question_context,code)
+                    semantic_response=await self._llm_client.send_loop_messages_async(
+                        semantic_messages, max_tokens=2000, temperature=temperature)
                     
                     # 调用后检查停止标志
-                    if self.stop_flag:
+                    if self._stop.is_set():
                         raise Exception('用户停止')
                     
-                    if not response['success']:
-                        raise Exception(response.get('error', 'API请求失败'))
-                    semantic_output = semantic_response['content']
+                    semantic_output = _response_content(semantic_response)
 
                     semantic_check_result=semantic_check_response_analyze(semantic_output)
                     if semantic_check_result is None: # todo
                         print(semantic_output)
                         if not silent_mode:
-                            self.root.after(0, lambda pid=problem_id:
-                                self.log(f"  [{pid}] semantic check module给出错误回答", 'error'))
+                            self.log_async(f"  [{problem_id}] semantic check module给出错误回答", 'error')
                     elif semantic_check_result is False:
                         if not silent_mode:
-                            self.root.after(0, lambda pid=problem_id:
-                                self.log(f"  [{pid}] semantic check module检查得到语义错误", 'warning'))
-                        
-                        # 如果代码修复功能关闭，直接返回错误
-                        if not refinement_code_enabled:
-                            raise Exception("语义检查失败（代码修复功能已关闭）")
+                            self.log_async(f"  [{problem_id}] semantic check module检查得到语义错误", 'warning')
                         
                         extra_info=semantic_check_result
                         extra_type_is_semantic=True
                         continue
 
                 # 执行代码前检查停止标志
-                if self.stop_flag:
+                if self._stop.is_set():
                     raise Exception('用户停止')
                 
                 # 根据 repair 开关决定是否使用 repair 修复
-                result, exec_error, repair_log = execute_z3_code(code, auto_repair=repair_enabled)
+                result, exec_error, repair_log = await self._execute_z3(code, repair_enabled)
                 
                 # 记录修复日志
                 if repair_log and not silent_mode:
-                    self.root.after(0, lambda pid=problem_id, logs=repair_log: 
-                                   self.log(f"  [{pid}] 代码自动修复: {'; '.join(logs)}", 'debug'))
+                    self.log_async(f"  [{problem_id}] 代码自动修复: {'; '.join(repair_log)}", 'debug')
                 
                 # self refine
                 if exec_error:
                     if not silent_mode:
-                        self.root.after(0, lambda pid=problem_id, e=exec_error: 
-                                       self.log(f"  [{pid}] code执行错误（repair修复后）: {e}", 'warning'))
+                        self.log_async(f"  [{problem_id}] code执行错误（repair修复后）: {exec_error}", 'warning')
                     
                     # 如果代码修复功能关闭，直接抛出错误
                     if not refinement_code_enabled:
@@ -994,165 +1291,374 @@ class LogicEvalApp:
                 predicted = result.upper() if result else None
                 is_correct = predicted == correct_answer
 
-                result_info = {
-                    'id': problem_id,
-                    'predicted': predicted,
-                    'correct': correct_answer,
-                    'is_correct': is_correct,
-                    'pseudocode': None,
-                    'mode': mode,
-                    'error': exec_error,
-                    'attempts': attempt,
-                    # 'messages': messages, # 包含所有轮对话的内容（不包含最后一轮模型输出），但大小较大
-                }
-                if mode == "direct":
-                    result_info['code'] = code
+                result_info = ProblemResult(
+                    id=problem_id,
+                    predicted=predicted,
+                    correct=correct_answer,
+                    is_correct=is_correct,
+                    mode=mode,
+                    error=exec_error,
+                    attempts=attempt,
+                    code=code if mode == "direct" else None,
+                )
 
                 return result_info
 
         except Exception as e:
             error_msg = str(e)
             is_cancelled = error_msg == '用户停止'
-            return {
-                'id': problem_id,
-                'predicted': None,
-                'correct': correct_answer,
-                'is_correct': False,
-                'error': error_msg,
-                'cancelled': is_cancelled,
-                'attempts': attempt if 'attempt' in locals() else 1,
-                'code': code  # 保存生成的代码（即使执行出错）
-            }
+            return ProblemResult(
+                id=problem_id,
+                predicted=None,
+                correct=correct_answer,
+                error=error_msg,
+                cancelled=is_cancelled,
+                attempts=attempt,
+                code=code,  # 保存生成的代码（即使执行出错）
+            )
     
-    def _run_evaluation(self, api_key: str, dataset_path: str):
-        """运行评测（后台线程，4个workers并行处理）"""
+    async def _execute_z3(self, code, auto_repair):
+        """
+        在进程池中执行 Z3 代码
+
+        Z3 求解是 CPU 密集的同步调用：放到独立进程中既不阻塞事件循环，
+        也不受单进程内全局 Z3 锁的限制，可以和 LLM 请求、其它题目的求解同时进行
+        """
+        # 不同题目或多轮修复生成完全相同的代码时，直接复用上次的执行结果
+        key = hashlib.blake2b(code.encode('utf-8'), digest_size=16, person=b'repair' if auto_repair else b'').digest()
+        hit = _z3_result_cache.get(key)
+        if hit is not None:
+            _z3_result_cache.move_to_end(key)
+            return hit
+
+        # 先取到空闲的执行器再提交：同时提交的任务数不超过进程数，任务不会在进程池里排队，
+        # 下面的超时只计算真正执行的时间
+        idle = self._z3_idle
+        worker = await idle.get()
+        reusable = False
         try:
-            # 加载数据集
-            self.root.after(0, lambda: self.log(f"正在加载数据集: {dataset_path}", 'info'))
-            
-            with open(dataset_path, 'r', encoding='utf-8') as f:
-                problems = json.load(f)
-            
-            # 应用题目限制
             try:
-                limit = int(self.limit_var.get())
-                if limit > 0:
-                    problems = problems[:limit]
-            except:
-                pass
-            
-            total = len(problems)
+                if worker is None:
+                    worker = await self._new_z3_worker()
+                result = await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(
+                    worker.pool, functools.partial(execute_z3_code, code, auto_repair=auto_repair)), Z3_CALL_TIMEOUT)
+            except asyncio.TimeoutError:
+                # execute_z3_code 自身有 10s 超时，走到这里说明工作进程卡在了求解之外（如修复阶段）
+                return None, Z3_TIMEOUT_ERROR, []
+            except BrokenProcessPool:
+                # 工作进程异常退出（如 Z3 内部崩溃）
+                return None, "Z3执行进程异常退出", []
+            # 超时的求解线程无法终止，仍在那个工作进程里运行，之后的任务会与它并发操作 Z3，不能再复用
+            reusable = result[1] != Z3_TIMEOUT_ERROR
+        finally:
+            # 卡住、崩溃、超时或被取消的执行器只结束它自己的进程，空出的位置下次用到时再创建
+            if not reusable and worker is not None:
+                self._retire_z3_worker(worker)
+                worker = None
+            idle.put_nowait(worker)
+        if reusable:
+            # 超时与机器负载有关，不缓存
+            _z3_result_cache[key] = result
+            if len(_z3_result_cache) > Z3_RESULT_CACHE_SIZE:
+                _z3_result_cache.popitem(last=False)
+        return result
+
+    def _new_z3_idle_queue(self):
+        """每轮评测开始时建立空闲执行器队列：已有的工作进程继续复用，其余位置用到时再创建"""
+        idle = asyncio.Queue()
+        for worker in self._z3_workers:
+            idle.put_nowait(worker)
+        for _ in range(max(0, (os.cpu_count() or 1) - len(self._z3_workers))):
+            idle.put_nowait(None)
+        return idle
+
+    async def _new_z3_worker(self):
+        """创建单进程的 Z3 执行器，工作进程启动时预先导入 z3，并记下进程号以便单独结束"""
+        pool = ProcessPoolExecutor(max_workers=1, initializer=warm_up_z3)
+        try:
+            pid = await asyncio.get_running_loop().run_in_executor(pool, os.getpid)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        worker = _Z3Worker(pool, pid)
+        self._z3_workers.append(worker)
+        return worker
+
+    def _retire_z3_worker(self, worker):
+        """关闭一个执行器并结束它的进程，否则卡住的进程会让程序退出时一直等待"""
+        self._z3_workers.remove(worker)
+        worker.pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except OSError:
+            pass  # 进程已经退出
 
-            # 获取并验证workers数量
-            try:
-                num_workers = int(self.workers_var.get())
-                if num_workers <= 0:
-                    raise ValueError("Workers数量必须大于0")
-            except ValueError:
-                num_workers = 4  # 默认值
-                self.root.after(0, lambda: self.log("Workers数量无效，使用默认值4", 'warning'))
+    async def _query_batch(self, dataset_type, problems, question_contexts):
+        """
+        一次请求为多道题生成代码（question_contexts 与 problems 一一对应）
 
-            self.root.after(0, lambda: self.log(f"共 {total} 道题目，使用 {num_workers} 个 workers 并行处理", 'info'))
-            self.root.after(0, lambda: self.update_progress(0, total))
+        Returns:
+            与 problems 等长的代码列表；请求失败或代码块数量对不上时返回 None（整批回退到逐题处理）
+        """
+        if self._stop.is_set():
+            return None
+        problem_ids = ', '.join(str(p.get('id', '?')) for p in problems)
+        self.log_async(f"[Batch] 合并请求 {len(problems)} 道题: {problem_ids}", 'info')
+        try:
+            messages = build_batched_initial_messages(dataset_type, question_contexts)
+            response = await self._llm_client.send_loop_messages_async(
+                messages, max_tokens=min(BATCH_TOKENS_PER_PROBLEM * len(problems),
+                                         self._llm_client.config['max_output_tokens']),
+                temperature=0)
+        except Exception as e:
+            response = {'success': False, 'error': str(e)}
 
-            model = self.model_var.get()
-            api_base = self.api_base_var.get().strip() or None
+        if not response['success']:
+            self.log_async(f"[Batch] 请求失败，回退到逐题处理: {response.get('error')}", 'warning')
+            return None
+        codes = [code.strip() for code in _PY_BLOCK_RE.findall(response['content'])]
+        if len(codes) != len(problems):
+            self.log_async(f"[Batch] 返回 {len(codes)} 个代码块，与 {len(problems)} 道题不符，回退到逐题处理", 'warning')
+            return None
+        return codes
 
-            correct_count = 0
-            wrong_count = 0
-            error_count = 0
-            completed_count = 0
+    async def _execute_batched_code(self, problem, index, code):
+        """执行批量请求得到的单题代码；执行出错或没有输出时返回 None，由调用方走逐题的修复流程"""
+        if self._stop.is_set():
+            return None
+        result, exec_error, _ = await self._execute_z3(code, self.repair_var.get())
+        if exec_error or not result:
+            return None
 
-            # 使用线程锁保护计数器
-            lock = threading.Lock()
+        correct_answer = problem.get('answer', '').strip().upper()
+        predicted = result.upper()
+        return ProblemResult(
+            id=problem.get('id', f'Problem_{index+1}'),
+            predicted=predicted,
+            correct=correct_answer,
+            is_correct=predicted == correct_answer,
+            mode='direct',
+            code=code,
+        )
 
-            # 使用配置的 workers 数量并行处理
-            executor = ThreadPoolExecutor(max_workers=num_workers)
-            try:
-                # 提交所有任务
-                future_to_problem = {}
-                for i, problem in enumerate(problems):
-                    if self.stop_flag:
-                        break
-                    future = executor.submit(
-                        self._process_single_problem, 
-                        problem, i, api_key, model, api_base
-                    )
-                    future_to_problem[future] = (i, problem)
-                
-                # 处理完成的任务
-                for future in as_completed(future_to_problem):
-                    if self.stop_flag:
-                        # 立即取消所有未完成的任务
-                        for f in future_to_problem:
-                            f.cancel()
-                        self.root.after(0, lambda: self.log("正在终止所有任务...", 'warning'))
-                        break
-                    
+    def _run_evaluation(self, api_key: str, dataset_path: str):
+        """运行评测（后台线程，在独立的事件循环中并发处理）"""
+        try:
+            asyncio.run(self._run_evaluation_async(api_key, dataset_path))
+        except Exception as e:
+            self.log_async(f"评测出错: {str(e)}", 'error')
+            self.root.after(0, self._reset_ui)
+
+    async def _run_evaluation_async(self, api_key: str, dataset_path: str):
+        """
+        评测主循环：所有 LLM 请求在同一个事件循环中发出，由信号量限制并发数
+
+        等待网络响应时不占用线程，workers 数量只决定同时在途的题目数
+        """
+        # 加载数据集
+        self.log_async(f"正在加载数据集: {dataset_path}", 'info')
+
+        problems = load_dataset(dataset_path)
+
+        # 应用题目限制
+        try:
+            limit = int(self.limit_var.get())
+            if limit > 0:
+                problems = problems[:limit]
+        except:
+            pass
+
+        total = len(problems)
+        # 加载后一次性拼好每题的 (context, question, options_text)，与 problems 按下标对应，
+        # 之后批量请求、投票和多轮修复都直接复用
+        question_contexts = [self._get_question_context(problem) for problem in problems]
+        # 数据集类型同样在加载后逐题检测一次（文件里可能混有多个数据集），对应的 prompt 模板按类型只准备一次
+        dataset_types = [detect_dataset_type(problem) for problem in problems]
+
+        # 获取并验证workers数量
+        try:
+            num_workers = int(self.workers_var.get())
+            if num_workers <= 0:
+                raise ValueError("Workers数量必须大于0")
+        except ValueError:
+            num_workers = 4  # 默认值
+            self.log_async("Workers数量无效，使用默认值4", 'warning')
+
+        self.log_async(f"共 {total} 道题目，使用 {num_workers} 个 workers 并行处理", 'info')
+        self.total_problems = total  # 进度条由 _tick_ui 定时刷新
+
+        model = self.model_var.get()
+        api_base = self.api_base_var.get().strip() or None
+
+        counters = self._counters
+
+        # 整轮评测共用一个客户端（及其连接池）；计数器只在事件循环线程中修改，无需加锁
+        # 多数投票依赖多次调用结果不同，此时不走缓存
+        use_cache = self.llm_cache_var.get() and not self.majority_voting_var.get()
+        # 限速器：按每分钟请求数发放令牌，并在 429 时自动收缩同时在途的请求数
+        try:
+            rpm = max(0, int(self.rpm_var.get()))
+        except ValueError:
+            rpm = 0
+        rate_limiter = RateLimiter(rpm=rpm, max_concurrency=num_workers)
+        if use_cache:
+            self._llm_client = CachedLLMClient(api_key, model, api_base, rate_limiter,
+                                               semantic=self.semantic_cache_var.get())
+        else:
+            self._llm_client = LLMClient(api_key, model, api_base, rate_limiter)
+        semaphore = asyncio.Semaphore(num_workers)
+        self._z3_idle = self._new_z3_idle_queue()
+
+        # 批量请求：每 batch_size 道同类题合并成一次请求，只适用于首轮直接生成代码
+        try:
+            batch_size = int(self.batch_size_var.get())
+        except ValueError:
+            batch_size = 1
+        # 整批的输出预算受模型最大输出长度限制，装不下 batch_size 份代码时减小批量（最少 2 题，否则不合并）
+        max_batch_size = self._llm_client.config['max_output_tokens'] // BATCH_TOKENS_PER_PROBLEM
+        if batch_size > max_batch_size:
+            adjusted = f"改为 {max_batch_size}" if max_batch_size > 1 else "不合并请求"
+            self.log_async(f"批量大小 {batch_size} 超出模型 {model} 的输出长度上限，{adjusted}", 'warning')
+            batch_size = max_batch_size
+        use_batching = (batch_size > 1 and self.mode_var.get() == "direct"
+                        and not self.semantic_check_var.get() and not self.majority_voting_var.get())
+
+        async def bounded_batch(dataset_type, indices):
+            async with semaphore:
+                return await self._query_batch(dataset_type, [problems[i] for i in indices],
+                                               [question_contexts[i] for i in indices])
+
+        batches = []    # (数据集类型, 题目序号列表)
+        batch_for = {}  # 题目序号 -> (批次序号, 在批内的位置)
+        if use_batching:
+            for start in range(0, total, batch_size):
+                groups = {}
+                for i in range(start, min(start + batch_size, total)):
+                    groups.setdefault(dataset_types[i], []).append(i)
+                for dataset_type, indices in groups.items():
+                    if len(indices) < 2:
+                        continue
+                    for position, i in enumerate(indices):
+                        batch_for[i] = (len(batches), position)
+                    batches.append((dataset_type, indices))
+        # 批次任务在批内第一道题进入窗口时才创建
+        batch_tasks = {}
+
+        async def bounded(i, problem):
+            result_info = None
+            if i in batch_for:
+                batch_index, position = batch_for[i]
+                batch_task = batch_tasks.get(batch_index)
+                if batch_task is None:
+                    batch_task = batch_tasks[batch_index] = asyncio.create_task(
+                        bounded_batch(*batches[batch_index]))
+                codes = await batch_task
+                if codes is not None:
+                    result_info = await self._execute_batched_code(problem, i, codes[position])
+            # 未合并、批量失败或代码执行出错的题目走逐题流程（含多轮修复）
+            if result_info is None:
+                async with semaphore:
+                    result_info = await self._process_single_problem(problem, i, api_key, model, api_base,
+                                                                     question_contexts[i], dataset_types[i])
+            return i, problem, result_info
+
+        # 每完成一题就把结果写入 JSONL 文件，内存中只保留最近的一部分
+        results_file = self._open_results_file()
+        summary = self._summary
+
+        # 滑动窗口：同时最多 2 * num_workers 道题的任务存在，完成一道再提交下一道，
+        # 内存占用与终止时需要取消的任务数都与题目总数无关
+        problem_iter = enumerate(problems)
+        window = 2 * num_workers
+        pending = {asyncio.create_task(bounded(i, problem))
+                   for i, problem in itertools.islice(problem_iter, window)}
+        try:
+            while pending:
+                # 带超时等待，没有任务完成时也能及时响应停止
+                done, pending = await asyncio.wait(pending, timeout=0.2,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if self._stop.is_set():
+                    self.log_async("正在终止所有任务...", 'warning')
+                    break
+                for i, problem in itertools.islice(problem_iter, len(done)):
+                    pending.add(asyncio.create_task(bounded(i, problem)))
+
+                for next_done in done:
                     try:
-                        result_info = future.result(timeout=0.1)
-                    except Exception:
-                        # 任务被取消或超时
+                        i, original_problem, result_info = next_done.result()
+                    except asyncio.CancelledError:
                         continue
-                    
+                    except Exception as e:
+                        # 逐题流程自身会捕获异常，走到这里说明是程序错误，记录下来而不是静默丢弃
+                        self.log_async(f"  任务异常: {e!r}", 'error')
+                        continue
+
                     # 跳过被取消的任务
-                    if result_info.get('cancelled'):
-                        self.root.after(0, lambda pid=result_info['id']: 
-                                       self.log(f"  [{pid}] 已取消", 'warning'))
+                    if result_info.cancelled:
+                        self.log_async(f"  [{result_info.id}] 已取消", 'warning')
                         continue
-                    
-                    problem_id = result_info['id']
-                    predicted = result_info['predicted']
-                    correct_answer = result_info['correct']
-                    is_correct = result_info['is_correct']
-                    has_error = result_info.get('error') and not result_info['predicted']
+
+                    problem_id = result_info.id
+                    predicted = result_info.predicted
+                    correct_answer = result_info.correct
+                    is_correct = result_info.is_correct
+                    has_error = result_info.error and not result_info.predicted
 
                     # 为结果添加原题信息
-                    i, original_problem = future_to_problem[future]
-                    result_info.update({
-                        'context': original_problem.get('context'),
-                        'question': original_problem.get('question'),
-                        'options': original_problem.get('options')
-                    })
-
-                    with lock:
-                        self.results.append(result_info)
-                        completed_count += 1
-                        
-                        if has_error:
-                            error_count += 1
-                            self.root.after(0, lambda pid=problem_id, e=result_info.get('error'): 
-                                           self.log(f"  [{pid}] ⚠ 异常: {e}", 'error'))
-                        elif is_correct:
-                            correct_count += 1
-                            self.root.after(0, lambda pid=problem_id, p=predicted, c=correct_answer: 
-                                           self.log(f"  [{pid}] ✓ 正确! 预测={p}, 答案={c}", 'success'))
-                        else:
-                            wrong_count += 1
-                            self.root.after(0, lambda pid=problem_id, p=predicted, c=correct_answer: 
-                                           self.log(f"  [{pid}] ✗ 错误! 预测={p}, 答案={c}", 'error'))
-                        
-                        # 更新进度
-                        cc, wc, ec, cur = correct_count, wrong_count, error_count, completed_count
-                        self.root.after(0, lambda c=cur, t=total, 
-                                       cc=cc, wc=wc, ec=ec: 
-                                       (self.update_progress(c, t), 
-                                        self.update_stats(c, cc, wc, ec)))
-            finally:
-                # 立即关闭线程池，不等待任务完成
-                executor.shutdown(wait=False, cancel_futures=True)
-            
-            # 完成
-            was_stopped = self.stop_flag
-            self.root.after(0, lambda: self._evaluation_complete(
-                completed_count, correct_count, wrong_count, error_count, was_stopped))
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.log(f"评测出错: {str(e)}", 'error'))
-            self.root.after(0, self._reset_ui)
+                    result_info.context = original_problem.get('context')
+                    result_info.question = original_problem.get('question')
+                    result_info.options = original_problem.get('options')
+
+                    results_file.write(_json_line(result_info.to_dict()))
+                    self.results.append(result_info)
+                    if result_info.error:
+                        summary['error'] += 1
+                    if is_correct:
+                        summary['correct'] += 1
+                        summary['correct_problems'].append(problem_id)
+                    else:
+                        summary['wrong_problems'].append(problem_id)
+                        if not result_info.error:
+                            summary['wrong'] += 1
+                    summary['total'] += 1
+                    counters['done'] += 1
+
+                    if has_error:
+                        counters['error'] += 1
+                        self.log_async(f"  [{problem_id}] ⚠ 异常: {result_info.error}", 'error')
+                    elif is_correct:
+                        counters['correct'] += 1
+                        self.log_async(f"  [{problem_id}] ✓ 正确! 预测={predicted}, 答案={correct_answer}", 'success')
+                    else:
+                        counters['wrong'] += 1
+                        self.log_async(f"  [{problem_id}] ✗ 错误! 预测={predicted}, 答案={correct_answer}", 'error')
+        finally:
+            # 立即取消所有未完成的任务，并关闭连接池
+            leftover = [*pending, *batch_tasks.values()]
+            for task in leftover:
+                task.cancel()
+            await asyncio.gather(*leftover, return_exceptions=True)
+            await self._llm_client.aclose()
+            results_file.close()
+
+        # 完成
+        was_stopped = self._stop.is_set()
+        # after 直接传参，不再为回调创建闭包
+        self.root.after(0, self._evaluation_complete,
+                        counters['done'], counters['correct'], counters['wrong'], counters['error'], was_stopped)
+
+    def _open_results_file(self):
+        """在 logs 目录下新建本轮评测的结果文件（JSONL，每完成一题写一行）"""
+        logs_dir = os.path.join(os.path.dirname(__file__), 'logs')
+        os.makedirs(logs_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._results_path = os.path.join(logs_dir, f'results_{timestamp}.jsonl')
+        return open(self._results_path, 'wb', buffering=64 * 1024)
 
     def _evaluation_complete(self, total, correct, wrong, error, was_stopped=False):
         """评测完成"""
+        # 定时刷新随评测结束而停止，这里补上最后一次
+        self._refresh_progress()
         self.log("=" * 50, 'highlight')
         if was_stopped:
             self.log(f"评测已停止!", 'warning')
@@ -1169,7 +1675,7 @@ class LogicEvalApp:
         """窗口关闭事件处理"""
         if self.is_running:
             if messagebox.askyesno("确认", "评测正在运行，确定要退出吗？"):
-                self.stop_flag = True
+                self._stop.set()
                 # 等待一小段时间让评测停止
                 self.root.after(1000, self._close_log_file_and_exit)
             else:
@@ -1181,11 +1687,14 @@ class LogicEvalApp:
         """关闭日志文件并退出"""
         if self.log_file:
             try:
-                self.log_file.write(f"=== 评测日志结束于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n")
-                self.log_file.close()
+                self.log_file.write(f"=== 评测日志结束于 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n".encode('utf-8'))
+                self.log_file.close()  # close 会先 flush 缓冲区
                 self.log_file = None
             except Exception as e:
                 print(f"关闭日志文件失败: {e}")
+
+        for worker in self._z3_workers:
+            worker.pool.shutdown(wait=False, cancel_futures=True)
         
         self.root.destroy()
     
@@ -1200,10 +1709,14 @@ class LogicEvalApp:
         self.total_problems = 0
         
     def export_results(self):
-        """导出结果"""
-        if not self.results:
+        """导出结果：统计来自评测中逐题累加的 _summary，明细直接从 JSONL 结果文件拷贝"""
+        summary = self._summary
+        if not summary['total'] or self._results_path is None:
             messagebox.showinfo("提示", "没有可导出的结果")
             return
+        if self.is_running:
+            messagebox.showinfo("提示", f"评测进行中，请在评测结束后导出\n当前结果实时写入:\n{self._results_path}")
+            return
             
         filename = filedialog.asksaveasfilename(
             title="保存结果",
@@ -1212,27 +1725,29 @@ class LogicEvalApp:
         )
         
         if filename:
-            # 统计信息
-            total = len(self.results)
-            correct = sum(1 for r in self.results if r.get('is_correct'))
-            wrong = sum(1 for r in self.results if not r.get('is_correct') and not r.get('error'))
-            error = sum(1 for r in self.results if r.get('error'))
-            
-            export_data = {
+            total = summary['total']
+            header = {
                 'summary': {
                     'total': total,
-                    'correct': correct,
-                    'wrong': wrong,
-                    'error': error,
-                    'accuracy': correct / total * 100 if total > 0 else 0
+                    'correct': summary['correct'],
+                    'wrong': summary['wrong'],
+                    'error': summary['error'],
+                    'accuracy': summary['correct'] / total * 100 if total > 0 else 0
                 },
-                'correct_problems': [r['id'] for r in self.results if r.get('is_correct')],
-                'wrong_problems': [r['id'] for r in self.results if not r.get('is_correct')],
-                'details': self.results
+                'correct_problems': summary['correct_problems'],
+                'wrong_problems': summary['wrong_problems'],
             }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, ensure_ascii=False, indent=2)
+            # 先写除 details 外的部分（去掉末尾的 "}"），再把 JSONL 的每一行作为 details 数组的元素原样拷贝
+            head = json.dumps(header, ensure_ascii=False, indent=2)[:-1].rstrip()
+            with open(filename, 'wb') as out, open(self._results_path, 'rb') as details:
+                out.write(f'{head},\n  "details": [\n'.encode('utf-8'))
+                separator = b''
+                for line in details:
+                    out.write(separator)
+                    out.write(b'    ')
+                    out.write(line.rstrip(b'\n'))
+                    separator = b',\n'
+                out.write(b'\n  ]\n}')
                 
             self.log(f"结果已导出到: {filename}", 'success')
             messagebox.showinfo("成功", f"结果已导出到:\n{filename}")
@@ -1256,8 +1771,7 @@ class LogicEvalApp:
         
         # 检测数据集类型
         try:
-            with open(dataset_path, 'r', encoding='utf-8') as f:
-                problems = json.load(f)
+            problems = load_dataset(dataset_path)
             
             if not problems:
                 messagebox.showerror("错误", "数据集为空")
@@ -1301,32 +1815,40 @@ class LogicEvalApp:
         
         # 在后台线程运行翻译
         def run_translation():
-            self.root.after(0, lambda: self.log("=" * 50, 'highlight'))
-            self.root.after(0, lambda: self.log("开始翻译数据集...", 'info'))
-            self.root.after(0, lambda: self.log(f"数据集类型: {dataset_type}", 'info'))
-            self.root.after(0, lambda: self.log(f"题目数量: {len(problems)}", 'info'))
-            self.root.after(0, lambda: self.log("=" * 50, 'highlight'))
+            self.log_async("=" * 50, 'highlight')
+            self.log_async("开始翻译数据集...", 'info')
+            self.log_async(f"数据集类型: {dataset_type}", 'info')
+            self.log_async(f"题目数量: {len(problems)}", 'info')
+            self.log_async("=" * 50, 'highlight')
             
             model = self.model_var.get()
             api_base = self.api_base_var.get().strip() or None
             
+            # 翻译进度：回调只记录最新值，界面最多每 50ms 重绘一次，不必每题调度一次 after
+            progress = {'current': 0, 'total': 0, 'scheduled': False}
+
+            def repaint_progress():
+                progress['scheduled'] = False
+                c, t = progress['current'], progress['total']
+                p = c / t * 100
+                self.progress_var.set(p)
+                self.progress_label.config(text=f"{c}/{t} ({p:.1f}%)")
+
             # 定义进度回调
             def progress_callback(current, total, result):
                 problem_id = result.get('original_problem', {}).get('id', f'Problem_{current}')
                 
                 if result['success']:
-                    self.root.after(0, lambda pid=problem_id, c=current, t=total: 
-                                   self.log(f"[{c}/{t}] ✓ {pid} 翻译成功", 'success'))
+                    self.log_async(f"[{current}/{total}] ✓ {problem_id} 翻译成功", 'success')
                 else:
                     error = result.get('error', '未知错误')
-                    self.root.after(0, lambda pid=problem_id, c=current, t=total, e=error: 
-                                   self.log(f"[{c}/{t}] ✗ {pid} 翻译失败: {e}", 'error'))
+                    self.log_async(f"[{current}/{total}] ✗ {problem_id} 翻译失败: {error}", 'error')
                 
                 # 更新进度条
-                percentage = current / total * 100
-                self.root.after(0, lambda p=percentage, c=current, t=total: 
-                               (self.progress_var.set(p),
-                                self.progress_label.config(text=f"{c}/{t} ({p:.1f}%)")))
+                progress['current'], progress['total'] = current, total
+                if not progress['scheduled']:
+                    progress['scheduled'] = True
+                    self.root.after(50, repaint_progress)
             
             # 执行翻译
             try:
@@ -1343,19 +1865,17 @@ class LogicEvalApp:
                 if result['translated_problems']:
                     save_translated_dataset(result['translated_problems'], output_path)
                     
-                    self.root.after(0, lambda: self.log("=" * 50, 'highlight'))
-                    self.root.after(0, lambda: self.log(f"翻译完成！", 'highlight'))
-                    self.root.after(0, lambda r=result: 
-                                   self.log(f"成功: {r['success_count']}, 失败: {r['failed_count']}", 'highlight'))
-                    self.root.after(0, lambda: self.log(f"翻译结果已保存到: {output_path}", 'success'))
-                    self.root.after(0, lambda: self.log("=" * 50, 'highlight'))
+                    self.log_async("=" * 50, 'highlight')
+                    self.log_async(f"翻译完成！", 'highlight')
+                    self.log_async(f"成功: {result['success_count']}, 失败: {result['failed_count']}", 'highlight')
+                    self.log_async(f"翻译结果已保存到: {output_path}", 'success')
+                    self.log_async("=" * 50, 'highlight')
                     
                     # 显示失败的题目
                     if result['failed_problems']:
-                        self.root.after(0, lambda: self.log("失败的题目:", 'warning'))
+                        self.log_async("失败的题目:", 'warning')
                         for failed in result['failed_problems']:
-                            self.root.after(0, lambda f=failed: 
-                                           self.log(f"  - {f['id']}: {f['error']}", 'error'))
+                            self.log_async(f"  - {failed['id']}: {failed['error']}", 'error')
                     
                     self.root.after(0, lambda: 
                                    messagebox.showinfo("完成", 
@@ -1364,21 +1884,22 @@ class LogicEvalApp:
                                                      f"失败: {result['failed_count']}\n"
                                                      f"保存到: {output_path}"))
                 else:
-                    self.root.after(0, lambda: self.log("翻译失败：没有成功翻译的题目", 'error'))
+                    self.log_async("翻译失败：没有成功翻译的题目", 'error')
                     self.root.after(0, lambda: 
                                    messagebox.showerror("失败", "翻译失败：没有成功翻译的题目"))
                 
             except Exception as e:
-                self.root.after(0, lambda e=str(e): self.log(f"翻译出错: {e}", 'error'))
+                self.log_async(f"翻译出错: {str(e)}", 'error')
                 self.root.after(0, lambda e=str(e): 
                                messagebox.showerror("错误", f"翻译出错:\n{e}"))
             
             finally:
-                # 重置进度条
-                self.root.after(0, lambda: self.progress_var.set(0))
-                self.root.after(0, lambda: self.progress_label.config(text="0/0 (0%)"))
-                # 重新启用按钮
-                self.root.after(0, lambda: self.start_btn.config(state=tk.NORMAL))
+                # 重置进度条并重新启用按钮；排在已调度的进度重绘之后执行
+                def reset():
+                    self.progress_var.set(0)
+                    self.progress_label.config(text="0/0 (0%)")
+                    self.start_btn.config(state=tk.NORMAL)
+                self.root.after(100, reset)
         
         threading.Thread(target=run_translation, daemon=True).start()
 
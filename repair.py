@@ -8,13 +8,112 @@
 """
 
 import re
-from typing import Tuple, List, Optional
+from bisect import bisect_left
+from typing import Tuple, List, Optional, Dict, Set
+
+# 修复过程中使用的正则表达式，在导入时统一编译
+_COMMENT_TAIL_RE = re.compile(r'\s*#.*$')
+_DQ_STRING_RE = re.compile(r'"[^"]*"')
+_SQ_STRING_RE = re.compile(r"'[^']*'")
+_BOOL_DEF_RE = re.compile(r'(\w+)\s*=\s*Bool\s*\(\s*["\'](\w+)["\']\s*\)')
+_BOOL_ASSIGN_RE = re.compile(r'(\w+)\s*=\s*Bool\s*\(')
+_CONST_ASSIGN_RE = re.compile(r'(\w+)\s*=\s*Const\s*\(')
+_FUNCTION_ASSIGN_RE = re.compile(r'(\w+)\s*=\s*Function\s*\(')
+_INT_ASSIGN_RE = re.compile(r'(\w+)\s*=\s*Int\s*\(')
+_FUNCTION_DEF_RE = re.compile(r"(\w+)\s*=\s*Function\s*\(\s*['\"](\w+)['\"]")
+_FUNCTION_HEAD_RE = re.compile(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,')
+_FUNCTION_SIG_RE = re.compile(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,\s*(.+)\)')
+_ENTITY_ENUM_RE = re.compile(r"Entity,\s*\([^)]+\)\s*=\s*EnumSort\s*\(\s*['\"](\w+)['\"]")
+_ENUM_TUPLE_RE = re.compile(r'(\w+)\s*,\s*\(([^)]+)\)\s*=\s*EnumSort')
+_ENUM_ENTITIES_RE = re.compile(r'EnumSort\s*\(\s*["\'](\w+)["\']\s*,\s*\[([^\]]+)\]')
+_QUOTED_NAME_RE = re.compile(r'["\'](\w+)["\']')
+_VAR_USAGE_RE = re.compile(r'\b([a-z][a-z0-9_]*)\b')
+_LOWER_IDENT_RE = re.compile(r'\b([a-z_]\w*)\b')
+_WORD_RE = re.compile(r'\b(\w+)\b')
+_PREDICATE_CALL_RE = re.compile(r'\b([A-Z][a-zA-Z]*)\s*\(')
+_LETTER_CALL_RE = re.compile(r'([a-zA-Z]+)(?=\s*\(([^)]+)\))')
+_CALL_NAME_RE = re.compile(r'(\w+)\s*\(')
+_CALL_ARGS_RE = re.compile(r'(\w+)\s*\(([^)]*)\)')
+_CALL_GAP_RE = re.compile(r'\)\s+(?=\w+\()')
+_CALL_OPEN_RE = re.compile(r'\w\(')
+_IMPLIES_ARGS_RE = re.compile(r'Implies\s*\((.*)\)')
+_IMPLIES_AND_RE = re.compile(r'Implies\s*\(\s*And\s*\(')
+_SINGLE_AND_RE = re.compile(r'\bAnd\s*\(\s*([^,()]+(?:\([^()]*\))?)\s*\)')
+_TRAILING_COMMA_RE = re.compile(r',\s*\)')
+_FORALL_FIX_RE = re.compile(r'ForAll\s*\(\s*([a-z_]\w*)\s*,')
+_SOLVER_ADD_RE = re.compile(r'solver\.add\((.*)\)', re.DOTALL)
+_ADD_TRUE_RE = re.compile(r'solver\.add\s*\(\s*True\s*\)')
+_ADD_FALSE_RE = re.compile(r'solver\.add\s*\(\s*False\s*\)')
+_QUANT_CONST_RE = re.compile(r'^([a-z])\s*=\s*Const\s*\(\s*["\']([a-z])["\']\s*,')
+_QUANT_VARS_RE = re.compile(r'(?:ForAll|Exists)\s*\(\s*\[([^\]]+)\]')
+_CLOSING_ONLY_RE = re.compile(r'^[)\s]+$')
+
+# 修复过程中注释掉的行所带的前缀
+_COMMENTED_ERROR_PREFIXES = ('# ERROR', '# ORPHANED', '# WARNING')
+
+# Python关键字（不能作为变量名）
+_PY_KEYWORDS = frozenset({
+    'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await',
+    'break', 'class', 'continue', 'def', 'del', 'elif', 'else', 'except',
+    'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is',
+    'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return',
+    'try', 'while', 'with', 'yield'
+})
+
+# Z3关键字和内置函数，不应被视为变量
+_Z3_KEYWORDS = frozenset({
+    'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
+    'EnumSort', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct',
+    'If', 'sat', 'unsat', 'unknown', 'is_true', 'is_false', 'check', 'add',
+    'push', 'pop', 'model', 'assertions', 'print', 'eval', 'as_long',
+    'solver', 'x', 'y', 'z',  # 常见的量化变量名
+    'b', 'birds', 'golfers', 'vehicles', 'fruits', 'books',  # 常见的循环变量名
+    'i', 'j', 'k', 'v', 'f', 'g',  # 循环计数器
+})
+
+# fix_undefined_bool_variables 中不视为未定义变量的全部关键字
+_ALL_KEYWORDS = _PY_KEYWORDS | _Z3_KEYWORDS
+
+# fix_undefined_predicates 中不视为谓词的Python内置函数和z3函数
+_BUILTIN_FUNCS = frozenset({
+    'print', 'len', 'str', 'int', 'bool', 'list', 'dict', 'set', 'tuple',
+    'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
+    'EnumSort', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct',
+    'If', 'is_true', 'is_false', 'check', 'add', 'assertions', 'model', 'eval', 'as_long', 'range', 'sum'
+})
+
+# fix_undefined_function_calls 中不视为未定义函数的z3和Python内置函数
+_Z3_BUILTIN_CALLS = frozenset({
+    'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not',
+    'Implies', 'ForAll', 'Exists', 'Distinct', 'If', 'EnumSort', 'BoolSort',
+    'IntSort', 'StringSort', 'String', 'StringVal', 'print', 'exit', 'unsat', 'sat', 'unknown', 'check', 'push', 'pop', 'add',
+    'is_true', 'is_false', 'model', 'eval', 'as_long', 'range', 'len', 'sum'
+})
+
+# fix_undefined_variables_in_calls 中的Z3内置函数和Python关键字
+_Z3_AND_PYTHON_NAMES = frozenset({
+    'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'Function', 'Const', 'Consts',
+    'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct', 'If',
+    'EnumSort', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
+    'sat', 'unsat', 'unknown', 'solver', 'print', 'exit', 'True', 'False', 'None',
+    'if', 'elif', 'else', 'for', 'while', 'def', 'class', 'return', 'in', 'is', 'not',
+    'range', 'len', 'sum', 'max', 'min'
+})
+
+# Python块开始关键字（这些后面的缩进行是合法的）
+_BLOCK_KEYWORDS = ('if ', 'elif ', 'else:', 'for ', 'while ', 'def ', 'class ',
+                   'try:', 'except ', 'except:', 'finally:', 'with ')
+# 逐行预筛选用的关键字：一次 search 代替对每个关键字分别做子串查找
+_Z3_CONSTRAINT_KEYWORD_RE = re.compile(r'solver\.add|Implies|And|Or|Not|ForAll')
+_CONNECTIVE_CALL_RE = re.compile(r'And\(|Or\(|Implies\(')
 
 
 def repair_code(code: str) -> Tuple[str, List[str]]:
     """
     修复Z3代码中的常见语法错误
     
+    代码只按行切分一次，各修复步骤依次原地修改同一个行列表，最后再拼接一次
+    
     Args:
         code: 原始Z3 Python代码
         
@@ -22,69 +121,18 @@ def repair_code(code: str) -> Tuple[str, List[str]]:
         (修复后的代码, 修复记录列表)
     """
     repairs = []
-    repaired_code = code
-    
-    # 1. 修复括号不匹配
-    repaired_code, bracket_repairs = fix_bracket_mismatch(repaired_code)
-    repairs.extend(bracket_repairs)
-    
-    # 2. 修复行级括号不匹配（逐行检查）
-    repaired_code, line_repairs = fix_line_brackets(repaired_code)
-    repairs.extend(line_repairs)
-    
-    # 3. 修复未定义但被调用的函数（如in_state, same_state等） - 必须在Bool变量修复之前
-    repaired_code, undefined_func_repairs = fix_undefined_function_calls(repaired_code)
-    repairs.extend(undefined_func_repairs)
-    
-    # 4. 修复使用了未定义变量的函数调用（如 is_in_state(x, s) 其中 s 未定义） - 在Bool修复之前
-    repaired_code, undefined_var_repairs = fix_undefined_variables_in_calls(repaired_code)
-    repairs.extend(undefined_var_repairs)
-    
-    # 5. 修复未定义的Bool变量
-    repaired_code, bool_repairs = fix_undefined_bool_variables(repaired_code)
-    repairs.extend(bool_repairs)
-    
-    # 6. 修复未定义的谓词
-    repaired_code, predicate_repairs = fix_undefined_predicates(repaired_code)
-    repairs.extend(predicate_repairs)
-    
-    # 7. 修复常见的Z3语法问题
-    repaired_code, syntax_repairs = fix_common_syntax_issues(repaired_code)
-    repairs.extend(syntax_repairs)
-    
-    # 8. 修复Python逻辑运算符（or/and）为Z3函数（Or/And）
-    repaired_code, logic_repairs = fix_python_logical_operators(repaired_code)
-    repairs.extend(logic_repairs)
-    
-    # 9. 修复未定义的量化变量（x, y等）
-    repaired_code, quantifier_repairs = fix_undefined_quantifier_variables(repaired_code)
-    repairs.extend(quantifier_repairs)
-    
-    # 10. 修复ForAll在Facts部分的问题（需要移动到Rules部分）
-    repaired_code, forall_move_repairs = fix_forall_in_facts(repaired_code)
-    repairs.extend(forall_move_repairs)
-    
-    # 11. 修复Z3表达式类型错误
-    repaired_code, type_repairs = fix_z3_type_errors(repaired_code)
-    repairs.extend(type_repairs)
-    
-    # 12. 修复Function定义错误（BoolSort应该是Entity）
-    repaired_code, func_sig_repairs = fix_function_signature_errors(repaired_code)
-    repairs.extend(func_sig_repairs)
-    
-    # 13. 修复孤立的缩进行（在注释掉某行后留下的缩进行）
-    repaired_code, orphan_repairs = fix_orphaned_indented_lines(repaired_code)
-    repairs.extend(orphan_repairs)
-    
-    # 14. 最终清理：移除孤立的括号行
-    repaired_code, final_repairs = final_cleanup_orphaned_brackets(repaired_code)
-    repairs.extend(final_repairs)
-    
-    # 15. 修复StringSort函数调用中的字符串字面量
-    repaired_code, string_literal_repairs = fix_string_literals_in_stringSort_calls(repaired_code)
-    repairs.extend(string_literal_repairs)
-    
-    return repaired_code, repairs
+    lines = code.split('\n')
+    for fix in _PIPELINE:
+        fix(lines, repairs)
+    return '\n'.join(lines), repairs
+
+
+def _run_on_text(fix, code: str) -> Tuple[str, List[str]]:
+    """以 str -> (str, 修复记录) 的形式调用原地修改行列表的修复步骤"""
+    repairs = []
+    lines = code.split('\n')
+    fix(lines, repairs)
+    return '\n'.join(lines), repairs
 
 
 def fix_bracket_mismatch(code: str) -> Tuple[str, List[str]]:
@@ -97,11 +145,44 @@ def fix_bracket_mismatch(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
+    return _run_on_text(_fix_bracket_mismatch, code)
+
+
+def _bracket_stats(lines: List[str]) -> Tuple[List[int], List[int]]:
+    """逐行统计左、右括号数量，返回两个与 lines 等长的列表"""
+    return [line.count('(') for line in lines], [line.count(')') for line in lines]
+
+
+def _fix_brackets(lines: List[str], repairs: List[str]) -> None:
+    """整体与逐行的括号检查，共用同一份逐行括号计数"""
+    stats = _bracket_stats(lines)
+    _fix_bracket_mismatch(lines, repairs, stats)
+    _fix_line_brackets(lines, repairs, stats)
+
+
+def _fix_undefined_names(lines: List[str], repairs: List[str]) -> None:
+    """
+    依次修复未定义的函数调用、调用中的未定义变量、Bool变量和谓词
+    
+    这几步都要对整段代码做跨行匹配，共用同一份拼接好的代码，只在某一步修改了行之后才重新拼接
+    """
+    code = '\n'.join(lines)
+    for fix in (_fix_undefined_function_calls, _fix_undefined_variables_in_calls,
+                _fix_undefined_bool_variables, _fix_undefined_predicates):
+        before = lines[:]
+        fix(lines, repairs, code)
+        if lines != before:
+            code = '\n'.join(lines)
+
+
+def _fix_bracket_mismatch(lines: List[str], repairs: List[str],
+                          stats: Optional[Tuple[List[int], List[int]]] = None) -> None:
+    """同 fix_bracket_mismatch，直接处理行列表；stats 为 _bracket_stats 的结果"""
+    opens, closes = stats or _bracket_stats(lines)
     
     # 计算整体括号平衡
-    open_parens = code.count('(')
-    close_parens = code.count(')')
+    open_parens = sum(opens)
+    close_parens = sum(closes)
     
     if open_parens > close_parens:
         # 缺少右括号
@@ -109,8 +190,6 @@ def fix_bracket_mismatch(code: str) -> Tuple[str, List[str]]:
         # 在代码末尾添加缺失的右括号（保守策略）
         # 但实际上我们更希望在正确的位置添加
         repairs.append(f"检测到缺少 {missing} 个右括号")
-    
-    return code, repairs
 
 
 def fix_line_brackets(code: str) -> Tuple[str, List[str]]:
@@ -126,25 +205,27 @@ def fix_line_brackets(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
-    fixed_lines = []
+    return _run_on_text(_fix_line_brackets, code)
+
+
+def _fix_line_brackets(lines: List[str], repairs: List[str],
+                       stats: Optional[Tuple[List[int], List[int]]] = None) -> None:
+    """同 fix_line_brackets，直接修改行列表；stats 为 _bracket_stats 的结果"""
+    opens, closes = stats or _bracket_stats(lines)
     
     for i, line in enumerate(lines):
-        original_line = line
-        
         # 检查是否是solver.add语句或包含ForAll/Implies/And的语句
         if 'solver.add(' in line or 'ForAll(' in line or 'Implies(' in line:
-            # 计算该行的括号平衡
-            open_count = line.count('(')
-            close_count = line.count(')')
+            # 该行的括号平衡
+            open_count = opens[i]
+            close_count = closes[i]
             
             if open_count > close_count:
                 # 检查是否是多行语句的开始（行尾是开括号、逗号或没有结束）
                 stripped = line.rstrip()
                 
                 # 如果行以开括号结尾，或者行中有注释前的内容以开括号结尾，这很可能是多行语句
-                code_part = stripped.split('#')[0].rstrip()  # 去除注释
+                code_part = stripped.partition('#')[0].rstrip()  # 去除注释
                 
                 if code_part.endswith('(') or code_part.endswith(','):
                     # 这是多行语句的开始或中间，不要修复
@@ -154,7 +235,7 @@ def fix_line_brackets(code: str) -> Tuple[str, List[str]]:
                     missing = open_count - close_count
                     
                     # 检查行尾是否有注释
-                    comment_match = re.search(r'\s*#.*$', line)
+                    comment_match = _COMMENT_TAIL_RE.search(line)
                     if comment_match:
                         # 在注释前插入括号
                         comment_start = comment_match.start()
@@ -164,10 +245,7 @@ def fix_line_brackets(code: str) -> Tuple[str, List[str]]:
                         line = line.rstrip() + ')' * missing
                     
                     repairs.append(f"第{i+1}行: 添加 {missing} 个右括号")
-        
-        fixed_lines.append(line)
-    
-    return '\n'.join(fixed_lines), repairs
+                    lines[i] = line
 
 
 def fix_undefined_bool_variables(code: str) -> Tuple[str, List[str]]:
@@ -182,71 +260,46 @@ def fix_undefined_bool_variables(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
+    return _run_on_text(_fix_undefined_bool_variables, code)
+
+
+def _fix_undefined_bool_variables(lines: List[str], repairs: List[str], code: Optional[str] = None) -> None:
+    """同 fix_undefined_bool_variables，直接修改行列表；code 为调用方已拼接好的 '\\n'.join(lines)"""
+    if code is None:
+        code = '\n'.join(lines)
     
     # 提取已定义的变量（Bool, Const, Function, Int等）
     defined_vars = set()
     
     # Bool变量
-    bool_pattern = r'(\w+)\s*=\s*Bool\s*\(\s*["\'](\w+)["\']\s*\)'
-    for match in re.finditer(bool_pattern, code):
+    for match in _BOOL_DEF_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Const变量
-    const_pattern = r'(\w+)\s*=\s*Const\s*\('
-    for match in re.finditer(const_pattern, code):
+    for match in _CONST_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Function定义
-    func_pattern = r'(\w+)\s*=\s*Function\s*\('
-    for match in re.finditer(func_pattern, code):
+    for match in _FUNCTION_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Int变量
-    int_pattern = r'(\w+)\s*=\s*Int\s*\('
-    for match in re.finditer(int_pattern, code):
+    for match in _INT_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # 查找所有使用的变量
     # 在Implies、And、Or、Not等语句中使用的变量
     used_vars = set()
     
-    # Python关键字（不能作为变量名）
-    python_keywords = {
-        'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await',
-        'break', 'class', 'continue', 'def', 'del', 'elif', 'else', 'except',
-        'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is',
-        'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return',
-        'try', 'while', 'with', 'yield'
-    }
-    
-    # Z3关键字和内置函数，不应被视为变量
-    z3_keywords = {
-        'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
-        'EnumSort', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct',
-        'If', 'sat', 'unsat', 'unknown', 'is_true', 'is_false', 'check', 'add',
-        'push', 'pop', 'model', 'assertions', 'print', 'eval', 'as_long',
-        'solver', 'x', 'y', 'z',  # 常见的量化变量名
-        'b', 'birds', 'golfers', 'vehicles', 'fruits', 'books',  # 常见的循环变量名
-        'i', 'j', 'k', 'v', 'f', 'g',  # 循环计数器
-    }
-    
-    # 合并所有关键字
-    all_keywords = python_keywords | z3_keywords
-    
     # 在solver.add()、Implies()、And()、Or()、Not()等语句中查找变量
-    # 匹配小写字母开头的标识符（可能是Bool变量）
-    var_usage_pattern = r'\b([a-z][a-z0-9_]*)\b'
-    
     # 只在特定上下文中查找：solver.add、Implies、And、Or、Not后面
-    lines = code.split('\n')
     for line in lines:
         # 跳过注释
         if line.strip().startswith('#'):
             continue
         
         # 跳过定义行（包含=的行）
-        if '=' in line.split('#')[0]:
+        if '=' in line.partition('#')[0]:
             continue
         
         # 跳过for循环行（避免将循环变量误认为Bool变量）
@@ -254,24 +307,19 @@ def fix_undefined_bool_variables(code: str) -> Tuple[str, List[str]]:
             continue
         
         # 只检查包含Z3约束的行
-        if any(keyword in line for keyword in ['solver.add', 'Implies', 'And', 'Or', 'Not', 'ForAll']):
+        if _Z3_CONSTRAINT_KEYWORD_RE.search(line):
             # 先移除字符串字面量（避免将字符串内容识别为变量）
-            line_without_strings = re.sub(r'"[^"]*"', '', line)
-            line_without_strings = re.sub(r"'[^']*'", '', line_without_strings)
+            line_without_strings = _DQ_STRING_RE.sub('', line)
+            line_without_strings = _SQ_STRING_RE.sub('', line_without_strings)
             
-            # 提取该行中的变量
-            for match in re.finditer(var_usage_pattern, line_without_strings):
-                var_name = match.group(1)
-                # 排除Python关键字和Z3关键字
-                if var_name not in all_keywords and not var_name.startswith('_'):
-                    used_vars.add(var_name)
+            # 提取该行中的变量（小写字母开头的标识符，可能是Bool变量）
+            used_vars.update(_VAR_USAGE_RE.findall(line_without_strings))
     
-    # 查找未定义的变量
-    undefined_vars = used_vars - defined_vars
+    # 查找未定义的变量（排除Python关键字和Z3关键字）
+    undefined_vars = used_vars - _ALL_KEYWORDS - defined_vars
     
     if undefined_vars:
         # 找到Bool变量定义的位置
-        lines = code.split('\n')
         insert_position = None
         
         # 找到最后一个Bool变量定义的位置
@@ -289,19 +337,10 @@ def fix_undefined_bool_variables(code: str) -> Tuple[str, List[str]]:
                     insert_position = i + 1
         
         if insert_position is not None:
-            # 生成新的变量定义
-            new_definitions = []
-            for var in sorted(undefined_vars):
-                new_definitions.append(f'{var} = Bool("{var}")')
-                repairs.append(f"自动添加未定义的Bool变量: {var}")
-            
-            # 在找到的位置插入
-            for j, new_def in enumerate(new_definitions):
-                lines.insert(insert_position + j, new_def)
-            
-            code = '\n'.join(lines)
-    
-    return code, repairs
+            # 生成新的变量定义，在找到的位置插入
+            new_vars = sorted(undefined_vars)
+            lines[insert_position:insert_position] = [f'{var} = Bool("{var}")' for var in new_vars]
+            repairs.extend(f"自动添加未定义的Bool变量: {var}" for var in new_vars)
 
 
 def fix_undefined_predicates(code: str) -> Tuple[str, List[str]]:
@@ -314,29 +353,26 @@ def fix_undefined_predicates(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
+    return _run_on_text(_fix_undefined_predicates, code)
+
+
+def _fix_undefined_predicates(lines: List[str], repairs: List[str], code: Optional[str] = None) -> None:
+    """同 fix_undefined_predicates，直接修改行列表；code 为调用方已拼接好的 '\\n'.join(lines)"""
+    if code is None:
+        code = '\n'.join(lines)
     
     # 提取已定义的谓词函数
     defined_predicates = set()
-    function_pattern = r"(\w+)\s*=\s*Function\s*\(\s*['\"](\w+)['\"]"
-    for match in re.finditer(function_pattern, code):
+    for match in _FUNCTION_DEF_RE.finditer(code):
         defined_predicates.add(match.group(1))
     
     # 查找所有使用的谓词（形如 PredicateName(entity) 的调用）
-    # 但要排除Python内置函数和z3函数
-    builtin_functions = {
-        'print', 'len', 'str', 'int', 'bool', 'list', 'dict', 'set', 'tuple',
-        'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
-        'EnumSort', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct',
-        'If', 'is_true', 'is_false', 'check', 'add', 'assertions', 'model', 'eval', 'as_long', 'range', 'sum'
-    }
-    
+    # 但要排除Python内置函数和z3函数（_BUILTIN_FUNCS）
     used_predicates = set()
     # 匹配类似 Predicate(x) 或 Predicate(Entity) 的调用
-    usage_pattern = r'\b([A-Z][a-zA-Z]*)\s*\('
-    for match in re.finditer(usage_pattern, code):
+    for match in _PREDICATE_CALL_RE.finditer(code):
         pred_name = match.group(1)
-        if pred_name not in builtin_functions:
+        if pred_name not in _BUILTIN_FUNCS:
             used_predicates.add(pred_name)
     
     # 查找未定义的谓词
@@ -347,7 +383,6 @@ def fix_undefined_predicates(code: str) -> Tuple[str, List[str]]:
         
         # 尝试在适当位置插入谓词定义
         # 找到最后一个Function定义的位置
-        lines = code.split('\n')
         insert_position = None
         last_predicate_line = None
         
@@ -360,46 +395,44 @@ def fix_undefined_predicates(code: str) -> Tuple[str, List[str]]:
         
         if insert_position is not None:
             # 查找Entity类型名称
-            entity_match = re.search(r"Entity,\s*\([^)]+\)\s*=\s*EnumSort\s*\(\s*['\"](\w+)['\"]", code)
+            entity_match = _ENTITY_ENUM_RE.search(code)
             entity_type = 'Entity' if entity_match else 'Entity'
             
             # 判断谓词的参数数量（单元谓词还是二元谓词）
             # 通过分析代码中的使用方式
-            predicate_arities = {}
-            for pred in undefined:
-                # 查找该谓词的调用，看有几个参数
-                # 例如：Eats(x, y) 是二元的，Cold(x) 是一元的
-                pattern = rf'{pred}\s*\(([^)]+)\)'
-                max_arity = 1  # 默认一元
-                for match in re.finditer(pattern, code):
-                    args = match.group(1)
-                    # 简单计数逗号数量+1
-                    arity = args.count(',') + 1
-                    if arity > max_arity:
-                        max_arity = arity
-                predicate_arities[pred] = max_arity
-            
-            # 生成新的谓词定义
-            new_definitions = []
-            for pred in sorted(undefined):
-                arity = predicate_arities.get(pred, 1)
-                if arity == 1:
-                    new_definitions.append(f"{pred} = Function('{pred}', {entity_type}, BoolSort())")
-                elif arity == 2:
-                    new_definitions.append(f"{pred} = Function('{pred}', {entity_type}, {entity_type}, BoolSort())")
-                else:
-                    # 三元及以上，按需扩展
-                    entity_args = ', '.join([entity_type] * arity)
-                    new_definitions.append(f"{pred} = Function('{pred}', {entity_args}, BoolSort())")
-                repairs.append(f"添加谓词定义: {pred} (参数数量: {arity})")
-            
-            # 在找到的位置插入
-            for j, new_def in enumerate(new_definitions):
-                lines.insert(insert_position + j, new_def)
+            # 例如：Eats(x, y) 是二元的，Cold(x) 是一元的
+            predicate_arities = _predicate_arities(code, undefined)
             
-            code = '\n'.join(lines)
+            # 生成新的谓词定义（每个参数都是实体类型），在找到的位置插入
+            new_preds = sorted(undefined)
+            lines[insert_position:insert_position] = [
+                f"{pred} = Function('{pred}', {', '.join([entity_type] * predicate_arities[pred])}, BoolSort())"
+                for pred in new_preds
+            ]
+            repairs.extend(f"添加谓词定义: {pred} (参数数量: {predicate_arities[pred]})" for pred in new_preds)
+
+
+def _predicate_arities(code: str, predicates: Set[str]) -> Dict[str, int]:
+    """
+    根据调用处的参数个数（逗号数量+1）推断每个谓词的参数数量，默认一元
     
-    return code, repairs
+    只扫描一遍代码：对每个 "字母串(参数)" 的调用位置，字母串的每个后缀若是待查谓词都计入，
+    同一谓词的匹配互不重叠，与对每个谓词分别执行 re.finditer(rf'{pred}\s*\(([^)]+)\)', code) 结果相同
+    """
+    arities = dict.fromkeys(predicates, 1)
+    match_ends = {}
+    for match in _LETTER_CALL_RE.finditer(code):
+        name = match.group(1)
+        start = match.start(1)
+        for k in range(len(name)):
+            pred = name[k:]
+            if pred not in arities or start + k < match_ends.get(pred, 0):
+                continue
+            match_ends[pred] = match.end(2) + 1
+            arity = match.group(2).count(',') + 1
+            if arity > arities[pred]:
+                arities[pred] = arity
+    return arities
 
 
 def fix_common_syntax_issues(code: str) -> Tuple[str, List[str]]:
@@ -412,41 +445,27 @@ def fix_common_syntax_issues(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_common_syntax_issues, code)
+
+
+def _fix_common_syntax_issues(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_common_syntax_issues，直接修改行列表"""
     fixed_lines = []
     
     for line_num, line in enumerate(lines):
         original_line = line
         
         # 跳过注释和空行
-        if line.strip().startswith('#') or not line.strip():
+        stripped = line.strip()
+        if stripped.startswith('#') or not stripped:
             fixed_lines.append(line)
             continue
         
         # 修复And/Or/Implies中缺少逗号的问题
         # 检测模式: And(A(x) B(x)) 应该是 And(A(x), B(x))
-        if any(keyword in line for keyword in ['And(', 'Or(', 'Implies(']):
-            # 使用正则表达式检测缺少逗号的模式
+        if _CONNECTIVE_CALL_RE.search(line):
             # 匹配: FunctionName(arg) FunctionName(arg) （中间没有逗号）
-            missing_comma_pattern = r'(\w+\([^)]*\))\s+(\w+\()'
-            
-            # 在And、Or、Implies的参数中查找
-            fixed_line = line
-            iteration = 0
-            max_iterations = 10  # 防止无限循环
-            
-            while iteration < max_iterations:
-                new_line = re.sub(
-                    missing_comma_pattern,
-                    r'\1, \2',
-                    fixed_line
-                )
-                if new_line == fixed_line:
-                    break  # 没有更多替换
-                fixed_line = new_line
-                iteration += 1
-            
+            fixed_line = _insert_missing_commas(line)
             if fixed_line != line:
                 line = fixed_line
                 repairs.append(f"第{line_num+1}行: 添加缺失的逗号")
@@ -462,25 +481,15 @@ def fix_common_syntax_issues(code: str) -> Tuple[str, List[str]]:
             
             # 检查括号是否匹配
             # 如果Implies内部的And有多余的参数，可能是缺少逗号
-            implies_match = re.search(r'Implies\s*\((.*)\)', line)
+            implies_match = _IMPLIES_ARGS_RE.search(line)
             if implies_match:
                 content = implies_match.group(1)
-                # 计算逗号数量（顶层的，不在括号内的）
-                depth = 0
-                comma_count = 0
-                for char in content:
-                    if char == '(':
-                        depth += 1
-                    elif char == ')':
-                        depth -= 1
-                    elif char == ',' and depth == 0:
-                        comma_count += 1
                 
                 # Implies需要恰好一个顶层逗号（两个参数）
-                if comma_count == 0:
+                if not _has_top_level_comma(content):
                     # 没有逗号，尝试修复
                     # 尝试找到And(...)的结束位置，在其后添加逗号并将剩余部分作为第二个参数
-                    and_match = re.search(r'Implies\s*\(\s*And\s*\(', line)
+                    and_match = _IMPLIES_AND_RE.search(line)
                     if and_match:
                         # 找到And的结束位置
                         start_pos = and_match.end()
@@ -532,8 +541,8 @@ def fix_common_syntax_issues(code: str) -> Tuple[str, List[str]]:
         
         # 1. 修复 And/Or 只有一个参数的情况
         # And(single_arg) -> single_arg
-        single_and_pattern = r'\bAnd\s*\(\s*([^,()]+(?:\([^()]*\))?)\s*\)'
-        matches = list(re.finditer(single_and_pattern, line))
+        # 以下各项都先用子串判断筛掉不可能匹配的行，再交给正则
+        matches = list(_SINGLE_AND_RE.finditer(line)) if 'And' in line else []
         for match in reversed(matches):  # 从后往前替换避免位置偏移
             # 检查是否真的只有一个参数（没有逗号）
             inner = match.group(1)
@@ -551,18 +560,56 @@ def fix_common_syntax_issues(code: str) -> Tuple[str, List[str]]:
             repairs.append(f"第{line_num+1}行: 替换 Or() 为 False")
         
         # 3. 修复多余的逗号（如 And(a, b,) ）
-        line = re.sub(r',\s*\)', ')', line)
+        if ',' in line:
+            line = _TRAILING_COMMA_RE.sub(')', line)
         
         # 4. 修复 ForAll 后缺少方括号的情况
         # ForAll(x, ...) -> ForAll([x], ...)
-        forall_fix_pattern = r'ForAll\s*\(\s*([a-z_]\w*)\s*,'
-        if re.search(forall_fix_pattern, line):
-            line = re.sub(forall_fix_pattern, r'ForAll([\1],', line)
-            repairs.append(f"第{line_num+1}行: 修复 ForAll 的变量格式（添加方括号）")
+        if 'ForAll' in line:
+            line, forall_fixes = _FORALL_FIX_RE.subn(r'ForAll([\1],', line)
+            if forall_fixes:
+                repairs.append(f"第{line_num+1}行: 修复 ForAll 的变量格式（添加方括号）")
         
         fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
+
+
+def _has_top_level_comma(text: str) -> bool:
+    """text 中是否有不在括号内的逗号，找到第一个即返回"""
+    if ',' not in text:
+        return False
+    depth = 0
+    for char in text:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            return True
+    return False
+
+
+def _insert_missing_commas(line: str) -> str:
+    """
+    在相邻的调用之间补上逗号，如 A(x) B(x) -> A(x), B(x)
+    
+    只扫描一遍：')' 后的空白，若紧跟 "标识符("，且该 ')' 与上一个 ')' 之间出现过 "标识符("，
+    就把空白替换为 ', '。结果与反复执行 re.sub(r'(\w+\([^)]*\))\s+(\w+\()', r'\1, \2', line)
+    直到不再变化相同
+    """
+    parts = []
+    last = 0
+    for gap in _CALL_GAP_RE.finditer(line):
+        close = gap.start()
+        if _CALL_OPEN_RE.search(line, line.rfind(')', 0, close) + 1, close):
+            parts.append(line[last:close + 1])
+            parts.append(', ')
+            last = gap.end()
+    if not parts:
+        return line
+    parts.append(line[last:])
+    return ''.join(parts)
 
 
 def fix_python_logical_operators(code: str) -> Tuple[str, List[str]]:
@@ -580,8 +627,11 @@ def fix_python_logical_operators(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_python_logical_operators, code)
+
+
+def _fix_python_logical_operators(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_python_logical_operators，直接修改行列表"""
     fixed_lines = []
     
     for line_num, line in enumerate(lines):
@@ -594,7 +644,7 @@ def fix_python_logical_operators(code: str) -> Tuple[str, List[str]]:
         
         # 修复solver.add中的or
         if 'solver.add' in line and ' or ' in line:
-            match = re.search(r'solver\.add\((.*)\)', line, re.DOTALL)
+            match = _SOLVER_ADD_RE.search(line)
             if match:
                 arg = match.group(1)
                 if ' or ' in arg:
@@ -625,7 +675,7 @@ def fix_python_logical_operators(code: str) -> Tuple[str, List[str]]:
             # 避免重复修复，只在未修改时处理
             pass
         elif 'solver.add' in line and ' and ' in line:
-            match = re.search(r'solver\.add\((.*)\)', line, re.DOTALL)
+            match = _SOLVER_ADD_RE.search(line)
             if match:
                 arg = match.group(1)
                 if ' and ' in arg:
@@ -653,7 +703,7 @@ def fix_python_logical_operators(code: str) -> Tuple[str, List[str]]:
         
         fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
@@ -670,24 +720,17 @@ def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
-    
-    # 查找已定义的量化变量
-    defined_vars = set()
-    # 匹配形如: x = Const('x', Entity) 或 x = Const('x', SomeType)
-    const_pattern = r'^([a-z])\s*=\s*Const\s*\(\s*["\']([a-z])["\']\s*,'
-    for line in lines:
-        match = re.match(const_pattern, line.strip())
-        if match:
-            defined_vars.add(match.group(1))
+    return _run_on_text(_fix_undefined_quantifier_variables, code)
+
+
+def _fix_undefined_quantifier_variables(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_undefined_quantifier_variables，直接修改行列表"""
     
     # 查找ForAll/Exists中使用的变量
     used_vars = set()
     # 匹配 ForAll([x], ...) 或 ForAll([x, y], ...) 或 Exists([x], ...)
-    forall_pattern = r'(?:ForAll|Exists)\s*\(\s*\[([^\]]+)\]'
     for line in lines:
-        matches = re.finditer(forall_pattern, line)
+        matches = _QUANT_VARS_RE.finditer(line)
         for match in matches:
             vars_str = match.group(1)
             # 分割变量名（可能有多个）
@@ -696,6 +739,18 @@ def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
                 if var and var.isidentifier():
                     used_vars.add(var)
     
+    # 没有使用量化变量时无需修复
+    if not used_vars:
+        return
+    
+    # 查找已定义的量化变量
+    defined_vars = set()
+    # 匹配形如: x = Const('x', Entity) 或 x = Const('x', SomeType)
+    for line in lines:
+        match = _QUANT_CONST_RE.match(line.strip())
+        if match:
+            defined_vars.add(match.group(1))
+    
     # 找出未定义的变量
     undefined_vars = used_vars - defined_vars
     
@@ -708,7 +763,7 @@ def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
             if 'EnumSort' in line and '=' in line:
                 has_entity_def = True
                 # 提取Entity类型名
-                match = re.search(r'(\w+)\s*,\s*\([^)]+\)\s*=\s*EnumSort', line)
+                match = _ENUM_TUPLE_RE.search(line)
                 if match:
                     entity_type = match.group(1)
                 break
@@ -720,13 +775,14 @@ def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
             
             fixed_lines = []
             for i, line in enumerate(lines):
-                if re.search(forall_pattern, line) and not line.strip().startswith('#'):
+                if _QUANT_VARS_RE.search(line) and not line.strip().startswith('#'):
                     fixed_lines.append('# ERROR_NO_ENTITY: ' + line.lstrip() + '  # 缺少Entity定义，无法使用ForAll/Exists')
                     repairs.append(f"第{i+1}行: 注释掉ForAll/Exists（缺少Entity定义）")
                 else:
                     fixed_lines.append(line)
             
-            return '\n'.join(fixed_lines), repairs
+            lines[:] = fixed_lines
+            return
         
         # 有Entity定义，可以添加变量
         insert_position = None
@@ -738,22 +794,10 @@ def fix_undefined_quantifier_variables(code: str) -> Tuple[str, List[str]]:
                 break
         
         if insert_position is not None:
-            # 在solver定义前插入变量定义（添加空行）
-            new_definitions = []
-            # 先添加注释
-            new_definitions.append('')
-            new_definitions.append('# Quantifier variables')
-            for var in sorted(undefined_vars):
-                new_definitions.append(f"{var} = Const('{var}', {entity_type})")
-                repairs.append(f"自动添加未定义的量化变量: {var} = Const('{var}', {entity_type})")
-            
-            # 在找到的位置之前插入
-            for j, new_def in enumerate(new_definitions):
-                lines.insert(insert_position + j, new_def)
-            
-            code = '\n'.join(lines)
-    
-    return code, repairs
+            # 在solver定义前插入变量定义（先添加空行和注释）
+            new_definitions = [f"{var} = Const('{var}', {entity_type})" for var in sorted(undefined_vars)]
+            lines[insert_position:insert_position] = ['', '# Quantifier variables'] + new_definitions
+            repairs.extend(f"自动添加未定义的量化变量: {definition}" for definition in new_definitions)
 
 
 def fix_forall_in_facts(code: str) -> Tuple[str, List[str]]:
@@ -768,21 +812,25 @@ def fix_forall_in_facts(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_forall_in_facts, code)
+
+
+def _fix_forall_in_facts(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_forall_in_facts，直接修改行列表"""
     
     # 找到关键位置
     facts_start = None
     rules_start = None
-    x_definition = None
+    rules_lines = []  # 所有含 "# 4. Rules" 的行号，删除行后据此重新定位Rules部分
     
     for i, line in enumerate(lines):
+        has_rules = '# 4. Rules' in line
+        if has_rules:
+            rules_lines.append(i)
         if '# 3. Facts' in line:
             facts_start = i
-        elif '# 4. Rules' in line:
+        elif has_rules:
             rules_start = i
-        elif re.match(r'^\s*x\s*=\s*Const\s*\(', line.strip()):
-            x_definition = i
     
     # 如果找到了Facts和Rules部分
     if facts_start is not None and rules_start is not None:
@@ -803,12 +851,9 @@ def fix_forall_in_facts(code: str) -> Tuple[str, List[str]]:
             for i in reversed(lines_to_remove):
                 del lines[i]
             
-            # 重新找到Rules部分的位置（因为删除了行）
-            rules_start = None
-            for i, line in enumerate(lines):
-                if '# 4. Rules' in line:
-                    rules_start = i
-                    break
+            # 重新找到Rules部分的位置（因为删除了行）：第一个未被删除的Rules行，减去它之前删除的行数
+            rules_start = next((i - bisect_left(lines_to_remove, i)
+                                for i in rules_lines if i not in lines_to_remove), None)
             
             if rules_start is not None:
                 # 找到x定义的位置（应该在Rules部分之后）
@@ -819,12 +864,7 @@ def fix_forall_in_facts(code: str) -> Tuple[str, List[str]]:
                         break
                 
                 # 在x定义之后插入ForAll语句
-                for j, statement in enumerate(forall_statements):
-                    lines.insert(insert_position + j, statement)
-                
-                code = '\n'.join(lines)
-    
-    return code, repairs
+                lines[insert_position:insert_position] = forall_statements
 
 
 def fix_z3_type_errors(code: str) -> Tuple[str, List[str]]:
@@ -843,18 +883,20 @@ def fix_z3_type_errors(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_z3_type_errors, code)
+
+
+def _fix_z3_type_errors(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_z3_type_errors，直接修改行列表"""
     
     # 首先，找出所有在EnumSort中定义的实体名
     entity_names = set()
-    enum_pattern = r'EnumSort\s*\(\s*["\'](\w+)["\']\s*,\s*\[([^\]]+)\]'
     for line in lines:
-        match = re.search(enum_pattern, line)
+        match = _ENUM_ENTITIES_RE.search(line)
         if match:
             entities_str = match.group(2)
             # 提取所有实体名
-            for entity in re.findall(r'["\'](\w+)["\']', entities_str):
+            for entity in _QUOTED_NAME_RE.findall(entities_str):
                 entity_names.add(entity)
     
     # 检查是否有实体名被错误地定义为Function
@@ -863,13 +905,14 @@ def fix_z3_type_errors(code: str) -> Tuple[str, List[str]]:
         original_line = line
         
         # 跳过注释和空行
-        if line.strip().startswith('#') or not line.strip():
+        stripped = line.strip()
+        if stripped.startswith('#') or not stripped:
             fixed_lines.append(line)
             continue
         
         # 检测Entity被定义为Function的错误
         if 'Function(' in line and '=' in line:
-            match = re.search(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,', line)
+            match = _FUNCTION_HEAD_RE.search(line)
             if match:
                 var_name = match.group(1)
                 func_name = match.group(2)
@@ -883,18 +926,18 @@ def fix_z3_type_errors(code: str) -> Tuple[str, List[str]]:
         # 修复solver.add(True) 或 solver.add(False)
         if 'solver.add(' in line:
             # 替换solver.add(True)为注释（True约束无意义）
-            if re.search(r'solver\.add\s*\(\s*True\s*\)', line):
+            if _ADD_TRUE_RE.search(line):
                 line = '# ' + line.lstrip() + '  # Removed: solver.add(True) is redundant'
                 repairs.append(f"第{line_num+1}行: 移除无意义的 solver.add(True)")
             
             # 替换solver.add(False)为注释（使求解器unsat）
-            elif re.search(r'solver\.add\s*\(\s*False\s*\)', line):
+            elif _ADD_FALSE_RE.search(line):
                 line = '# ' + line.lstrip() + '  # WARNING: solver.add(False) makes problem UNSAT'
                 repairs.append(f"第{line_num+1}行: 注释掉 solver.add(False)")
         
         fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def analyze_bracket_error(code: str, error_line: int) -> Optional[str]:
@@ -951,32 +994,30 @@ def fix_undefined_function_calls(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_undefined_function_calls, code)
+
+
+def _fix_undefined_function_calls(lines: List[str], repairs: List[str], code: Optional[str] = None) -> None:
+    """同 fix_undefined_function_calls，直接修改行列表；code 为调用方已拼接好的 '\\n'.join(lines)"""
+    if code is None:
+        code = '\n'.join(lines)
     
     # 查找已定义的函数和变量
     defined_items = set()
     
     # Bool变量
-    for match in re.finditer(r'(\w+)\s*=\s*Bool\s*\(', code):
+    for match in _BOOL_ASSIGN_RE.finditer(code):
         defined_items.add(match.group(1))
     
     # Function定义
-    for match in re.finditer(r'(\w+)\s*=\s*Function\s*\(', code):
+    for match in _FUNCTION_ASSIGN_RE.finditer(code):
         defined_items.add(match.group(1))
     
     # Const定义
-    for match in re.finditer(r'(\w+)\s*=\s*Const\s*\(', code):
+    for match in _CONST_ASSIGN_RE.finditer(code):
         defined_items.add(match.group(1))
     
-    # 查找被调用的函数（形如 func_name(...) ）
-    z3_builtins = {
-        'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'Function', 'Const', 'Consts', 'And', 'Or', 'Not', 
-        'Implies', 'ForAll', 'Exists', 'Distinct', 'If', 'EnumSort', 'BoolSort',
-        'IntSort', 'StringSort', 'String', 'StringVal', 'print', 'exit', 'unsat', 'sat', 'unknown', 'check', 'push', 'pop', 'add',
-        'is_true', 'is_false', 'model', 'eval', 'as_long', 'range', 'len', 'sum'
-    }
-    
+    # 查找被调用的函数（形如 func_name(...) ），排除 _Z3_BUILTIN_CALLS
     called_functions = set()
     for line in lines:
         # 跳过注释和定义行
@@ -984,9 +1025,9 @@ def fix_undefined_function_calls(code: str) -> Tuple[str, List[str]]:
             continue
         
         # 查找函数调用 func_name(...)
-        for match in re.finditer(r'(\w+)\s*\(', line):
+        for match in _CALL_NAME_RE.finditer(line):
             func_name = match.group(1)
-            if func_name not in z3_builtins and func_name not in defined_items:
+            if func_name not in _Z3_BUILTIN_CALLS and func_name not in defined_items:
                 # 检查是否看起来像函数调用（不是关键字）
                 if func_name not in ['if', 'elif', 'while', 'for', 'def', 'class']:
                     called_functions.add(func_name)
@@ -1004,6 +1045,7 @@ def fix_undefined_function_calls(code: str) -> Tuple[str, List[str]]:
             # 没有Entity，无法定义这些函数，需要注释掉调用
             repairs.append("警告：代码缺少Entity定义，无法定义函数，将注释掉相关调用")
             
+            call_re = re.compile(rf"\b(?:{'|'.join(undefined_functions)})\s*\(")
             fixed_lines = []
             for i, line in enumerate(lines):
                 if line.strip().startswith('#'):
@@ -1011,21 +1053,14 @@ def fix_undefined_function_calls(code: str) -> Tuple[str, List[str]]:
                     continue
                 
                 # 检查是否调用了未定义的函数
-                has_undefined_call = False
-                for func in undefined_functions:
-                    if re.search(rf'\b{func}\s*\(', line):
-                        has_undefined_call = True
-                        break
-                
-                if has_undefined_call:
+                if call_re.search(line):
                     fixed_lines.append('# ERROR_UNDEFINED_FUNC: ' + line.lstrip() + '  # 调用了未定义的函数')
                     repairs.append(f"第{i+1}行: 注释掉对未定义函数的调用")
                 else:
                     fixed_lines.append(line)
             
-            return '\n'.join(fixed_lines), repairs
-    
-    return code, repairs
+            lines[:] = fixed_lines
+            return
 
 
 def fix_function_signature_errors(code: str) -> Tuple[str, List[str]]:
@@ -1047,19 +1082,20 @@ def fix_function_signature_errors(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_function_signature_errors, code)
+
+
+def _fix_function_signature_errors(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_function_signature_errors，直接修改行列表"""
     fixed_lines = []
     
     # 检查是否定义了Entity类型
-    has_entity = 'EnumSort' in code
-    
     # 第一遍：找出所有有问题的Function定义
     problematic_functions = set()
     
     for line_num, line in enumerate(lines):
         if 'Function(' in line and '=' in line and not line.strip().startswith('#'):
-            match = re.search(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,\s*(.+)\)', line)
+            match = _FUNCTION_SIG_RE.search(line)
             if match:
                 func_var = match.group(1)
                 func_name = match.group(2)
@@ -1097,14 +1133,19 @@ def fix_function_signature_errors(code: str) -> Tuple[str, List[str]]:
                         problematic_functions.add(func_var)
                         problematic_functions.add(func_name)
     
+    # 没有错误的定义时，第二遍不会做任何修改
+    if not problematic_functions:
+        return
+    
     # 第二遍：注释掉有问题的定义，并移除对它们的调用
+    problematic_call_res = [(func, re.compile(rf'\b{func}\s*\(')) for func in problematic_functions]
     for line_num, line in enumerate(lines):
         original_line = line
         modified = False
         
         # 检查Function定义
         if 'Function(' in line and '=' in line and not line.strip().startswith('#'):
-            match = re.search(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,', line)
+            match = _FUNCTION_HEAD_RE.search(line)
             if match:
                 func_var = match.group(1)
                 if func_var in problematic_functions:
@@ -1114,9 +1155,9 @@ def fix_function_signature_errors(code: str) -> Tuple[str, List[str]]:
         
         # 检查是否调用了有问题的函数，如果是则注释掉整行
         if not modified and not line.strip().startswith('#'):
-            for prob_func in problematic_functions:
+            for prob_func, call_re in problematic_call_res:
                 # 检查函数调用模式：prob_func(...)
-                if re.search(rf'\b{prob_func}\s*\(', line):
+                if call_re.search(line):
                     # 这是一个对有问题函数的调用，需要注释掉
                     line = '# ERROR_REMOVED_CALL: ' + line.lstrip() + f'  # 调用了未定义的函数 {prob_func}'
                     repairs.append(f"第{line_num+1}行: 注释掉对错误函数 {prob_func} 的调用")
@@ -1125,7 +1166,7 @@ def fix_function_signature_errors(code: str) -> Tuple[str, List[str]]:
         
         fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
@@ -1151,20 +1192,23 @@ def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
-    fixed_lines = []
+    return _run_on_text(_fix_orphaned_indented_lines, code)
+
+
+def _fix_orphaned_indented_lines(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_orphaned_indented_lines，直接修改行列表"""
+    # 孤立行只会出现在错误注释行之后，没有这样的注释行时无需逐行检查
+    if not any(line.lstrip().startswith(_COMMENTED_ERROR_PREFIXES) for line in lines):
+        return
     
-    # Python块开始关键字（这些后面的缩进行是合法的）
-    block_keywords = ['if ', 'elif ', 'else:', 'for ', 'while ', 'def ', 'class ', 
-                     'try:', 'except ', 'except:', 'finally:', 'with ']
+    fixed_lines = []
     
     i = 0
     while i < len(lines):
         line = lines[i]
         
         # 检查当前行是否是被注释掉的行（以 # ERROR、# ORPHANED 等开头）
-        is_commented_error = line.strip().startswith(('# ERROR', '# ORPHANED', '# WARNING'))
+        is_commented_error = line.strip().startswith(_COMMENTED_ERROR_PREFIXES)
         
         # 只在行是错误注释时才检查孤立行
         if is_commented_error and i + 1 < len(lines):
@@ -1181,7 +1225,7 @@ def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
             is_in_block = False
             if prev_line_idx >= 0:
                 prev_line = lines[prev_line_idx].strip()
-                for keyword in block_keywords:
+                for keyword in _BLOCK_KEYWORDS:
                     if keyword in prev_line:
                         is_in_block = True
                         break
@@ -1194,9 +1238,10 @@ def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
             
             # 检查下一行是否有缩进（可能是孤立的延续行）
             next_line = lines[i + 1]
+            next_stripped = next_line.strip()
             
             # 如果下一行有缩进但不是注释，可能是孤立行
-            if next_line.startswith((' ', '\t')) and not next_line.strip().startswith('#') and next_line.strip():
+            if next_line.startswith((' ', '\t')) and not next_stripped.startswith('#') and next_stripped:
                 # 这是孤立的缩进行，找到所有连续的缩进行并注释掉
                 fixed_lines.append(line)
                 i += 1
@@ -1217,7 +1262,7 @@ def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
                         i += 1
                     else:
                         # 检查是否是单独的括号行（如 `)` 或 `))` 等）
-                        if re.match(r'^[)\s]+$', stripped):
+                        if _CLOSING_ONLY_RE.match(stripped):
                             # 这是多余的括号行
                             fixed_lines.append('# ORPHANED_BRACKETS: ' + current.lstrip() + '  # 多余的括号')
                             repairs.append(f"第{i+1}行: 注释掉多余的括号")
@@ -1235,7 +1280,7 @@ def fix_orphaned_indented_lines(code: str) -> Tuple[str, List[str]]:
         fixed_lines.append(line)
         i += 1
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def final_cleanup_orphaned_brackets(code: str) -> Tuple[str, List[str]]:
@@ -1251,22 +1296,25 @@ def final_cleanup_orphaned_brackets(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_final_cleanup_orphaned_brackets, code)
+
+
+def _final_cleanup_orphaned_brackets(lines: List[str], repairs: List[str]) -> None:
+    """同 final_cleanup_orphaned_brackets，直接修改行列表"""
     fixed_lines = []
     
     for i, line in enumerate(lines):
         stripped = line.strip()
         
         # 如果这行只包含括号和空白
-        if stripped and re.match(r'^[)\s]+$', stripped) and not line.strip().startswith('#'):
+        if stripped and _CLOSING_ONLY_RE.match(stripped) and not stripped.startswith('#'):
             # 注释掉这行
             fixed_lines.append('# ORPHANED_BRACKETS: ' + line.lstrip() + '  # 孤立的括号')
             repairs.append(f"第{i+1}行: 注释掉孤立的括号")
         else:
             fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def quick_bracket_fix(code: str) -> str:
@@ -1299,9 +1347,9 @@ def quick_bracket_fix(code: str) -> str:
         line_imbalance = line_open - line_close
         
         # 如果是以 solver.add( 开头并且括号不平衡
-        if ('solver.add(' in line or line.strip().startswith('solver.add(')) and line_imbalance > 0:
+        if ('solver.add(' in line or stripped.startswith('solver.add(')) and line_imbalance > 0:
             # 检查行尾是否有注释
-            comment_match = re.search(r'\s*#.*$', line)
+            comment_match = _COMMENT_TAIL_RE.search(line)
             if comment_match:
                 comment_start = comment_match.start()
                 line = line[:comment_start].rstrip() + ')' * line_imbalance + '  ' + line[comment_start:].lstrip()
@@ -1337,60 +1385,55 @@ def fix_undefined_variables_in_calls(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_undefined_variables_in_calls, code)
+
+
+def _fix_undefined_variables_in_calls(lines: List[str], repairs: List[str], code: Optional[str] = None) -> None:
+    """同 fix_undefined_variables_in_calls，直接修改行列表；code 为调用方已拼接好的 '\\n'.join(lines)"""
+    if code is None:
+        code = '\n'.join(lines)
     
     # 收集所有已定义的变量
     defined_vars = set()
     
     # Bool变量
-    for match in re.finditer(r'(\w+)\s*=\s*Bool\s*\(', code):
+    for match in _BOOL_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Const变量
-    for match in re.finditer(r'(\w+)\s*=\s*Const\s*\(', code):
+    for match in _CONST_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Function定义
-    for match in re.finditer(r'(\w+)\s*=\s*Function\s*\(', code):
+    for match in _FUNCTION_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # Int变量
-    for match in re.finditer(r'(\w+)\s*=\s*Int\s*\(', code):
+    for match in _INT_ASSIGN_RE.finditer(code):
         defined_vars.add(match.group(1))
     
     # EnumSort元素
-    enum_pattern = r'(\w+)\s*,\s*\(([^)]+)\)\s*=\s*EnumSort'
-    for match in re.finditer(enum_pattern, code):
+    for match in _ENUM_TUPLE_RE.finditer(code):
         # 添加类型名
         defined_vars.add(match.group(1))
         # 添加所有元素
         elements_str = match.group(2)
-        for elem in re.findall(r'\b(\w+)\b', elements_str):
+        for elem in _WORD_RE.findall(elements_str):
             defined_vars.add(elem)
     
-    # Z3内置函数和Python关键字
-    z3_and_python = {
-        'Solver', 'Bool', 'Bools', 'Int', 'Ints', 'Function', 'Const', 'Consts',
-        'And', 'Or', 'Not', 'Implies', 'ForAll', 'Exists', 'Distinct', 'If',
-        'EnumSort', 'BoolSort', 'IntSort', 'StringSort', 'String', 'StringVal',
-        'sat', 'unsat', 'unknown', 'solver', 'print', 'exit', 'True', 'False', 'None',
-        'if', 'elif', 'else', 'for', 'while', 'def', 'class', 'return', 'in', 'is', 'not',
-        'range', 'len', 'sum', 'max', 'min'
-    }
-    
     fixed_lines = []
     for line_num, line in enumerate(lines):
         original_line = line
         
         # 跳过已注释的行、空行、定义行
-        if line.strip().startswith('#') or not line.strip() or '=' in line.split('#')[0]:
+        stripped = line.strip()
+        if stripped.startswith('#') or not stripped or '=' in line.partition('#')[0]:
             fixed_lines.append(line)
             continue
         
         # 在函数调用中查找参数
         # 匹配 function_name(arg1, arg2, ...)
-        function_calls = re.finditer(r'(\w+)\s*\(([^)]*)\)', line)
+        function_calls = _CALL_ARGS_RE.finditer(line)
         
         has_undefined_var = False
         for call_match in function_calls:
@@ -1398,20 +1441,20 @@ def fix_undefined_variables_in_calls(code: str) -> Tuple[str, List[str]]:
             args_str = call_match.group(2)
             
             # 跳过Python和Z3内置函数
-            if func_name in z3_and_python:
+            if func_name in _Z3_AND_PYTHON_NAMES:
                 continue
             
             # 分析参数
             # 去除字符串字面量
-            args_cleaned = re.sub(r'"[^"]*"', '', args_str)
-            args_cleaned = re.sub(r"'[^']*'", '', args_cleaned)
+            args_cleaned = _DQ_STRING_RE.sub('', args_str)
+            args_cleaned = _SQ_STRING_RE.sub('', args_cleaned)
             
             # 提取可能的变量名（不在引号内的标识符）
-            var_candidates = re.findall(r'\b([a-z_]\w*)\b', args_cleaned)
+            var_candidates = _LOWER_IDENT_RE.findall(args_cleaned)
             
             for var in var_candidates:
                 # 如果这个变量没有定义，并且不是关键字
-                if var not in defined_vars and var not in z3_and_python:
+                if var not in defined_vars and var not in _Z3_AND_PYTHON_NAMES:
                     has_undefined_var = True
                     repairs.append(f"第{line_num+1}行: 发现未定义的变量 '{var}' 在函数调用中，注释掉该行")
                     break
@@ -1425,7 +1468,7 @@ def fix_undefined_variables_in_calls(code: str) -> Tuple[str, List[str]]:
         else:
             fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
 
 
 def fix_string_literals_in_stringSort_calls(code: str) -> Tuple[str, List[str]]:
@@ -1446,15 +1489,18 @@ def fix_string_literals_in_stringSort_calls(code: str) -> Tuple[str, List[str]]:
     Returns:
         (修复后的代码, 修复记录)
     """
-    repairs = []
-    lines = code.split('\n')
+    return _run_on_text(_fix_string_literals_in_stringSort_calls, code)
+
+
+def _fix_string_literals_in_stringSort_calls(lines: List[str], repairs: List[str]) -> None:
+    """同 fix_string_literals_in_stringSort_calls，直接修改行列表"""
     
     # 找出所有使用StringSort的函数定义
     stringSort_functions = {}  # {func_name: [param_positions_that_are_StringSort]}
     
     for line in lines:
         # 匹配 func_name = Function("func_name", arg1, arg2, ..., BoolSort())
-        match = re.search(r'(\w+)\s*=\s*Function\s*\(\s*["\'](\w+)["\']\s*,\s*(.+)\)', line)
+        match = _FUNCTION_SIG_RE.search(line)
         if match:
             func_name = match.group(1)
             type_args = match.group(3)
@@ -1490,24 +1536,25 @@ def fix_string_literals_in_stringSort_calls(code: str) -> Tuple[str, List[str]]:
                 stringSort_functions[func_name] = stringSort_positions
     
     if not stringSort_functions:
-        return code, repairs
+        return
     
     # 现在修复调用这些函数时使用字符串字面量的情况
+    call_res = [(func_name, re.compile(rf'\b{func_name}\s*\(([^)]+)\)'), string_positions)
+                for func_name, string_positions in stringSort_functions.items()]
     fixed_lines = []
     for line_num, line in enumerate(lines):
         original_line = line
         
         # 跳过注释和定义行
-        if line.strip().startswith('#') or '=' in line.split('#')[0]:
+        if line.strip().startswith('#') or '=' in line.partition('#')[0]:
             fixed_lines.append(line)
             continue
         
         # 检查是否调用了StringSort函数
         modified = False
-        for func_name, string_positions in stringSort_functions.items():
+        for func_name, call_re, string_positions in call_res:
             # 查找该函数的调用
-            pattern = rf'\b{func_name}\s*\(([^)]+)\)'
-            matches = list(re.finditer(pattern, line))
+            matches = list(call_re.finditer(line))
             
             for match in matches:
                 args_str = match.group(1)
@@ -1553,7 +1600,27 @@ def fix_string_literals_in_stringSort_calls(code: str) -> Tuple[str, List[str]]:
         
         fixed_lines.append(line)
     
-    return '\n'.join(fixed_lines), repairs
+    lines[:] = fixed_lines
+
+
+# repair_code 依次执行的修复步骤，顺序有依赖关系
+_PIPELINE = (
+    _fix_brackets,                               # 1. 修复括号不匹配；2. 修复行级括号不匹配（逐行检查）
+    # 3. 修复未定义但被调用的函数（如in_state, same_state等） - 必须在Bool变量修复之前
+    # 4. 修复使用了未定义变量的函数调用（如 is_in_state(x, s) 其中 s 未定义） - 在Bool修复之前
+    # 5. 修复未定义的Bool变量
+    # 6. 修复未定义的谓词
+    _fix_undefined_names,
+    _fix_common_syntax_issues,                   # 7. 修复常见的Z3语法问题
+    _fix_python_logical_operators,               # 8. 修复Python逻辑运算符（or/and）为Z3函数（Or/And）
+    _fix_undefined_quantifier_variables,         # 9. 修复未定义的量化变量（x, y等）
+    _fix_forall_in_facts,                        # 10. 修复ForAll在Facts部分的问题（需要移动到Rules部分）
+    _fix_z3_type_errors,                         # 11. 修复Z3表达式类型错误
+    _fix_function_signature_errors,              # 12. 修复Function定义错误（BoolSort应该是Entity）
+    _fix_orphaned_indented_lines,                # 13. 修复孤立的缩进行（在注释掉某行后留下的缩进行）
+    _final_cleanup_orphaned_brackets,            # 14. 最终清理：移除孤立的括号行
+    _fix_string_literals_in_stringSort_calls,    # 15. 修复StringSort函数调用中的字符串字面量
+)
 
 
 # 测试函数
@@ -1649,7 +1716,8 @@ else:
     print("尝试执行修复后的代码...")
     print("=" * 60)
     try:
-        exec(repaired)
+        # 先 compile 再在独立命名空间中执行：语法错误带上文件名，也不会污染本模块的全局变量
+        exec(compile(repaired, '<repaired>', 'exec'), {'__name__': '__repaired__'})
         print("\n✓ 代码执行成功!")
     except Exception as e:
         print(f"\n✗ 代码执行失败: {e}")
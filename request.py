@@ -11,55 +11,137 @@ Request 模块 - 使用 OpenAI 官方库发送 API 请求
 - deepseek-reasoner (DeepSeek)
 """
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import re
 import time
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
 
+# 流式生成时识别代码块开头的围栏
+_PY_FENCE_OPEN_RE = re.compile(r'```python', re.IGNORECASE)
+
+
+def _is_rate_limit_error(error_str: str) -> bool:
+    """异常信息是否表示触发了服务端速率限制（HTTP 429）"""
+    return 'rate_limit' in error_str.lower() or '429' in error_str
+
+
+class RateLimiter:
+    """
+    异步请求限速器
+
+    - 令牌桶：限制每分钟请求数（rpm 为 0 时不限制）
+    - AIMD 并发控制：遇到 429 时并发上限减半并冷却 30 秒，之后每连续成功 10 次上限加 1，
+      直到恢复到 max_concurrency
+    """
+
+    PENALTY_SECONDS = 30
+    SUCCESSES_PER_STEP = 10
+
+    def __init__(self, rpm: int = 0, max_concurrency: int = 4):
+        self.rpm = rpm
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self._in_flight = 0
+        self._successes = 0
+        self._penalized_until = 0.0
+        self._tokens = float(rpm)
+        self._last_refill = time.monotonic()
+        self._condition = asyncio.Condition()
+
+    async def _take_token(self):
+        """从令牌桶取一个令牌，桶空时等到下一个令牌生成"""
+        while self.rpm > 0:
+            now = time.monotonic()
+            self._tokens = min(self.rpm, self._tokens + (now - self._last_refill) * self.rpm / 60)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) * 60 / self.rpm)
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        try:
+            await self._take_token()
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self, rate_limited: bool = False):
+        """归还并发名额；rate_limited 为 True 表示本次请求收到了 429"""
+        async with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                # 乘性减：并发减半，冷却期内不再增加
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self._penalized_until = now + self.PENALTY_SECONDS
+            elif now >= self._penalized_until and self.limit < self.max_concurrency:
+                # 加性增：连续成功若干次后放开一个名额
+                self._successes += 1
+                if self._successes >= self.SUCCESSES_PER_STEP:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
 
 class LLMClient:
     """LLM API 客户端（基于 OpenAI 官方库）"""
     
     # 模型配置
+    # max_output_tokens: 单次请求允许的最大输出 token 数（max_tokens 超过它时 API 直接返回 400）
     MODEL_CONFIGS = {
         'gpt-3.5-turbo': {
             'provider': 'openai',
             'api_base': 'https://api.openai.com/v1',
-            'model_name': 'gpt-3.5-turbo'
+            'model_name': 'gpt-3.5-turbo',
+            'max_output_tokens': 4096
         },
         'gpt-4': {
             'provider': 'openai',
             'api_base': 'https://api.openai.com/v1',
-            'model_name': 'gpt-4'
+            'model_name': 'gpt-4',
+            'max_output_tokens': 8192
         },
         'gpt-4-turbo': {
             'provider': 'openai',
             'api_base': 'https://api.openai.com/v1',
-            'model_name': 'gpt-4-turbo'
+            'model_name': 'gpt-4-turbo',
+            'max_output_tokens': 4096
         },
         'gpt-4o': {
             'provider': 'openai',
             'api_base': 'https://api.openai.com/v1',
-            'model_name': 'gpt-4o'
+            'model_name': 'gpt-4o',
+            'max_output_tokens': 16384
         },
         'gpt-4o-mini': {
             'provider': 'openai',
             'api_base': 'https://api.openai.com/v1',
-            'model_name': 'gpt-4o-mini'
+            'model_name': 'gpt-4o-mini',
+            'max_output_tokens': 16384
         },
         'deepseek-chat': {
             'provider': 'deepseek',
             'api_base': 'https://api.deepseek.com',
-            'model_name': 'deepseek-chat'
+            'model_name': 'deepseek-chat',
+            'max_output_tokens': 8192
         },
         'deepseek-reasoner': {
             'provider': 'deepseek',
             'api_base': 'https://api.deepseek.com',
-            'model_name': 'deepseek-reasoner'
+            'model_name': 'deepseek-reasoner',
+            'max_output_tokens': 32768
         }
     }
     
     def __init__(self, api_key: str, model: str = 'gpt-3.5-turbo', 
-                 custom_api_base: Optional[str] = None):
+                 custom_api_base: Optional[str] = None, rate_limiter: Optional[RateLimiter] = None):
         """
         初始化LLM客户端
         
@@ -67,22 +149,105 @@ class LLMClient:
             api_key: API密钥
             model: 模型名称
             custom_api_base: 自定义API地址（可选，用于代理）
+            rate_limiter: 异步请求的限速器（可选，仅作用于 send_loop_messages_async）
         """
         self.api_key = api_key
         self.model = model
         self.custom_api_base = custom_api_base
+        self.rate_limiter = rate_limiter
         
         if model not in self.MODEL_CONFIGS:
             raise ValueError(f"不支持的模型: {model}. 支持的模型: {list(self.MODEL_CONFIGS.keys())}")
         
         self.config = self.MODEL_CONFIGS[model]
-        
-        # 初始化 OpenAI 客户端
-        base_url = custom_api_base if custom_api_base else self.config['api_base']
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        self.base_url = custom_api_base if custom_api_base else self.config['api_base']
+
+        # OpenAI 客户端在首次使用时创建
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self) -> OpenAI:
+        """同步 OpenAI 客户端"""
+        if self._client is None:
+            self._client = OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,  # 重试统一由 send_loop_messages* 负责（含限速器反馈），SDK 不再重复重试
+            )
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """异步 OpenAI 客户端（连接池绑定到首次使用时的事件循环，用完需 aclose）"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,  # 重试统一由 send_loop_messages* 负责（含限速器反馈），SDK 不再重复重试
+            )
+        return self._async_client
+
+    async def aclose(self):
+        """关闭异步客户端及其连接池"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def _success_result(self, response) -> Dict[str, Any]:
+        """把 API 响应整理成统一的结果字典"""
+        return {
+            'success': True,
+            'content': response.choices[0].message.content,
+            'model': self.model,
+            'usage': {
+                'prompt_tokens': response.usage.prompt_tokens if response.usage else 0,
+                'completion_tokens': response.usage.completion_tokens if response.usage else 0,
+                'total_tokens': response.usage.total_tokens if response.usage else 0
+            },
+            'raw_response': response
+        }
+
+    def _classify_error(self, e: Exception, attempt: int, timeout: int, max_retries: int):
+        """
+        对请求异常分类
+
+        Returns:
+            (错误描述, 重试前等待秒数, 不可重试时直接返回的结果字典或 None)
+        """
+        error_str = str(e)
+
+        # 处理特定错误
+        if _is_rate_limit_error(error_str):
+            # 速率限制，等待后重试
+            wait_time = 2 ** attempt * 5
+            return f"速率限制，等待 {wait_time}s 后重试", wait_time, None
+
+        elif 'authentication' in error_str.lower() or '401' in error_str:
+            return None, 0, {
+                'success': False,
+                'error': 'API密钥无效或已过期',
+                'model': self.model
+            }
+
+        elif 'timeout' in error_str.lower():
+            last_error = f"请求超时 ({timeout}s)"
+
+        elif 'connection' in error_str.lower():
+            last_error = f"连接错误: {error_str}"
+
+        else:
+            last_error = f"错误: {error_str}"
+
+        # 重试前等待
+        return last_error, (2 ** attempt if attempt < max_retries - 1 else 0), None
+
+    def _failure_result(self, last_error: str, max_retries: int) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': f"请求失败 (重试{max_retries}次后): {last_error}",
+            'model': self.model
+        }
 
     def send_loop_messages(self, messages: List[Dict[str, Any]], max_tokens: int = 10000,
                            temperature: float = 0.0, timeout: int = 120,
@@ -111,57 +276,100 @@ class LLMClient:
                     temperature=temperature,
                     timeout=timeout
                 )
-
-                content = response.choices[0].message.content
-
-                return {
-                    'success': True,
-                    'content': content,
-                    'model': self.model,
-                    'usage': {
-                        'prompt_tokens': response.usage.prompt_tokens if response.usage else 0,
-                        'completion_tokens': response.usage.completion_tokens if response.usage else 0,
-                        'total_tokens': response.usage.total_tokens if response.usage else 0
-                    },
-                    'raw_response': response
-                }
+                return self._success_result(response)
 
             except Exception as e:
-                error_str = str(e)
-
-                # 处理特定错误
-                if 'rate_limit' in error_str.lower() or '429' in error_str:
-                    # 速率限制，等待后重试
-                    wait_time = 2 ** attempt * 5
+                last_error, wait_time, fatal = self._classify_error(e, attempt, timeout, max_retries)
+                if fatal:
+                    return fatal
+                if wait_time:
                     time.sleep(wait_time)
-                    last_error = f"速率限制，等待 {wait_time}s 后重试"
+
+        return self._failure_result(last_error, max_retries)
+
+    async def _stream_until_code_block(self, messages: List[Dict[str, Any]], max_tokens: int,
+                                       temperature: float, timeout: int) -> Dict[str, Any]:
+        """流式接收输出，第一个 ```python 代码块的结束围栏一出现就断开连接，不再等待后续文本"""
+        stream = await self.async_client.chat.completions.create(
+            model=self.config['model_name'],
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=timeout,
+            stream=True
+        )
+        text = ''
+        body_start = None  # 代码块正文的起始位置
+        scan_from = 0      # 已扫描过的位置，新片段到来时只检查尾部
+        try:
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
                     continue
+                text += chunk.choices[0].delta.content
+                if body_start is None:
+                    # 回退几个字符，防止围栏被拆在两个片段之间
+                    match = _PY_FENCE_OPEN_RE.search(text, max(0, scan_from - 8))
+                    if match is None:
+                        scan_from = len(text)
+                        continue
+                    body_start = scan_from = match.end()
+                if text.find('```', max(body_start, scan_from - 2)) != -1:
+                    break
+                scan_from = len(text)
+        finally:
+            await stream.close()
 
-                elif 'authentication' in error_str.lower() or '401' in error_str:
-                    return {
-                        'success': False,
-                        'error': 'API密钥无效或已过期',
-                        'model': self.model
-                    }
+        return {
+            'success': True,
+            'content': text,
+            'model': self.model,
+            # 流式响应默认不带用量统计
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
 
-                elif 'timeout' in error_str.lower():
-                    last_error = f"请求超时 ({timeout}s)"
+    async def send_loop_messages_async(self, messages: List[Dict[str, Any]], max_tokens: int = 10000,
+                                       temperature: float = 0.0, timeout: int = 120,
+                                       max_retries: int = 5, stop_at_code_block: bool = False) -> Dict[str, Any]:
+        """
+        send_loop_messages 的异步版本：等待网络时不占用线程，可在一个事件循环中并发大量请求
 
-                elif 'connection' in error_str.lower():
-                    last_error = f"连接错误: {error_str}"
+        其余参数与返回值同 send_loop_messages
+        Args:
+            stop_at_code_block: 为 True 时流式接收，第一个 ```python 代码块结束即停止生成，
+                                适用于只需要代码块的请求
+        """
+        last_error = None
 
-                else:
-                    last_error = f"错误: {error_str}"
+        for attempt in range(max_retries):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            rate_limited = False
+            try:
+                if stop_at_code_block:
+                    return await self._stream_until_code_block(messages, max_tokens, temperature, timeout)
+                response = await self.async_client.chat.completions.create(
+                    model=self.config['model_name'],
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout
+                )
+                return self._success_result(response)
 
-                # 重试前等待
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+            except Exception as e:
+                rate_limited = _is_rate_limit_error(str(e))
+                last_error, wait_time, fatal = self._classify_error(e, attempt, timeout, max_retries)
+                if fatal:
+                    return fatal
+            finally:
+                # 退避等待前先归还名额，不占着并发额度睡眠
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.release(rate_limited)
 
-        return {
-            'success': False,
-            'error': f"请求失败 (重试{max_retries}次后): {last_error}",
-            'model': self.model
-        }
+            if wait_time:
+                await asyncio.sleep(wait_time)
+
+        return self._failure_result(last_error, max_retries)
 
     
     @classmethod
@@ -177,6 +385,18 @@ class LLMClient:
         return 'unknown'
 
 
+@lru_cache(maxsize=16)
+def get_shared_client(api_key: str, model: str = 'gpt-3.5-turbo',
+                      custom_api_base: Optional[str] = None) -> LLMClient:
+    """
+    按 (api_key, model, custom_api_base) 复用 LLMClient
+
+    同一配置的同步调用共享一个 OpenAI 客户端及其连接池，避免每次请求重新建立 TLS 连接。
+    不支持的模型会抛出 ValueError（异常不会被缓存）。
+    """
+    return LLMClient(api_key, model, custom_api_base)
+
+
 def query_llm_loop_messages(api_key: str, messages: List[Dict[str, Any]], model: str = 'gpt-3.5-turbo',
               custom_api_base: Optional[str] = None, **kwargs) -> Dict[str, Any]:
     """
@@ -193,7 +413,7 @@ def query_llm_loop_messages(api_key: str, messages: List[Dict[str, Any]], model:
             响应字典
         """
     try:
-        client = LLMClient(api_key, model, custom_api_base)
+        client = get_shared_client(api_key, model, custom_api_base)
         return client.send_loop_messages(messages, **kwargs)
     except ValueError as e:
         return {
@@ -217,7 +437,7 @@ def test_api_connection(api_key: str, model: str = 'gpt-3.5-turbo',
         测试结果字典
     """
     try:
-        client = LLMClient(api_key, model, custom_api_base)
+        client = get_shared_client(api_key, model, custom_api_base)
 
         messages=[{
             'role': 'user',
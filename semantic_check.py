@@ -3,21 +3,36 @@
 """
 from typing import List,Dict
 import re
+from functools import lru_cache
 from dataset_and_prompt import get_original_semantic_prompt
 
 
+# 回答末尾的 yes/no 结论（其后只允许跟非字母字符）
+_VERDICT_RE=re.compile(r'(yes|no)\s*[^a-zA-Z]*$', re.IGNORECASE)
+
+# 代码占位符，用于把 user 模板切成代码前后两段
+_CODE_SENTINEL='\x00code_text\x00'
+
+
+@lru_cache(maxsize=4096)
+def _semantic_user_parts(context:str,question:str,options_text:str)->tuple[str,str]:
+    """
+    按题目渲染语义检查 user prompt 中代码之前和之后的部分
+
+    同一道题的多轮修复只有代码不同，题面部分只格式化一次
+    """
+    user_prompt=get_original_semantic_prompt('user')
+    rendered=user_prompt.format(problem_text=context,question_text=question,
+                                options_text=options_text,code_text=_CODE_SENTINEL)
+    head,_,tail=rendered.rpartition(_CODE_SENTINEL)
+    return head,tail
+
+
 def generate_semantic_check_full_prompt(context:str,question:str,options_text:str,code_text:str)->List[Dict[str,str]]:
     # 生成用于语义检查的prompt
     instruction_prompt=get_original_semantic_prompt('instruction')
-    user_prompt=get_original_semantic_prompt('user')
-
-    user_prompt_values={
-        'problem_text': context,
-        'question_text': question,
-        'options_text': options_text,
-        'code_text': code_text,
-    }
-    real_user_prompt=user_prompt.format(**user_prompt_values)
+    head,tail=_semantic_user_parts(context,question,options_text)
+    real_user_prompt=head+code_text+tail
     messages=[
         {
             'role': 'system',
@@ -31,7 +46,7 @@ def generate_semantic_check_full_prompt(context:str,question:str,options_text:st
     return messages
 
 def semantic_check_response_analyze(response:str)->bool|None:
-    match = re.search(r'(yes|no)\s*[^a-zA-Z]*$', response, re.IGNORECASE)
+    match = _VERDICT_RE.search(response)
     if match:
         return match.group(1).lower()=='yes'
     else:
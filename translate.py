@@ -15,6 +15,17 @@ import os
 from typing import Dict, Any, List, Optional
 from request import query_llm_loop_messages
 
+try:
+    import orjson  # 可选依赖：C 实现的 JSON 解析器
+except ImportError:
+    orjson = None
+
+# 解析 LLM 返回的 JSON；orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，异常处理不变
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# 本模块所在目录（模块加载时计算一次，翻译每道题都要定位 prompt 文件）
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 def load_translation_prompt(dataset_type: str) -> Optional[str]:
     """
@@ -26,8 +37,7 @@ def load_translation_prompt(dataset_type: str) -> Optional[str]:
     Returns:
         翻译提示词文本，如果不存在则返回None
     """
-    prompt_file = os.path.join(os.path.dirname(__file__), 
-                               'all_prompt', dataset_type.lower(), 'translation.txt')
+    prompt_file = os.path.join(_MODULE_DIR, 'all_prompt', dataset_type.lower(), 'translation.txt')
     
     if not os.path.exists(prompt_file):
         return None
@@ -125,7 +135,7 @@ def translate_single_problem(api_key: str, dataset_type: str, problem: Dict[str,
         
         # 解析JSON
         try:
-            translated_problem = json.loads(llm_output)
+            translated_problem = _json_loads(llm_output)
         except json.JSONDecodeError as e:
             return {
                 'success': False,
@@ -11,12 +11,36 @@ import sys
 import threading
 import uuid
 import re
+from functools import lru_cache
 
 from repair import repair_code, quick_bracket_fix
 
 # 全局互斥锁，用于保护Z3操作（Z3不是线程安全的）
 _z3_lock = threading.Lock()
 
+# 进程内缓存的生成脚本编译结果条数（最近最少使用的先淘汰）
+_CODE_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=_CODE_CACHE_SIZE)
+def _compile_cached(source: str):
+    """
+    编译生成的Z3脚本，code object 按源码（字符串哈希）缓存在本进程内
+
+    多轮修复或不同题目生成完全相同的代码时跳过解析和字节码编译。
+    文件名沿用 exec 字符串时的 '<string>'，保证语法错误信息与之前一致。
+    """
+    return compile(source, '<string>', 'exec')
+
+
+# 执行超时时返回的错误信息；调用方据此判断执行进程中是否残留了仍在运行的线程
+Z3_TIMEOUT_ERROR = "Z3 execution timeout"
+
+
+def warm_up():
+    """进程池工作进程的 initializer：进程启动时就导入 z3，首个任务不再承担导入开销"""
+    import z3  # noqa: F401
+
 
 def execute_z3_code(code: str, timeout: int = 10, auto_repair: bool = True) -> Tuple[Optional[str], Optional[str], List[str]]:
     """
@@ -52,11 +76,11 @@ def execute_z3_code(code: str, timeout: int = 10, auto_repair: bool = True) -> T
         # 生成唯一的后缀来修改EnumSort的名称
         unique_suffix = str(uuid.uuid4())[:8]
         
-        # 替换 EnumSort('Name' 为 EnumSort('Name_{unique}' 
-        # 这样可以避免名称冲突
+        # 替换 EnumSort('Name' 为 EnumSort('Name_' + _enum_suffix
+        # 后缀在执行时通过全局变量注入，源码本身保持确定，编译结果才能被缓存
         modified_code = re.sub(
             r"EnumSort\s*\(\s*'(\w+)'",
-            lambda m: f"EnumSort('{m.group(1)}_{unique_suffix}'",
+            lambda m: f"EnumSort('{m.group(1)}_' + _enum_suffix",
             code
         )
 
@@ -98,9 +122,10 @@ def execute_z3_code(code: str, timeout: int = 10, auto_repair: bool = True) -> T
                     'unknown': z3.unknown,
                     'is_true': z3.is_true,
                     'is_false': z3.is_false,
+                    '_enum_suffix': unique_suffix,
                 }
-                # 执行修改后的代码，只使用全局变量环境
-                exec(modified_code, global_vars)
+                # 执行修改后的代码，只使用全局变量环境；编译结果按源码哈希缓存
+                exec(_compile_cached(modified_code), global_vars)
 
                 # 获取输出（在还原stdout之前）
                 output = stdout_capture.getvalue()
@@ -153,7 +178,7 @@ def execute_z3_code(code: str, timeout: int = 10, auto_repair: bool = True) -> T
             thread.join(timeout=timeout)
 
             if thread.is_alive():
-                result_holder['error'] = "Z3 execution timeout"
+                result_holder['error'] = Z3_TIMEOUT_ERROR
                 # 线程仍在运行，无法强制终止，但返回超时错误
         finally:
             sys.stdout = old_stdout